@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+importtime
+Start-up time benchmark for the console entry points.
+
+Each entry point is started with a cheap action (eg. -v) under
+``python -X importtime``. The cumulative import time and the wall clock time
+are compared against a stored baseline, and the run fails if either grows
+past the allowed ratio or if a heavy module (tango, numpy, matplotlib, ...)
+is imported on a path that should not need it.
+
+Baselines are machine dependent; refresh them with --update-baseline on the
+machine the comparison runs on.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGES_DIR = os.path.join(REPO_DIR, "images")
+DEFAULT_BASELINE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "importtime_baseline.json"
+)
+DEFAULT_RUNS = 5
+DEFAULT_THRESHOLD = 1.5
+
+# name: (image directory, script and arguments, modules that must not load)
+ENTRY_POINTS = {
+    "console-version": (
+        "ska-mid-dish-spfrx-talondx-console",
+        ["spfrx.py", "-v"],
+        ["tango"],
+    ),
+    "console-help": (
+        "ska-mid-dish-spfrx-talondx-console",
+        ["spfrx.py", "--help"],
+        ["tango"],
+    ),
+    "plotter-version": (
+        "ska-mid-dish-spfrx-talondx-console-plot",
+        ["spfrx_spectrum_plotter.py", "-v"],
+        ["tango", "numpy", "matplotlib"],
+    ),
+    "deployer-help": (
+        "ska-mid-dish-spfrx-talondx-console-deploy",
+        ["spfrx_deployer.py", "--help"],
+        ["tango", "requests", "jsonschema"],
+    ),
+}
+
+
+def parse_importtime(
+        stderr: str
+        ) -> tuple:
+    """
+    Parse the output of python -X importtime.
+
+    :param stderr: Standard error of the measured process
+    :returns: A (total cumulative import time in us, set of imported
+              top-level package names) tuple
+    """
+    total_us = 0
+    packages = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented; top-level ones hold the whole cost
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative)
+        packages.add(name.strip().split(".")[0])
+    return total_us, packages
+
+
+def measure(
+        image: str,
+        argv: list,
+        runs: int
+        ) -> dict:
+    """
+    Start one entry point several times and keep the median timings.
+
+    :param image: Image directory holding the script, used as working dir
+    :param argv: Script and its arguments
+    :param runs: Number of runs
+    :returns: A dict with "import_us", "wall_ms" and "modules"
+    """
+    import_us = []
+    wall_ms = []
+    modules = set()
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime"] + argv,
+            cwd=os.path.join(IMAGES_DIR, image),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        wall_ms.append((time.perf_counter() - start) * 1000)
+        if proc.returncode != 0:
+            raise RuntimeError(
+                f"{' '.join(argv)} exited with {proc.returncode}:\n"
+                f"{proc.stderr[-2000:]}"
+            )
+        total_us, packages = parse_importtime(proc.stderr)
+        import_us.append(total_us)
+        modules |= packages
+    return {
+        "import_us": int(statistics.median(import_us)),
+        "wall_ms": round(statistics.median(wall_ms), 1),
+        "modules": sorted(modules),
+    }
+
+
+def compare(
+        name: str,
+        result: dict,
+        baseline: dict,
+        threshold: float,
+        forbidden: list
+        ) -> list:
+    """
+    Check one result against its baseline and forbidden modules.
+
+    :returns: A list of failure descriptions; empty if the result is fine
+    """
+    failures = [
+        f"{name}: imports {module}"
+        for module in forbidden if module in result["modules"]
+    ]
+    for key in ("import_us", "wall_ms"):
+        if key in baseline and result[key] > baseline[key] * threshold:
+            failures.append(
+                f"{name}: {key} {result[key]} exceeds baseline "
+                f"{baseline[key]} x {threshold}"
+            )
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Start-up time benchmark for the console entry points."
+    )
+    parser.add_argument(
+        "--baseline",
+        default=DEFAULT_BASELINE,
+        help=f"Baseline JSON file (Default is {DEFAULT_BASELINE})",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Store the measured timings as the new baseline",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=DEFAULT_RUNS,
+        help=f"Runs per entry point (Default is {DEFAULT_RUNS})",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Allowed ratio over the baseline before failing "
+             f"(Default is {DEFAULT_THRESHOLD})",
+    )
+    args = parser.parse_args()
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as baseline_fd:
+            baselines = json.load(baseline_fd)
+
+    results = {}
+    failures = []
+    print(f"{'ENTRY POINT':<18} {'IMPORT':>10} {'WALL':>9}  BASELINE")
+    for name, (image, argv, forbidden) in ENTRY_POINTS.items():
+        result = measure(image, argv, args.runs)
+        results[name] = result
+        baseline = baselines.get(name, {})
+        print(
+            f"{name:<18} {result['import_us'] / 1000:>8.1f}ms "
+            f"{result['wall_ms']:>7.1f}ms  "
+            f"{baseline.get('import_us', 0) / 1000:.1f}ms / "
+            f"{baseline.get('wall_ms', 0.0):.1f}ms"
+        )
+        failures += compare(name, result, baseline, args.threshold, forbidden)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as baseline_fd:
+            json.dump(
+                {
+                    name: {k: r[k] for k in ("import_us", "wall_ms")}
+                    for name, r in results.items()
+                },
+                baseline_fd,
+                indent=4,
+            )
+            baseline_fd.write("\n")
+        print(f"Baseline written to {args.baseline}")
+    elif failures:
+        print("\n".join(["Start-up regressions:"] + failures))
+        sys.exit(1)
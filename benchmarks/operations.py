@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+operations
+Benchmarks of the console hot paths, run without hardware or a Tango DB.
+
+* configure-band, configure-atten - end-to-end latency of configureBand
+  and configureAtten against the simulated devices of spfrx_simulator
+* status-sweep, version-sweep - get_device_status and
+  get_device_version_info over every device of SPFRX_DEVICE_LIST
+* parse-data, render - SpectrumPlotter.parseData, and updatePlot blitting
+  the lines and text over the saved background, per spectrometer frame
+* db-populate - DbPopulate.process (remove then add) for a full boardmap
+  against a stand-in Tango DB
+
+Each benchmark runs in its own process, from the image directory of the
+code it measures. Medians are compared against a stored baseline and the
+run fails if one grows past the allowed ratio. Results can be written as
+JSON with --output.
+
+Baselines are machine dependent; refresh them with --update-baseline on the
+machine the comparison runs on.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import types
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGES_DIR = os.path.join(REPO_DIR, "images")
+DEFAULT_BASELINE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "operations_baseline.json"
+)
+DEFAULT_RUNS = 20
+DEFAULT_THRESHOLD = 1.5
+DEFAULT_SIM_LATENCY_MS = 1.0
+DEFAULT_DB_LATENCY_MS = 1.0
+
+CONSOLE_IMAGE = "ska-mid-dish-spfrx-talondx-console"
+PLOT_IMAGE = "ska-mid-dish-spfrx-talondx-console-plot"
+DEPLOY_IMAGE = "ska-mid-dish-spfrx-talondx-console-deploy"
+BOARDMAP_FILE = "spfrx_boardmap_ska001.json"
+
+
+@contextlib.contextmanager
+def _quiet():
+    """
+    Silence the prints and logs of the code under test.
+    """
+    import logging
+
+    logging.disable(logging.CRITICAL)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def _time_runs(
+        run,
+        runs: int
+        ) -> list:
+    """
+    Time a callable after one untimed warm-up run.
+
+    :returns: The duration of each run in ms
+    """
+    with _quiet():
+        run(0)
+        samples = []
+        for i in range(runs):
+            start = time.perf_counter()
+            run(i + 1)
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _console_benchmark(
+        args: argparse.Namespace,
+        make_run
+        ) -> list:
+    from spfrx_simulator import simulated_spfrx
+
+    with simulated_spfrx(simLatencyMs=args.sim_latency_ms):
+        import spfrx
+
+        return _time_runs(make_run(spfrx), args.runs)
+
+
+def bench_configure_band(
+        args: argparse.Namespace
+        ) -> list:
+    def make_run(spfrx):
+        def run(i):
+            # Alternate bands so every run is a real reconfiguration
+            if not spfrx.configureBand(1 + i % 2, False):
+                raise RuntimeError("configureBand failed")
+        return run
+    return _console_benchmark(args, make_run)
+
+
+def bench_configure_atten(
+        args: argparse.Namespace
+        ) -> list:
+    def make_run(spfrx):
+        def run(i):
+            if not spfrx.configureAtten(2, spfrx.POL_H, 10.0 + i % 4):
+                raise RuntimeError("configureAtten failed")
+        return run
+    return _console_benchmark(args, make_run)
+
+
+def bench_status_sweep(
+        args: argparse.Namespace
+        ) -> list:
+    def make_run(spfrx):
+        def run(i):
+            if not all(r.ok for r in spfrx.get_device_status()):
+                raise RuntimeError("status sweep failed")
+        return run
+    return _console_benchmark(args, make_run)
+
+
+def bench_version_sweep(
+        args: argparse.Namespace
+        ) -> list:
+    def make_run(spfrx):
+        def run(i):
+            if not all(r.ok for r in spfrx.get_device_version_info()):
+                raise RuntimeError("version sweep failed")
+        return run
+    return _console_benchmark(args, make_run)
+
+
+def _plotter(
+        args: argparse.Namespace,
+        render: bool
+        ):
+    import numpy as np
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import spfrx_spectrum_plotter as ssp
+    from spectrum_frame import decode_spectrum
+
+    plotter = ssp.SpectrumPlotter.__new__(ssp.SpectrumPlotter)
+    plotter._mag = False
+    plotter._rendered = 0
+    plotter.allocateBuffers()
+    # Stands in for the acquisition thread, whose counts updatePlot shows
+    plotter._acquisition = types.SimpleNamespace(acquired=0, dropped=0)
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(8):
+        frame = decode_spectrum(
+            np.concatenate(([i, 0], rng.integers(1, 100000, 8200))),
+            time.time()
+        )
+        frame.band, frame.kvalue = 2, 1
+        frame.atten_h, frame.atten_v = 10.0, 10.0
+        frames.append(frame)
+    if render:
+        plotter._fig = plotter.createPlot()
+        # A full draw captures the background that every frame blits over
+        plotter._fig.canvas.draw()
+    return plotter, frames
+
+
+def bench_parse_data(
+        args: argparse.Namespace
+        ) -> list:
+    plotter, frames = _plotter(args, render=False)
+
+    def run(i):
+        plotter.parseData(frames[i % len(frames)])
+    return _time_runs(run, args.runs)
+
+
+def bench_render(
+        args: argparse.Namespace
+        ) -> list:
+    plotter, frames = _plotter(args, render=True)
+
+    def run(i):
+        frame = frames[i % len(frames)]
+        timestamp = plotter.parseData(frame)
+        plotter.updatePlot(timestamp, frame)
+    return _time_runs(run, args.runs)
+
+
+class StandInDatabase:
+    """
+    In-memory stand-in for the tango.Database calls made by DbPopulate,
+    with a fixed latency per call.
+
+    :param latency_ms: Latency added to every call
+    """
+
+    def __init__(self, latency_ms: float):
+        self._latency_s = latency_ms / 1000
+        self._devices = {}
+        self._properties = {}
+
+    def _call(self):
+        if self._latency_s > 0:
+            time.sleep(self._latency_s)
+
+    def get_server_list(self, pattern="*"):
+        self._call()
+        return sorted({server for server, _ in self._devices.values()})
+
+    def get_device_name(self, server, dev_class):
+        self._call()
+        return [
+            name for name, (_, cls) in self._devices.items()
+            if cls == dev_class
+        ]
+
+    def add_device(self, dev_info):
+        self._call()
+        self._devices[dev_info.name] = (dev_info.server, dev_info._class)
+
+    def delete_device(self, name):
+        self._call()
+        self._devices.pop(name, None)
+        self._properties.pop(name, None)
+
+    def put_device_property(self, name, properties):
+        self._call()
+        self._properties.setdefault(name, {}).update(properties)
+
+
+def bench_db_populate(
+        args: argparse.Namespace
+        ) -> list:
+    from nrcdbpopulate import dbPopulate
+
+    with open(os.path.join("spfrx_config", BOARDMAP_FILE), "r") as map_fd:
+        servers = json.load(map_fd)["tango-db"]["db_servers"]
+    db = StandInDatabase(args.db_latency_ms)
+    dbPopulate.Database = lambda: db
+    os.environ.setdefault("TANGO_HOST", "stand-in:10000")
+
+    def run(i):
+        for server in servers:
+            dbpop = dbPopulate.DbPopulate(server)
+            dbpop.process(mode="remove")
+            dbpop.process(mode="add")
+    return _time_runs(run, args.runs)
+
+
+# name: (image directory, benchmark function, maximum number of runs)
+BENCHMARKS = {
+    "configure-band": (CONSOLE_IMAGE, bench_configure_band, None),
+    "configure-atten": (CONSOLE_IMAGE, bench_configure_atten, None),
+    "status-sweep": (CONSOLE_IMAGE, bench_status_sweep, None),
+    "version-sweep": (CONSOLE_IMAGE, bench_version_sweep, None),
+    "parse-data": (PLOT_IMAGE, bench_parse_data, None),
+    "render": (PLOT_IMAGE, bench_render, None),
+    # Seconds per run; a few runs are enough
+    "db-populate": (DEPLOY_IMAGE, bench_db_populate, 5),
+}
+
+
+def summarize(
+        samples: list
+        ) -> dict:
+    """
+    Summarise the durations of the runs of one benchmark.
+
+    :param samples: Durations in ms
+    :returns: A dict with "runs", "median_ms", "p95_ms", "mean_ms",
+              "min_ms" and "max_ms"
+    """
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    return {
+        "runs": len(samples),
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(p95, 3),
+        "mean_ms": round(statistics.mean(ordered), 3),
+        "min_ms": round(ordered[0], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def measure(
+        name: str,
+        args: argparse.Namespace
+        ) -> dict:
+    """
+    Run one benchmark in a worker process started from its image directory.
+
+    :returns: The summary of the benchmark runs
+    """
+    image, _, max_runs = BENCHMARKS[name]
+    runs = args.runs if max_runs is None else min(args.runs, max_runs)
+    proc = subprocess.run(
+        [
+            sys.executable, os.path.abspath(__file__),
+            "--worker", name,
+            "--runs", str(runs),
+            "--sim_latency_ms", str(args.sim_latency_ms),
+            "--db_latency_ms", str(args.db_latency_ms),
+        ],
+        cwd=os.path.join(IMAGES_DIR, image),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(
+            f"{name} exited with {proc.returncode}:\n{proc.stderr[-2000:]}"
+        )
+    return summarize(json.loads(proc.stdout.splitlines()[-1]))
+
+
+def compare(
+        name: str,
+        result: dict,
+        baseline: dict,
+        threshold: float
+        ) -> list:
+    """
+    Check one result against its baseline.
+
+    :returns: A list of failure descriptions; empty if the result is fine
+    """
+    if "median_ms" in baseline and \
+            result["median_ms"] > baseline["median_ms"] * threshold:
+        return [
+            f"{name}: median {result['median_ms']}ms exceeds baseline "
+            f"{baseline['median_ms']}ms x {threshold}"
+        ]
+    return []
+
+
+def buildParser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Benchmarks of the console hot paths."
+    )
+    parser.add_argument(
+        "names",
+        nargs="*",
+        metavar="BENCHMARK",
+        help=f"Benchmarks to run (Default is all of {', '.join(BENCHMARKS)})",
+    )
+    parser.add_argument(
+        "--baseline",
+        default=DEFAULT_BASELINE,
+        help=f"Baseline JSON file (Default is {DEFAULT_BASELINE})",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Store the measured medians as the new baseline",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="PATH",
+        help="Write the results as JSON to PATH",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=DEFAULT_RUNS,
+        help=f"Timed runs per benchmark (Default is {DEFAULT_RUNS})",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Allowed ratio over the baseline before failing "
+             f"(Default is {DEFAULT_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--sim_latency_ms",
+        type=float,
+        default=DEFAULT_SIM_LATENCY_MS,
+        help="Latency of every simulated device call "
+             f"(Default is {DEFAULT_SIM_LATENCY_MS})",
+    )
+    parser.add_argument(
+        "--db_latency_ms",
+        type=float,
+        default=DEFAULT_DB_LATENCY_MS,
+        help="Latency of every stand-in DB call "
+             f"(Default is {DEFAULT_DB_LATENCY_MS})",
+    )
+    parser.add_argument(
+        "--worker",
+        choices=BENCHMARKS.keys(),
+        help=argparse.SUPPRESS,
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = buildParser().parse_args()
+
+    if args.worker is not None:
+        sys.path.insert(0, os.getcwd())
+        _, bench, _ = BENCHMARKS[args.worker]
+        print(json.dumps(bench(args)))
+        sys.exit(0)
+
+    names = args.names or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmarks: {', '.join(unknown)}")
+        sys.exit(2)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as baseline_fd:
+            baselines = json.load(baseline_fd)
+
+    results = {}
+    failures = []
+    print(
+        f"{'BENCHMARK':<16} {'MEDIAN':>10} {'P95':>10} {'MIN':>10}  BASELINE"
+    )
+    for name in names:
+        result = measure(name, args)
+        results[name] = result
+        baseline = baselines.get(name, {})
+        print(
+            f"{name:<16} {result['median_ms']:>8.2f}ms "
+            f"{result['p95_ms']:>8.2f}ms {result['min_ms']:>8.2f}ms  "
+            f"{baseline.get('median_ms', 0.0):.2f}ms"
+        )
+        failures += compare(name, result, baseline, args.threshold)
+
+    if args.output is not None:
+        with open(args.output, "w") as output_fd:
+            json.dump(
+                {
+                    "sim_latency_ms": args.sim_latency_ms,
+                    "db_latency_ms": args.db_latency_ms,
+                    "results": results,
+                },
+                output_fd,
+                indent=4,
+            )
+            output_fd.write("\n")
+
+    if args.update_baseline:
+        baselines.update({
+            name: {"median_ms": r["median_ms"]}
+            for name, r in results.items()
+        })
+        with open(args.baseline, "w") as baseline_fd:
+            json.dump(baselines, baseline_fd, indent=4)
+            baseline_fd.write("\n")
+        print(f"Baseline written to {args.baseline}")
+    elif failures:
+        print("\n".join(["Performance regressions:"] + failures))
+        sys.exit(1)
@@ -9,11 +9,15 @@ import re
 import zipfile
 from collections import OrderedDict
 
-import requests
-import tango
 from conan_local.conan_wrapper import ConanWrapper
-from nrcdbpopulate.dbPopulate import DbPopulate
-from spfrx_config.talondx_config import TalonDxConfig
+from lazy_import import lazy_import
+
+# requests, tango and jsonschema are only imported by the steps that use
+# them, so --help and --generate-spfrx-config start without paying for them
+requests = lazy_import("requests")
+tango = lazy_import("tango")
+dbPopulate = lazy_import("nrcdbpopulate.dbPopulate")
+talondx_config = lazy_import("spfrx_config.talondx_config")
 
 LOG_FORMAT = (
     "[spfrx_deployer.py: line %(lineno)s]%(levelname)s: %(message)s"
@@ -138,7 +142,7 @@ def configure_db(
         #     handleValidationError( error, server )
         #     exit(1)
 
-        dbpop = DbPopulate(server)
+        dbpop = dbPopulate.DbPopulate(server)
 
         # Remove and add to ensure any previous record is overwritten
         dbpop.process(mode="remove")
@@ -307,7 +311,7 @@ if __name__ == "__main__":
 
     if args.config_db:
         spfrx_config_file=os.path.join(ARTIFACTS_DIR, args.config_file)
-        config = TalonDxConfig(config_file=spfrx_config_file)
+        config = talondx_config.TalonDxConfig(config_file=spfrx_config_file)
         logger_.info(
             f"Configure DB - TANGO_HOST = "
             f"{tango.ApiUtil.get_env_var('TANGO_HOST')} "
@@ -319,7 +323,7 @@ if __name__ == "__main__":
         logger_.info(
             f"Download Artifacts using config {spfrx_config_file}"
             )
-        config = TalonDxConfig(config_file=spfrx_config_file)
+        config = talondx_config.TalonDxConfig(config_file=spfrx_config_file)
         config.export_config(ARTIFACTS_DIR)
         download_ds_binaries(config.ds_binaries())
     elif args.generate_spfrx_config:
@@ -0,0 +1,274 @@
+"""
+attribute_cache
+Cached reads of slow-changing device attributes.
+
+Reads at frame rate of attributes that rarely change (band, kValue,
+attenuation) are served from two levels of cache:
+
+* Server side (opt-in) - the attributes are polled by the device server
+  and read with DevSource.CACHE_DEV, so a read that reaches the device is
+  answered from its polling buffer instead of the hardware. Polling set
+  with enable_polling is stored in the Tango DB by the server, so it
+  outlives the client until disable_polling removes it again.
+* Client side - values are kept for a time-to-live and reused without any
+  device round trip. A change event on an attribute invalidates its entry
+  immediately, so a reconfiguration is picked up on the next read rather
+  than after the time-to-live.
+
+Hits, misses and invalidations are counted in the call statistics (see
+tango_call_stats) and by AttributeCache.stats().
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List
+
+from lazy_import import lazy_import
+from pytango_client_wrapper import PyTangoClientWrapper
+from tango_call_stats import get_call_stats
+from tango_resilience import TangoClientError
+
+tango = lazy_import("tango")
+
+DEFAULT_CACHE_TTL_S = 5.0
+# Server-side polling is only changed when a period is given
+DEFAULT_POLL_PERIOD_MS = 0
+
+logger_ = logging.getLogger(__name__)
+
+
+class AttributeCache:
+    """
+    Client-side time-to-live cache of the attributes of one device,
+    invalidated by change events.
+
+    :param client: Client of the device
+    :param ttl_s: Seconds a value is reused without reading the device;
+                  0 disables the client-side cache
+    """
+
+    def __init__(
+            self,
+            client: PyTangoClientWrapper,
+            ttl_s: float = DEFAULT_CACHE_TTL_S
+            ):
+        self.client = client
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # attribute name: (value, time read)
+        self._entries: Dict[str, tuple] = {}
+        # attribute name: time of the last invalidation
+        self._invalidated_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._event_ids: Dict[str, int] = {}
+        self._subscribed_dp = None
+        # Attributes whose polling was started by enable_polling
+        self._polled: List[str] = []
+        self._stats = get_call_stats()
+
+    def enable_polling(
+            self,
+            attr_names: List[str],
+            period_ms: int = DEFAULT_POLL_PERIOD_MS
+            ) -> None:
+        """
+        Have the device server poll the attributes that are not polled
+        yet, and read from its polling buffer. Attributes that cannot be
+        polled are read from the device as before. The server keeps this
+        polling in the Tango DB; call disable_polling to remove it.
+
+        :param attr_names: Attributes to poll
+        :param period_ms: Polling period in milliseconds
+        """
+        dp = self.client.proxy()
+        for attr_name in attr_names:
+            try:
+                if not dp.is_attribute_polled(attr_name):
+                    dp.poll_attribute(attr_name, period_ms)
+                    self._polled.append(attr_name)
+            except tango.DevFailed as e:
+                logger_.warning(
+                    f"Unable to poll {attr_name} on {self.client.dev_name}: "
+                    f"{e.args[0].desc.strip()}"
+                )
+        self.client.set_source(tango.DevSource.CACHE_DEV)
+
+    def disable_polling(self) -> None:
+        """
+        Stop the polling started by enable_polling, leaving the polling
+        that was configured before untouched.
+        """
+        dp = self.client.proxy()
+        for attr_name in self._polled:
+            try:
+                dp.stop_poll_attribute(attr_name)
+            except tango.DevFailed as e:
+                logger_.warning(
+                    f"Unable to stop polling {attr_name} on "
+                    f"{self.client.dev_name}: {e.args[0].desc.strip()}"
+                )
+        self._polled = []
+
+    def subscribe(
+            self,
+            attr_names: List[str]
+            ) -> None:
+        """
+        Subscribe to the change events of the attributes; each event
+        invalidates the cached value. Attributes without change events
+        rely on the time-to-live alone.
+
+        :param attr_names: Attributes to subscribe to
+        """
+        dp = self.client.proxy()
+        if dp is not self._subscribed_dp:
+            # The proxy was re-created; its subscriptions went with it
+            self._event_ids = {}
+            self._subscribed_dp = dp
+        for attr_name in attr_names:
+            if attr_name in self._event_ids:
+                continue
+            try:
+                self._event_ids[attr_name] = dp.subscribe_event(
+                    attr_name,
+                    tango.EventType.CHANGE_EVENT,
+                    self._on_change,
+                )
+            except tango.DevFailed:
+                logger_.debug(
+                    f"No change events for {attr_name} on "
+                    f"{self.client.dev_name}; relying on the TTL"
+                )
+
+    def unsubscribe(self) -> None:
+        """
+        Drop all the change event subscriptions.
+        """
+        for event_id in self._event_ids.values():
+            try:
+                self._subscribed_dp.unsubscribe_event(event_id)
+            except tango.DevFailed:
+                pass
+        self._event_ids = {}
+
+    def _on_change(
+            self,
+            event
+            ) -> None:
+        # eg. tango://host:port/a/b/c/attr#dbase=no
+        attr_name = event.attr_name.split("#", 1)[0].rsplit("/", 1)[-1]
+        self.invalidate(attr_name)
+
+    def invalidate(
+            self,
+            attr_name: str = None
+            ) -> None:
+        """
+        Drop the cached value of an attribute, or of all attributes.
+
+        :param attr_name: Attribute name, None for all attributes
+        """
+        now = time.monotonic()
+        with self._lock:
+            names = list(self._entries) if attr_name is None else [
+                name for name in self._entries
+                if name.lower() == attr_name.lower()
+            ]
+            if attr_name is not None:
+                # Event names are lower case
+                self._invalidated_at[attr_name.lower()] = now
+            for name in names:
+                self._invalidated_at[name.lower()] = now
+                del self._entries[name]
+                self.invalidations += 1
+                self._stats.count(
+                    self.client.dev_name, name, "cache_invalidations"
+                )
+
+    def read(
+            self,
+            attr_name: str
+            ) -> Any:
+        """
+        Read one attribute through the cache.
+
+        :param attr_name: Attribute to read
+        :returns: The attribute value
+        :raises TangoClientError: If the value is not cached and cannot be
+                                  read
+        """
+        return self.read_many([attr_name])[0]
+
+    def read_many(
+            self,
+            attr_names: List[str]
+            ) -> list:
+        """
+        Read several attributes through the cache, reading all the
+        missing values with a single call.
+
+        :param attr_names: Attributes to read
+        :returns: The attribute values, in the order of attr_names
+        :raises TangoClientError: If a value is not cached and cannot be
+                                  read
+        """
+        now = time.monotonic()
+        values = {}
+        with self._lock:
+            for attr_name in attr_names:
+                entry = self._entries.get(attr_name)
+                if entry is not None and now - entry[1] < self.ttl_s:
+                    values[attr_name] = entry[0]
+            missing = [name for name in attr_names if name not in values]
+            self.hits += len(values)
+            self.misses += len(missing)
+        for attr_name in attr_names:
+            self._stats.count(
+                self.client.dev_name,
+                attr_name,
+                "cache_misses" if attr_name in missing else "cache_hits",
+            )
+
+        if missing:
+            attrs = self.client.read_attributes(missing)
+            for attr_name, attr in zip(missing, attrs):
+                if attr.has_failed:
+                    errors = attr.get_err_stack()
+                    raise TangoClientError(
+                        self.client.dev_name,
+                        f"read {attr_name}",
+                        errors[0].reason if errors else "",
+                        errors[0].desc.strip() if errors else "",
+                    )
+                values[attr_name] = attr.value
+            if self.ttl_s > 0:
+                with self._lock:
+                    for attr_name in missing:
+                        # Do not keep a value an event has already outdated
+                        if self._invalidated_at.get(
+                                attr_name.lower(), 0.0) < now:
+                            self._entries[attr_name] = (
+                                values[attr_name], now
+                            )
+        return [values[attr_name] for attr_name in attr_names]
+
+    def stats(self) -> dict:
+        """
+        :returns: A dict with "hits", "misses", "invalidations" and
+                  "hit_ratio"
+        """
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            invalidations = self.invalidations
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "invalidations": invalidations,
+            "hit_ratio": hits / total if total else 0.0,
+        }
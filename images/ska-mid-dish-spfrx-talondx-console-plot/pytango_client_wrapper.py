@@ -1,50 +1,137 @@
-import sys
-from typing import Any
+from typing import Any, Callable
 
-from tango import DeviceProxy
+from lazy_import import lazy_import
+from tango_call_stats import get_call_stats
+from tango_resilience import RetryPolicy, TangoClientError, resilient_call
+
+tango = lazy_import("tango")
 
 
 class PyTangoClientWrapper:
-    def __init__(self):
+    """
+    Client of a single Tango device.
+
+    Calls are retried with jittered backoff and guarded by the device
+    circuit breaker (see tango_resilience); the proxy is re-created after a
+    connection failure, so a client survives a device server restart.
+    Failures raise a TangoClientError subclass.
+
+    :param retry_policy: Optional - Retry policy for every call made by
+                         this client (defaults to RetryPolicy())
+    """
+
+    def __init__(self, retry_policy: RetryPolicy = None):
         self.dp = None
+        self.dev_name = None
         self.timeout_ms = 3000  # Default Tango timeout
+        self.source = None  # tango.DevSource of reads; None keeps default
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._stats = get_call_stats()
 
     def create_tango_client(self, dev_name: str):
         """
         Creates a device proxy to the specified device.
 
         :param dev_name: Device FQDN to connect to
+        :raises TangoClientError: If the device cannot be reached
         """
+        self.dev_name = dev_name
         try:
-            self.dp = DeviceProxy(dev_name)
-            print("Device State : {}".format(self.dp.state()))
-            print("Device Status: {}".format(self.dp.status()))
-            print("dev_name = {}".format(dev_name))
-
-        except Exception as e:
-            print("Error on DeviceProxy: {}".format(str(e)))
+            state = self._call(
+                "command", "command", "State", lambda dp: dp.state()
+            )
+            status = self._call(
+                "command", "command", "Status", lambda dp: dp.status()
+            )
+        except TangoClientError:
             self.clear_all()
-            sys.exit(str(e))
+            raise
+        print("Device State : {}".format(state))
+        print("Device Status: {}".format(status))
+        print("dev_name = {}".format(dev_name))
 
     def clear_all(self):
         """
         Reset all class variables to the default setting.
         """
         self.timeout_ms = 3000
+        self.source = None
         if self.dp is not None:
             self.dp = None
 
     def set_timeout_millis(self, timeout_ms: int):
         """
-        Set the timeout of the DeviceProxy connection.
+        Set the timeout of the DeviceProxy connection. Also applied to the
+        proxy after a reconnect.
 
         :param timeout_ms: Timeout in milliseconds
         """
-        try:
-            self.timeout_ms = timeout_ms
+        self.timeout_ms = timeout_ms
+        if self.dp is not None:
             self.dp.set_timeout_millis(timeout_ms)
-        except Exception as e:
-            print(str(e))
+
+    def set_source(self, source: Any):
+        """
+        Set the source of attribute reads: the device, the polling buffer,
+        or the polling buffer when the attribute is polled and the device
+        otherwise. Also applied to the proxy after a reconnect.
+
+        :param source: A tango.DevSource value
+        """
+        self.source = source
+        if self.dp is not None:
+            self.dp.set_source(source)
+
+    def reconnect(self):
+        """
+        Drop the device proxy; it is re-created by the next call.
+        """
+        self.dp = None
+
+    def proxy(self) -> Any:
+        """
+        The device proxy, created again if a connection failure dropped it.
+        Calls made on it directly are neither retried nor recorded in the
+        call statistics; use it for what the client does not wrap, eg.
+        polling and event subscriptions.
+
+        :returns: The tango.DeviceProxy of the device
+        """
+        return self._proxy()
+
+    def _proxy(self) -> Any:
+        if self.dp is None:
+            dp = tango.DeviceProxy(self.dev_name)
+            dp.set_timeout_millis(self.timeout_ms)
+            if self.source is not None:
+                dp.set_source(self.source)
+            self.dp = dp
+        return self.dp
+
+    def _call(
+            self,
+            kind: str,
+            operation: str,
+            name: str,
+            call: Callable[[Any], Any],
+            idempotent: bool = True
+            ) -> Any:
+        """
+        Make one call on the device proxy through the resilience layer,
+        recording each attempt in the call statistics.
+        """
+        def attempt():
+            with self._stats.timed(self.dev_name, kind, name):
+                return call(self._proxy())
+
+        return resilient_call(
+            self.dev_name,
+            f"{operation} {name}",
+            attempt,
+            self.retry_policy,
+            idempotent,
+            self.reconnect,
+        )
 
     def write_attribute(self, attr_name: str, value: Any):
         """
@@ -52,36 +139,77 @@ class PyTangoClientWrapper:
 
         :param attr_name: Attribute to write to
         :param value: Value to write
+        :raises TangoClientError: If the write fails
         """
-        try:
-            self.dp.write_attribute(attr_name, value)
-        except Exception as e:
-            print(str(e))
+        self._call(
+            "write", "write", attr_name,
+            lambda dp: dp.write_attribute(attr_name, value)
+        )
+
+    def write_attributes(self, attr_values: list[tuple[str, Any]]):
+        """
+        Write several attributes in a single call.
+
+        :param attr_values: A list of (attribute name, value) pairs
+        :raises TangoClientError: If the write fails
+        """
+        self._call(
+            "write_attributes", "write",
+            ",".join(name for name, _ in attr_values),
+            lambda dp: dp.write_attributes(attr_values)
+        )
 
-    def read_attribute(self, attr_name: str) -> Any:
+    def read_attribute(
+            self,
+            attr_name: str,
+            extract_as: Any = None
+            ) -> Any:
         """
         Read from an attribute.
 
         :param attr_name: Attribute to read from
-        :returns: Attribute value or None if an exception occurred
+        :param extract_as: Optional tango.ExtractAs type of the value, eg.
+                           ExtractAs.Numpy for a NumPy array
+        :returns: Attribute value
+        :raises TangoClientError: If the read fails
         """
-        try:
-            attr_read = self.dp.read_attribute(attr_name)
-            return attr_read.value
-        except Exception as e:
-            print(str(e))
-            return None
+        if extract_as is None:
+            return self._call(
+                "read", "read", attr_name,
+                lambda dp: dp.read_attribute(attr_name).value
+            )
+        return self._call(
+            "read", "read", attr_name,
+            lambda dp: dp.read_attribute(
+                attr_name, extract_as=extract_as
+            ).value
+        )
+
+    def read_attributes(self, attr_names: list[str]) -> Any:
+        """
+        Read a list of attributes.
+
+        :param attr_names: A list of attributes names to read from
+        :returns: The returned list of attribute objects
+        :raises TangoClientError: If the read fails
+        """
+        return self._call(
+            "read_attributes", "read", ",".join(attr_names),
+            lambda dp: dp.read_attributes(attr_names)
+        )
 
     def command_read_write(self, command_name: str, *args) -> Any:
         """
-        Send a command.
+        Send a command. Commands are only retried when they could not be
+        delivered, never after a timeout.
 
         :param command_name: Name of the command
         :param args: Input arguments
-        :returns: Command result or None is an exception occurred
+        :returns: Command result
+        :raises TangoClientError: If the command fails
         """
-        try:
-            return self.dp.command_inout(command_name, *args)
-        except Exception as e:
-            print(str(e))
-            return None
+        return self._call(
+            "command", "command", command_name,
+            lambda dp: dp.command_inout(command_name, *args),
+            idempotent=False
+        )
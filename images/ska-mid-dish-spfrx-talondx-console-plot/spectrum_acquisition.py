@@ -0,0 +1,208 @@
+"""
+spectrum_acquisition
+Background acquisition of gated spectrometer results.
+
+A worker thread retrieves one spectrometer result per throttle interval,
+decodes it into a SpectrumFrame (see spectrum_frame) together with the
+controller settings it was taken with, and puts it into a bounded queue.
+Its schedule only depends on the throttle interval: a slow call skips the
+result slots it overran instead of shifting the ones that follow. The
+consumer (eg. the plotter GUI) takes the newest frame at its own rate with
+latest(), or every frame in turn with next_frame() (eg. the recorder).
+When the consumer falls behind, the oldest frames are dropped instead of
+blocking acquisition.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+
+from attribute_cache import AttributeCache
+from lazy_import import lazy_import
+from pytango_client_wrapper import PyTangoClientWrapper
+from spectrum_frame import SPECTRUM_LENGTH, SpectrumFrame, decode_spectrum
+from tango_resilience import TangoClientError
+
+np = lazy_import("numpy")
+tango = lazy_import("tango")
+
+DEFAULT_QUEUE_SIZE = 8
+# The controller is sent a MonitorPing on every PING_EVERY-th timestamp
+PING_EVERY = 10
+
+logger_ = logging.getLogger(__name__)
+
+
+class SpectrumAcquisition:
+    """
+    Retrieves spectrometer results on a worker thread into a bounded queue.
+
+    :param pktcap: Client of the pktcap device, with the spectrometer
+                   configured
+    :param ctrl: Client of the SPFRx controller
+    :param ctrl_cache: Cache of the controller band, kValue and attenuation
+    :param interval_ms: The spectrometer throttle interval in ms
+    :param queue_size: Frames kept for the consumer before the oldest are
+                       dropped
+    :param test_mode: Produce a synthetic ramp instead of reading the
+                      spectrometer and attenuation
+    """
+
+    def __init__(
+            self,
+            pktcap: PyTangoClientWrapper,
+            ctrl: PyTangoClientWrapper,
+            ctrl_cache: AttributeCache,
+            interval_ms: int,
+            queue_size: int = DEFAULT_QUEUE_SIZE,
+            test_mode: bool = False
+            ):
+        self._pktcap = pktcap
+        self._ctrl = ctrl
+        self._ctrl_cache = ctrl_cache
+        self._interval_s = max(interval_ms, 1) / 1000
+        self._test_mode = test_mode
+        self._queue = queue.Queue(maxsize=max(queue_size, 1))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._outage = False
+        self.acquired = 0
+        self.dropped = 0
+        self.invalid = 0
+
+    def start(self) -> None:
+        """
+        Start acquiring on a daemon thread.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="spectrum-acquisition", daemon=True
+        )
+        self._thread.start()
+
+    def stop(
+            self,
+            timeout_s: float = 5.0
+            ) -> None:
+        """
+        Stop acquiring and wait for the current retrieval to finish.
+
+        :param timeout_s: Upper bound on the wait
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout_s)
+
+    def latest(self) -> SpectrumFrame:
+        """
+        Take the newest frame, dropping the older ones still queued.
+
+        :returns: The newest frame, None if there is none since the last call
+        """
+        frame = None
+        while True:
+            try:
+                newer = self._queue.get_nowait()
+            except queue.Empty:
+                return frame
+            if frame is not None:
+                with self._lock:
+                    self.dropped += 1
+            frame = newer
+
+    def next_frame(
+            self,
+            timeout_s: float = None
+            ) -> SpectrumFrame:
+        """
+        Take the oldest queued frame, waiting for one if there is none.
+
+        :param timeout_s: Upper bound on the wait, None to wait forever
+        :returns: The frame, None if there is none after timeout_s
+        """
+        try:
+            return self._queue.get(timeout=timeout_s)
+        except queue.Empty:
+            return None
+
+    def _run(self) -> None:
+        next_s = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                frame = self._acquire()
+                self._set_outage(None)
+                if frame is not None:
+                    self._put(frame)
+            except TangoClientError as e:
+                # Keep trying on the next slot; the circuit breaker keeps a
+                # rebooting board from stacking up timeouts
+                self._set_outage(e)
+            next_s += self._interval_s
+            now = time.monotonic()
+            if next_s < now:
+                # Skip the slots overrun by a slow call
+                next_s += (now - next_s) // self._interval_s * \
+                    self._interval_s + self._interval_s
+            self._stop.wait(next_s - now)
+
+    def _acquire(self) -> SpectrumFrame:
+        if self._test_mode:
+            raw = np.arange(SPECTRUM_LENGTH)
+        else:
+            self._pktcap.command_read_write("spectrometer_retrieve_result")
+            raw = self._pktcap.read_attribute(
+                "spectrometer_spectrum_result", tango.ExtractAs.Numpy
+            )
+        acquired_at = time.time()
+        try:
+            frame = decode_spectrum(raw, acquired_at)
+        except ValueError as e:
+            if self.invalid == 0:
+                logger_.warning(f"Ignoring invalid spectrometer result: {e}")
+            self.invalid += 1
+            return None
+        if not self._test_mode:
+            (frame.atten_h, frame.atten_v, frame.nd_state,
+             frame.nd_mode) = self._ctrl_cache.read_many([
+                "attenuationPolH", "attenuationPolV", "noiseDiodeState",
+                "noiseDiodeMode",
+            ])
+        frame.kvalue, frame.band = self._ctrl_cache.read_many(
+            ["kValue", "configuredBand"]
+        )
+        if frame.timestamp % PING_EVERY == 0:
+            self._ctrl.command_read_write("MonitorPing")
+        return frame
+
+    def _put(
+            self,
+            frame: SpectrumFrame
+            ) -> None:
+        # Single producer: once the oldest frame is taken out there is room
+        try:
+            self._queue.put_nowait(frame)
+        except queue.Full:
+            try:
+                self._queue.get_nowait()
+                with self._lock:
+                    self.dropped += 1
+            except queue.Empty:
+                pass
+            self._queue.put_nowait(frame)
+        with self._lock:
+            self.acquired += 1
+
+    def _set_outage(
+            self,
+            error: TangoClientError
+            ) -> None:
+        # Log the start and the end of a device outage once each
+        if error is not None and not self._outage:
+            logger_.warning(f"SPFRx unavailable, retrying: {error}")
+        elif error is None and self._outage:
+            logger_.info("SPFRx available again, resuming acquisition")
+        self._outage = error is not None
@@ -0,0 +1,167 @@
+"""
+spectrum_frame
+Gated spectrometer results as data, independent of the plotter GUI.
+
+A spectrometer_spectrum_result holds a timestamp word, a spare word, then
+the XX, YY, and the real and imaginary XY products of 1025 channels, with
+the noise diode on then off (8202 words). decode_spectrum turns one into a
+SpectrumFrame:
+
+* products - (ND on/off, XX/YY/XYre/XYim, channel) view of the result
+* xx, yy - (ND on/off, channel) views of the result, no copy made
+* xy - (ND on/off, channel) complex64 cross-spectrum
+
+The dB powers, the XY magnitude and the XY phase are only computed when
+first used, then kept with the frame. Only NumPy is needed, so recording,
+analysis and batch tools can decode spectra without Matplotlib.
+"""
+
+from __future__ import annotations
+
+from lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+SPECTRUM_HEADER = 2
+SPECTRUM_PRODUCTS = 4
+SPECTRUM_CHANNELS = 1025
+SPECTRUM_LENGTH = SPECTRUM_HEADER + 2 * SPECTRUM_PRODUCTS * SPECTRUM_CHANNELS
+PRODUCT_LABELS = ("XX", "YY", "XYre", "XYim")
+ND_LABELS = ("on", "off")
+ND_ON = 0
+ND_OFF = 1
+
+
+def to_db(
+        power,
+        out=None
+        ):
+    """
+    Convert powers to dB, powers below 1 (ie. empty channels) counting
+    as 1 (0 dB).
+
+    :param power: Array of linear powers
+    :param out: Optional float array of the same shape to convert into
+    :returns: The dB array, out if given
+    """
+    if out is None:
+        out = np.empty(np.shape(power), np.float32)
+    np.copyto(out, power, casting="unsafe")
+    np.maximum(out, 1, out=out)
+    np.log10(out, out=out)
+    out *= 10
+    return out
+
+
+class SpectrumFrame:
+    """
+    One spectrometer result and the receiver settings it was taken with.
+
+    :param timestamp: The spectrometer timestamp word
+    :param products: (ND on/off, XX/YY/XYre/XYim, channel) products
+    :param xx: (ND on/off, channel) XX power
+    :param yy: (ND on/off, channel) YY power
+    :param xy: (ND on/off, channel) complex XY cross-spectrum
+    :param acquired_at: Time the result was retrieved, in seconds since the
+                        epoch
+    """
+
+    __slots__ = ("timestamp", "acquired_at", "band", "kvalue", "atten_h",
+                 "atten_v", "nd_state", "nd_mode", "products", "xx", "yy",
+                 "xy", "_xx_db", "_yy_db", "_xy_mag", "_xy_phase")
+
+    def __init__(
+            self,
+            timestamp: int,
+            products,
+            xx,
+            yy,
+            xy,
+            acquired_at: float = None
+            ):
+        self.timestamp = timestamp
+        self.acquired_at = acquired_at
+        self.band = None
+        self.kvalue = None
+        self.atten_h = None
+        self.atten_v = None
+        # noiseDiodeState and noiseDiodeMode of the controller
+        self.nd_state = None
+        self.nd_mode = None
+        self.products = products
+        self.xx = xx
+        self.yy = yy
+        self.xy = xy
+        self._xx_db = None
+        self._yy_db = None
+        self._xy_mag = None
+        self._xy_phase = None
+
+    @property
+    def xx_db(self):
+        """
+        (ND on/off, channel) XX power in dB.
+        """
+        if self._xx_db is None:
+            self._xx_db = to_db(self.xx)
+        return self._xx_db
+
+    @property
+    def yy_db(self):
+        """
+        (ND on/off, channel) YY power in dB.
+        """
+        if self._yy_db is None:
+            self._yy_db = to_db(self.yy)
+        return self._yy_db
+
+    @property
+    def xy_mag(self):
+        """
+        (ND on/off, channel) magnitude of the XY cross-spectrum.
+        """
+        if self._xy_mag is None:
+            self._xy_mag = np.abs(self.xy)
+        return self._xy_mag
+
+    @property
+    def xy_phase(self):
+        """
+        (ND on/off, channel) phase of the XY cross-spectrum in degrees.
+        """
+        if self._xy_phase is None:
+            self._xy_phase = np.angle(self.xy, deg=True).astype(np.float32)
+        return self._xy_phase
+
+
+def decode_spectrum(
+        raw,
+        acquired_at: float = None
+        ) -> SpectrumFrame:
+    """
+    Decode a spectrometer result.
+
+    :param raw: The spectrometer_spectrum_result value, preferably a NumPy
+                array so that XX and YY are views of it
+    :param acquired_at: Time the result was retrieved, in seconds since the
+                        epoch
+    :returns: The SpectrumFrame, without receiver settings
+    :raises ValueError: If raw does not have SPECTRUM_LENGTH words
+    """
+    raw = np.asarray(raw)
+    if raw.shape != (SPECTRUM_LENGTH,):
+        raise ValueError(
+            f"spectrometer result of shape {raw.shape}, expected "
+            f"({SPECTRUM_LENGTH},)"
+        )
+    # (ND on/off, XX/YY/XYre/XYim, channel) view of the result
+    products = raw[SPECTRUM_HEADER:].reshape(
+        2, SPECTRUM_PRODUCTS, SPECTRUM_CHANNELS
+    )
+    xy = np.empty((2, SPECTRUM_CHANNELS), np.complex64)
+    xy.real = products[:, 2]
+    xy.imag = products[:, 3]
+    return SpectrumFrame(
+        int(raw[0]), products, products[:, 0], products[:, 1], xy,
+        acquired_at
+    )
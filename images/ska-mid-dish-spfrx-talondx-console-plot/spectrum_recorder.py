@@ -0,0 +1,240 @@
+"""
+spectrum_recorder
+Recording of spectrometer frames to chunked, compressed HDF5 files.
+
+Frames are collected into a batch in memory and appended to the file one
+batch at a time. A batch is written when it is full or has been waiting
+longer than the flush interval. Every batch is flushed to disk, so an
+interrupted recording keeps all but the frames still in memory. Files
+are rotated when they exceed a size or an age; each file is named after
+the time its first batch was written::
+
+    <prefix>_20261018T101502Z_0000.h5
+
+Each file holds one row per frame in every dataset:
+
+* spectra - (frame, ND on/off, XX/YY/XYre/XYim, channel) products, in the
+  integer type of the spectrometer result
+* timestamp - spectrometer timestamp word
+* acquired_at - time the result was retrieved, in seconds since the epoch
+* band, kvalue, atten_h, atten_v, nd_state, nd_mode - the controller
+  settings the result was taken with; -1 (NaN for the attenuation) when
+  unknown
+
+The file attributes describe the recording (dish, throttle interval,
+product and ND labels). h5py is only imported once a file is written.
+"""
+
+from __future__ import annotations
+
+import datetime
+import logging
+import os
+import time
+from typing import List
+
+from lazy_import import lazy_import
+from spectrum_frame import (
+    ND_LABELS,
+    PRODUCT_LABELS,
+    SPECTRUM_CHANNELS,
+    SPECTRUM_PRODUCTS,
+    SpectrumFrame,
+)
+
+h5py = lazy_import("h5py")
+np = lazy_import("numpy")
+
+DEFAULT_BATCH_FRAMES = 64
+DEFAULT_FLUSH_S = 10.0
+DEFAULT_MAX_FILE_MB = 1024.0
+DEFAULT_MAX_FILE_S = 3600.0
+# Frames per HDF5 chunk of the spectra dataset, about 0.5 MB uncompressed
+CHUNK_FRAMES = 16
+COMPRESSION = "gzip"
+COMPRESSION_LEVEL = 4
+
+# Per-frame metadata: name, dtype, value when unknown
+METADATA = (
+    ("timestamp", "i8", -1),
+    ("acquired_at", "f8", float("nan")),
+    ("band", "i2", -1),
+    ("kvalue", "i4", -1),
+    ("atten_h", "f4", float("nan")),
+    ("atten_v", "f4", float("nan")),
+    ("nd_state", "i2", -1),
+    ("nd_mode", "i2", -1),
+)
+
+logger_ = logging.getLogger(__name__)
+
+
+class SpectrumRecorder:
+    """
+    Appends frames to a rotating set of HDF5 files.
+
+    :param prefix: Path prefix of the files, eg. /data/rfi-survey
+    :param attrs: Attributes written to every file, eg. the dish
+    :param batch_frames: Frames written to the file at once
+    :param flush_s: Upper bound in seconds on the time a frame waits in
+                    memory
+    :param max_file_mb: Size of a file in MB after which the next batch
+                        starts a new file; 0 for no limit
+    :param max_file_s: Age of a file in seconds after which the next batch
+                       starts a new file; 0 for no limit
+    """
+
+    def __init__(
+            self,
+            prefix: str,
+            attrs: dict = None,
+            batch_frames: int = DEFAULT_BATCH_FRAMES,
+            flush_s: float = DEFAULT_FLUSH_S,
+            max_file_mb: float = DEFAULT_MAX_FILE_MB,
+            max_file_s: float = DEFAULT_MAX_FILE_S
+            ):
+        self.prefix = prefix
+        self.attrs = dict(attrs or {})
+        self.batch_frames = max(batch_frames, 1)
+        self.flush_s = flush_s
+        self.max_file_bytes = max_file_mb * 1e6
+        self.max_file_s = max_file_s
+        self.files: List[str] = []
+        self.frames_written = 0
+
+        self._file = None
+        self._file_frames = 0
+        self._file_opened_at = 0.0
+        self._spectra = None
+        self._metadata = {}
+        self._batched = 0
+        self._batch_started_at = 0.0
+
+    def write(
+            self,
+            frame: SpectrumFrame
+            ) -> None:
+        """
+        Add a frame to the batch, writing the batch when it is full or due.
+
+        :param frame: The frame to record
+        """
+        if self._spectra is None:
+            self._allocate(frame.products.dtype)
+        if self._batched == 0:
+            self._batch_started_at = time.monotonic()
+        self._spectra[self._batched] = frame.products
+        for name, _, unknown in METADATA:
+            value = getattr(frame, name)
+            self._metadata[name][self._batched] = \
+                unknown if value is None else value
+        self._batched += 1
+        if self._batched == self.batch_frames:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self) -> None:
+        """
+        Write the batch if its oldest frame has waited for flush_s.
+        """
+        if self._batched and \
+                time.monotonic() - self._batch_started_at >= self.flush_s:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Append the batch to the current file, starting a new file first if
+        the current one is due for rotation.
+        """
+        if self._batched == 0:
+            return
+        if self._file is not None and self._rotation_due():
+            self._close_file()
+        if self._file is None:
+            self._open_file()
+
+        n, start = self._batched, self._file_frames
+        datasets = [("spectra", self._spectra)] + [
+            (name, self._metadata[name]) for name, _, _ in METADATA
+        ]
+        for name, batch in datasets:
+            dataset = self._file[name]
+            dataset.resize(start + n, axis=0)
+            dataset[start:start + n] = batch[:n]
+        self._file.flush()
+        self._file_frames += n
+        self.frames_written += n
+        self._batched = 0
+
+    def close(self) -> None:
+        """
+        Write the frames still in memory and close the current file.
+        """
+        self.flush()
+        if self._file is not None:
+            self._close_file()
+
+    def _allocate(self, dtype) -> None:
+        self._spectra = np.empty(
+            (self.batch_frames, 2, SPECTRUM_PRODUCTS, SPECTRUM_CHANNELS),
+            dtype
+        )
+        self._metadata = {
+            name: np.empty(self.batch_frames, dtype)
+            for name, dtype, _ in METADATA
+        }
+
+    def _rotation_due(self) -> bool:
+        if self.max_file_bytes > 0 and \
+                self._file.id.get_filesize() >= self.max_file_bytes:
+            return True
+        return self.max_file_s > 0 and \
+            time.monotonic() - self._file_opened_at >= self.max_file_s
+
+    def _open_file(self) -> None:
+        started = datetime.datetime.now(datetime.timezone.utc)
+        path = (
+            f"{self.prefix}_{started.strftime('%Y%m%dT%H%M%SZ')}_"
+            f"{len(self.files):04d}.h5"
+        )
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # "w-" never overwrites an existing recording
+        self._file = h5py.File(path, "w-")
+        self._file_frames = 0
+        self._file_opened_at = time.monotonic()
+        self.files.append(path)
+
+        self._file.attrs.update(self.attrs)
+        self._file.attrs["created"] = started.isoformat(
+            timespec="microseconds").replace("+00:00", "Z")
+        self._file.attrs["products"] = list(PRODUCT_LABELS)
+        self._file.attrs["noise_diode"] = list(ND_LABELS)
+        self._file.create_dataset(
+            "spectra",
+            shape=(0,) + self._spectra.shape[1:],
+            maxshape=(None,) + self._spectra.shape[1:],
+            dtype=self._spectra.dtype,
+            chunks=(CHUNK_FRAMES,) + self._spectra.shape[1:],
+            compression=COMPRESSION,
+            compression_opts=COMPRESSION_LEVEL,
+            shuffle=True,
+        )
+        for name, dtype, _ in METADATA:
+            self._file.create_dataset(
+                name, shape=(0,), maxshape=(None,), dtype=dtype,
+                chunks=(1024,)
+            )
+        logger_.info(f"Recording to {path}")
+
+    def _close_file(self) -> None:
+        path = self._file.filename
+        size = self._file.id.get_filesize()
+        self._file.close()
+        self._file = None
+        logger_.info(
+            f"Closed {path}: {self._file_frames} frames, "
+            f"{size / 1e6:.1f} MB"
+        )
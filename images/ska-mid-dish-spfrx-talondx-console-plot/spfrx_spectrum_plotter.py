@@ -1,17 +1,47 @@
 #!/usr/bin/env python3
+from __future__ import annotations
+
 import argparse
+import atexit
 import getpass
+import importlib.util
 import logging
-import numpy as np
-import tango
-import tkinter
-import matplotlib
-import matplotlib.animation as anim
-import matplotlib.pyplot as plt
-
+import os
+import signal
+import threading
+import time
+
+from attribute_cache import (
+    DEFAULT_CACHE_TTL_S,
+    DEFAULT_POLL_PERIOD_MS,
+    AttributeCache,
+)
+from lazy_import import lazy_import
 from pytango_client_wrapper import PyTangoClientWrapper
+from spectrum_acquisition import DEFAULT_QUEUE_SIZE, SpectrumAcquisition
+from spectrum_frame import (
+    ND_LABELS,
+    ND_OFF,
+    ND_ON,
+    SPECTRUM_CHANNELS,
+    SpectrumFrame,
+    to_db,
+)
+from spectrum_recorder import (
+    DEFAULT_MAX_FILE_MB,
+    DEFAULT_MAX_FILE_S,
+    SpectrumRecorder,
+)
+from tango_call_stats import STATS_FORMATS, dump_stats_at_exit
+from tango_resilience import TangoClientError
+
+# numpy and matplotlib are only imported once the plotter starts, so
+# -v and -h return without paying for them
+np = lazy_import("numpy")
+matplotlib = lazy_import("matplotlib")
+plt = lazy_import("matplotlib.pyplot")
 
-matplotlib.use("TkAgg")
+PLOT_BACKEND = "TkAgg"
 
 LOG_FORMAT = (
     "[spfrx_spectrum_plotter.py: line %(lineno)s]%(levelname)s: %(message)s"
@@ -22,35 +52,70 @@ SPFRX_DEVICE = "ska001"
 SPFRX_NAME = "spfrxpu"
 SPFRX_CTRL_ALIAS = "controller"
 SPFRX_PKTCAP_ALIAS = "pktcap"
+# Overrides the FQDN format, eg. to address the devices of spfrx_simulator.py
+FQDN_FORMAT_ENV = "SPFRX_FQDN_FORMAT"
+FQDN_FORMAT = "{device}/{name}/{alias}"
 
 DEFAULT_THROTTLE_INTERVAL = 100
 DEFAULT_NUM_PACKETS = 50
 DEFAULT_UPDATE_INTERVAL = 1000
+# Spectra queued while recording, about 8 MB and 25 s at 100 ms
+DEFAULT_RECORD_QUEUE_SIZE = 256
+# Longest wait for a spectrum before the recorder checks for a due flush
+RECORD_POLL_S = 0.5
+
+# Legend of the (noise diode off, noise diode on) lines of each plot
+ND_LEGEND = [f"ND {ND_LABELS[nd].capitalize()}" for nd in (ND_OFF, ND_ON)]
+
+# Controller attributes read on every frame that rarely change
+CACHED_CTRL_ATTRIBUTES = [
+    "kValue",
+    "configuredBand",
+    "attenuationPolH",
+    "attenuationPolV",
+    "noiseDiodeState",
+    "noiseDiodeMode",
+]
 
 
 class SpectrumPlotter:
 
     _test_mode: bool
-    _raw = []
 
+    _fig = None
     _ax1 = None
     _ax2 = None
     _ax3 = None
     _ax4 = None
     _textbox = None
-
-    _data_xx = []
-    _data_yy = []
-    _data_xy_re = []
-    _data_xy_im = []
+    _atten_h_text = None
+    _atten_v_text = None
+    _timer = None
+
+    # (ND off, ND on) artists of each axes, created once by createPlot
+    _lines: list
+    _phase_scatters: tuple
+    _animated: list
+    _background = None
+    _axes_key = None
+
+    # (ND on/off, channel) views of the display buffers
+    _data_xx: np.ndarray
+    _data_yy: np.ndarray
+    _data_xy_re: np.ndarray
+    _data_xy_im: np.ndarray
 
     _ctrl_proxy = None
     _pktcap_proxy = None
+    _ctrl_cache: AttributeCache
+    _acquisition: SpectrumAcquisition
+    _rendered: int
 
     _throttle_interval: int
     _n_packets: int
     _update_interval: int
     _mag: bool
+    _queue_size: int
 
     def __init__(
             self,
@@ -62,7 +127,12 @@ class SpectrumPlotter:
             name: str = SPFRX_NAME,
             ctrl: str = SPFRX_CTRL_ALIAS,
             pktcap: str = SPFRX_PKTCAP_ALIAS,
-            test_mode: bool = False
+            test_mode: bool = False,
+            cache_ttl_s: float = DEFAULT_CACHE_TTL_S,
+            poll_period_ms: int = DEFAULT_POLL_PERIOD_MS,
+            queue_size: int = DEFAULT_QUEUE_SIZE,
+            recorder: SpectrumRecorder = None,
+            record_duration_s: float = 0
             ) -> None:
         """
         Initialize the plot object
@@ -70,8 +140,8 @@ class SpectrumPlotter:
         :param trottle_interval: The throttle interval for the Gated
                                  Spectrometer expressed in ms.
         :param n_packets: The number of packets to capture in each interval.
-        :param update_interval: The interval in ms in which to read the
-                                spectrum and reset the Gated Spectrometer
+        :param update_interval: The interval in ms in which to draw the
+                                newest spectrum
         :param mag: A boolean to indicate display of cross product magnitude
                     is requested rather than read/imaginary
         :param device: (Optional) Override the device part of FQDN
@@ -80,6 +150,18 @@ class SpectrumPlotter:
         :param pktcap: (Optional) Override the alias part of pktcap device
         :param test_mode: (Optional) Run in test mode if True.
                           Default is False.
+        :param cache_ttl_s: (Optional) Seconds the slow-changing controller
+                            attributes are reused without a device read;
+                            0 reads them on every frame.
+        :param poll_period_ms: (Optional) Server-side polling period of
+                               those attributes, removed again on exit;
+                               0 (default) leaves polling unchanged.
+        :param queue_size: (Optional) Spectra kept between acquisition and
+                           display before the oldest are dropped.
+        :param recorder: (Optional) Record the spectra with this recorder
+                         instead of displaying them.
+        :param record_duration_s: (Optional) Seconds to record for; 0
+                                  records until interrupted.
         """
 
         self._device = device
@@ -91,6 +173,9 @@ class SpectrumPlotter:
         self._n_packets = n_packets
         self._update_interval = update_interval
         self._mag = mag
+        self._queue_size = queue_size
+        self._rendered = 0
+        self.allocateBuffers()
 
         self._test_mode = test_mode
 
@@ -102,7 +187,9 @@ class SpectrumPlotter:
             f"  Number of Packets: {self._n_packets} packets\n"
             f"  Update interval: {self._update_interval} ms\n"
             f"  Plot type: {'Magnitudes' if self._mag else 'Real/Imaginary'}\n"
-            f"  Test mode: {'ENGAGED' if self._test_mode else 'NOT ACTIVE'}"
+            f"  Test mode: {'ENGAGED' if self._test_mode else 'NOT ACTIVE'}\n"
+            "  Recording: "
+            f"{recorder.prefix if recorder is not None else 'NOT ACTIVE'}"
             )
 
         logger_.info(
@@ -116,13 +203,41 @@ class SpectrumPlotter:
             self._ctrl_proxy = PyTangoClientWrapper()
             self._ctrl_proxy.create_tango_client(self.getFqdn(self._ctrl))
             self._ctrl_proxy.set_timeout_millis(5000)
-        except tango.DevFailed:
-            tango.Except.throw_exception(
-                "UNABLE TO ESTABLISH DEVICE PROXIES")
+
+            self._ctrl_cache = AttributeCache(self._ctrl_proxy, cache_ttl_s)
+            if poll_period_ms > 0:
+                self._ctrl_cache.enable_polling(
+                    CACHED_CTRL_ATTRIBUTES, poll_period_ms
+                )
+                # The server stores the polling in the Tango DB
+                atexit.register(self._ctrl_cache.disable_polling)
+            self._ctrl_cache.subscribe(CACHED_CTRL_ATTRIBUTES)
+        except TangoClientError as e:
+            logger_.error(f"UNABLE TO ESTABLISH DEVICE PROXIES: {e}")
             exit(1)
 
+        if recorder is None:
+            self.plotInit()
+        else:
+            self.recordInit(recorder, record_duration_s)
 
-        self.plotInit()
+    def allocateBuffers(
+            self
+            ) -> None:
+        """
+        Allocate the parse and display buffers reused by every frame: dB
+        power of XX and YY, XY real and imaginary, XY magnitude and phase,
+        each for ND on and off.
+        """
+        self._power_db = np.empty((2, 2, SPECTRUM_CHANNELS), np.float32)
+        self._cross = np.empty((2, 2, SPECTRUM_CHANNELS), np.float32)
+        self._zeros = np.empty((2, 2, SPECTRUM_CHANNELS), bool)
+        self._data_xx, self._data_yy = self._power_db
+        self._data_xy_re, self._data_xy_im = self._cross
+        self._xy_mag = np.empty((2, SPECTRUM_CHANNELS), np.float32)
+        self._xy_phase = np.empty((2, SPECTRUM_CHANNELS), np.float32)
+        self._phase_offsets = np.empty((2, SPECTRUM_CHANNELS, 2))
+        self._phase_offsets[:, :, 0] = np.arange(SPECTRUM_CHANNELS)
 
     def getFqdn(
             self, 
@@ -134,22 +249,25 @@ class SpectrumPlotter:
 
         device/name/alias
 
+        The form can be overridden with the SPFRX_FQDN_FORMAT environment
+        variable.
+
         :param alias: Alias string
         :param device: Device string, defaults to SPFRX_DEVICE
         :param name: Name string, defaults to SPFRX_NAME
         :returns: A TANGO FQDN string
         """
-        return f"{self._device}/{self._name}/{alias}"
+        fqdn_format = os.environ.get(FQDN_FORMAT_ENV) or FQDN_FORMAT
+        return fqdn_format.format(
+            device=self._device, name=self._name, alias=alias
+        )
 
-    def plotInit(
+    def configureSpectrometer(
             self
-            ):
+            ) -> None:
         """
-        Initialize the plot object
+        Configure the Gated Spectrometer and enable it in the controller
         """
-
-        logger_.info("Initializing the Gated Spectrometer Plotter")
-
         try:
             if not self._test_mode:
                 self._pktcap_proxy.write_attribute(
@@ -160,291 +278,369 @@ class SpectrumPlotter:
                     "spectrometer_num_packets",
                     self._n_packets
                 )
-        except tango.DevFailed:
-            tango.Except.throw_exception(
-                "UNABLE TO CONFIGURE PKTCAP PARAMETERS")
+        except TangoClientError as e:
+            logger_.error(f"UNABLE TO CONFIGURE PKTCAP PARAMETERS: {e}")
             exit(1)
 
         logger_.info("Configuring Spectrometer pktcap to use LW bridge...")
         try:
             self._pktcap_proxy.command_read_write("spectrometer_set_bridge", 1)
-        except tango.DevFailed:
-            tango.Except.throw_exception(
-                "UNABLE TO SET LW BRIDGE MODE")
+        except TangoClientError as e:
+            logger_.error(f"UNABLE TO SET LW BRIDGE MODE: {e}")
             exit(1)
         logger_.info("Enabling Spectrometer in Controller ds...")
         try:
             self._ctrl_proxy.command_read_write("SpectrometerCtrl", 1)
-        except tango.DevFailed:
-            tango.Except.throw_exception(
-                "UNABLE TO SET LW BRIDGE MODE")
+        except TangoClientError as e:
+            logger_.error(f"UNABLE TO ENABLE SPECTROMETER: {e}")
             exit(1)
 
+    def plotInit(
+            self
+            ):
+        """
+        Initialize the plot object
+        """
+
+        logger_.info("Initializing the Gated Spectrometer Plotter")
+        self.configureSpectrometer()
+
+        matplotlib.use(PLOT_BACKEND)
         fig = self.createPlot()
 
-        a = anim.FuncAnimation(fig, self.update, frames=1, repeat=True)
+        # Spectra are acquired at the throttle interval on their own
+        # thread, so neither Tango calls nor drawing hold up the other
+        self._acquisition = SpectrumAcquisition(
+            self._pktcap_proxy,
+            self._ctrl_proxy,
+            self._ctrl_cache,
+            self._throttle_interval,
+            self._queue_size,
+            self._test_mode
+        )
+        self._acquisition.start()
+
+        # The frames are blitted by update, so a plain timer drives them
+        # rather than an animation that would redraw the whole figure
+        self._timer = fig.canvas.new_timer(interval=self._update_interval)
+        self._timer.add_callback(self.update)
+        self._timer.start()
         plt.show()
 
+        self._acquisition.stop()
+        logger_.info(
+            f"Spectra acquired: {self._acquisition.acquired}, "
+            f"rendered: {self._rendered}, "
+            f"dropped: {self._acquisition.dropped}"
+        )
+
+    def recordInit(
+            self,
+            recorder: SpectrumRecorder,
+            duration_s: float = 0
+            ) -> None:
+        """
+        Record spectra without a display, until duration_s has elapsed or
+        the recorder is interrupted (Ctrl-C, or SIGTERM eg. from docker
+        stop). Spectra are acquired on their own thread, so writing files
+        never delays acquisition.
+
+        :param recorder: The recorder to write the spectra with
+        :param duration_s: Seconds to record for; 0 records until
+                           interrupted
+        """
+
+        logger_.info("Initializing the Gated Spectrometer Recorder")
+        self.configureSpectrometer()
+
+        self._acquisition = SpectrumAcquisition(
+            self._pktcap_proxy,
+            self._ctrl_proxy,
+            self._ctrl_cache,
+            self._throttle_interval,
+            self._queue_size,
+            self._test_mode
+        )
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        end_s = time.monotonic() + duration_s if duration_s > 0 else None
+
+        self._acquisition.start()
+        try:
+            while not stop.is_set() and \
+                    (end_s is None or time.monotonic() < end_s):
+                frame = self._acquisition.next_frame(RECORD_POLL_S)
+                if frame is None:
+                    recorder.flush_if_due()
+                else:
+                    recorder.write(frame)
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            logger_.error(f"UNABLE TO WRITE RECORDING: {e}")
+            self._acquisition.stop()
+            exit(1)
+
+        self._acquisition.stop()
+        # Spectra acquired before the stop are still recorded
+        frame = self._acquisition.next_frame(0)
+        while frame is not None:
+            recorder.write(frame)
+            frame = self._acquisition.next_frame(0)
+        recorder.close()
+        logger_.info(
+            f"Spectra acquired: {self._acquisition.acquired}, "
+            f"recorded: {recorder.frames_written}, "
+            f"dropped: {self._acquisition.dropped}, "
+            f"files: {len(recorder.files)}"
+        )
+
     def createPlot(
             self
             ) -> plt.Figure:
         """
-        Create the matplotlib Figure object
+        Create the matplotlib Figure object with all of its artists. Only
+        the artists drawn with animated=True change from frame to frame;
+        the rest of the figure is rendered once into the blit background.
         """
 
         fig = plt.figure(figsize=(16, 6))
+        self._fig = fig
         self._ax1 = fig.add_subplot(141)
-
-        self._textbox = self._ax1.text(
-            0.05, 0.95, "", transform=plt.gcf().transFigure
-        )
         self._ax2 = fig.add_subplot(142, sharey=self._ax1)
         self._ax3 = fig.add_subplot(143)
         self._ax4 = fig.add_subplot(144)
+        axes = (self._ax1, self._ax2, self._ax3, self._ax4)
+
+        channels = np.arange(SPECTRUM_CHANNELS)
+        zeros = np.zeros(SPECTRUM_CHANNELS)
+        self._lines = []
+        for ax in axes:
+            if ax is self._ax4 and self._mag:
+                self._lines.append(())
+                continue
+            off, = ax.plot(channels, zeros, "r", animated=True)
+            on, = ax.plot(channels, zeros, "b", animated=True)
+            self._lines.append((off, on))
+            ax.legend(ND_LEGEND, loc="upper right")
+            ax.set_xlabel("Frequency (MHz)")
+            ax.set_xlim(1, 1024)
+            ax.grid()
+
+        for ax, title in (
+                (self._ax1, "Vertical Polarization"),
+                (self._ax2, "Horizontal Polarization")):
+            ax.set_ylabel("Power (dB, uncal)")
+            ax.set_title(title)
+            ax.set_ylim(20, 95)
+
+        if self._mag:
+            self._ax3.set_ylabel("Magnitude (dB)")
+            self._ax3.set_ylim(0, 95)
+            self._ax3.set_title("Magnitude")
+            self._phase_scatters = tuple(
+                self._ax4.scatter(
+                    channels, zeros, c=color, marker=".", linewidths=0.5,
+                    animated=True
+                )
+                for color in ("r", "b")
+            )
+            self._ax4.legend(
+                self._phase_scatters, ND_LEGEND, loc="upper right"
+            )
+            self._ax4.set_ylabel("Phase")
+            self._ax4.set_ylim(-240, 240)
+            self._ax4.set_title("Phase")
+            self._ax4.set_xlabel("Frequency (MHz)")
+            self._ax4.set_xlim(1, 1024)
+            self._ax4.grid()
+            piover2 = np.rad2deg([np.pi / 2, np.pi / 2])
+            self._ax4.plot([0, 1025], piover2, color="black", linestyle="--")
+            self._ax4.plot([0, 1025], [0, 0], color="black", linestyle="--")
+            self._ax4.plot(
+                [0, 1025], -1.0 * piover2, color="black", linestyle="--"
+            )
+        else:
+            self._phase_scatters = ()
+            for ax, title in (
+                    (self._ax3, "Cross Power (Real)"),
+                    (self._ax4, "Cross Power (Imaginary)")):
+                ax.set_ylabel("Power")
+                ax.set_ylim(-30000, 30000)
+                ax.set_title(title)
+        self._ax3.yaxis.set_label_coords(-0.1, 0.5)
+        self._ax4.yaxis.set_label_coords(-0.1, 0.5)
+
+        self._textbox = fig.text(0.05, 0.95, "", animated=True)
+        self._atten_h_text = self._ax1.annotate(
+            "", xy=(0.15, 0.8), xycoords="figure fraction", animated=True
+        )
+        self._atten_v_text = self._ax2.annotate(
+            "", xy=(0.35, 0.8), xycoords="figure fraction", animated=True
+        )
+
+        self._animated = [
+            artist for pair in self._lines for artist in pair
+        ] + list(self._phase_scatters) + [
+            self._textbox, self._atten_h_text, self._atten_v_text
+        ]
+        self._background = None
+        self._axes_key = None
+        fig.canvas.mpl_connect("draw_event", self.onDraw)
 
         return fig
 
-    def update(
-            self, test
+    def onDraw(
+            self,
+            event
             ) -> None:
         """
-        Update the data within the plot.
+        Capture the static part of the figure after each full draw (eg.
+        on start-up, a resize or new frequency axes), then draw the
+        current data over it.
         """
-        attH = ""
-        attV = ""
-
-        try:
-            if self._test_mode:
-                self._raw = range(8202)
-            else:
-                self._pktcap_proxy.command_read_write(
-                    "spectrometer_retrieve_result"
-                )
-                self._raw = self._pktcap_proxy.read_attribute(
-                    "spectrometer_spectrum_result"
-                )
-                attH = self._ctrl_proxy.read_attribute(
-                    "attenuationPolH"
-                )
-                attV = self._ctrl_proxy.read_attribute(
-                    "attenuationPolV"
-                )
-                if attH is None:
-                    attH = -1
-                if attV is None:
-                    attV = -1
-        except tango.DevFailed:
-            tango.Except.throw_exception(
-                "UNABLE TO READ FROM PKTCAP")
+        canvas = self._fig.canvas
+        self._background = canvas.copy_from_bbox(self._fig.bbox)
+        for artist in self._animated:
+            self._fig.draw_artist(artist)
 
-        timestamp = self.parseData()
+    def blit(
+            self
+            ) -> None:
+        """
+        Draw the animated artists over the captured background and copy
+        the result to the screen, without rendering the rest of the figure.
+        """
+        canvas = self._fig.canvas
+        if self._background is None:
+            # No full draw yet, eg. before the window is shown
+            canvas.draw()
+            return
+        canvas.restore_region(self._background)
+        for artist in self._animated:
+            self._fig.draw_artist(artist)
+        canvas.blit(self._fig.bbox)
+        canvas.flush_events()
+
+    def setFrequencyAxes(
+            self,
+            band: int,
+            kvalue: int
+            ) -> None:
+        """
+        Label the channels of every axes with their frequency in MHz for
+        the band and kValue, then redraw the figure and its background.
+        """
+        if band == 3:
+            range_low = (3.168e9 + (kvalue * 1440)) / 2 / 1e6
+            range_high = (3.168e9 + (kvalue * 1440)) / 1e6
+        else:
+            range_low = 0
+            range_high = (3.96e9 + (1 / 1800)) / 2 / 1e6
 
-        self.updatePlot(timestamp, attH, attV)
+        ticks = np.linspace(0, 1025, 7)
+        labels = np.linspace(range_low, range_high, 7, dtype=int)
+        for ax in (self._ax1, self._ax2, self._ax3, self._ax4):
+            ax.set_xticks(ticks)
+            ax.set_xticklabels(labels)
+        self._fig.canvas.draw()
 
-        if timestamp % 10 == 0:
-            self._ctrl_proxy.command_read_write("MonitorPing")
-        plt.pause(self._update_interval / 1000)
+    def update(
+            self
+            ) -> None:
+        """
+        Draw the newest acquired spectrum, if there is one since the last
+        update.
+        """
+        frame = self._acquisition.latest()
+        if frame is None:
+            return
+        timestamp = self.parseData(frame)
+        self.updatePlot(timestamp, frame)
+        self._rendered += 1
 
     def parseData(
-            self
+            self,
+            frame: SpectrumFrame
             ) -> int:
         """
-        Parse the raw spectrometer data.
+        Convert a decoded spectrum into the display buffers, without any
+        per-frame array allocation.
 
+        :param frame: The SpectrumFrame to display
         :returns: An integer timestamp
         """
-        if self._raw is not None:
-            timestamp = self._raw[0]  # | (raw_data[1] << 16)
+        to_db(frame.xx, out=self._data_xx)
+        to_db(frame.yy, out=self._data_yy)
 
-            self._data_xx = np.array([self._raw[2:1027], self._raw[4102:5127]])
-            self._data_xx = np.where(self._data_xx != 0, self._data_xx, 1)
-            self._data_xx = 10 * np.log10(self._data_xx)
+        # Zero cross products are displayed as 1
+        cross = self._cross
+        np.copyto(self._data_xy_re, frame.xy.real)
+        np.copyto(self._data_xy_im, frame.xy.imag)
+        np.equal(cross, 0, out=self._zeros)
+        np.copyto(cross, 1, where=self._zeros)
 
-            self._data_yy = np.array([self._raw[1027:2052], self._raw[5127:6152]])
-            self._data_yy = np.where(self._data_yy != 0, self._data_yy, 1)
-            self._data_yy = 10 * np.log10(self._data_yy)
-
-            self._data_xy_re = np.array(
-                [self._raw[2052:3077], self._raw[6152:7177]]
-            )
-            self._data_xy_re = np.where(self._data_xy_re != 0, self._data_xy_re, 1)
-
-            self._data_xy_im = np.array(
-                [self._raw[3077:4102], self._raw[7177:8202]]
-            )
-            self._data_xy_im = np.where(self._data_xy_im != 0, self._data_xy_im, 1)
-
-            return timestamp
-        return 0
+        return frame.timestamp
 
     def updatePlot(
             self,
             timestamp: int,
-            attH: float = -1,
-            attV: float = -1
+            frame: SpectrumFrame
             ) -> None:
         """
-        Update the plot figure object.
-        """
+        Update the plot figure object with the parsed spectrum. The axes are
+        only rebuilt when the band or kValue changes; otherwise only the
+        data of the lines and text is replaced and blitted.
 
-        mag = self._mag
-
-        try:
-            kvalue = self._ctrl_proxy.read_attribute("kValue")
-            band = self._ctrl_proxy.read_attribute("configuredBand")
-        except tango.DevFailed:
-            tango.Except.throw_exception(
-                "UNABLE TO READ FROM CONTROLLER")
+        :param timestamp: The spectrometer timestamp
+        :param frame: The frame the spectrum was parsed from, for its band,
+                      kValue and attenuation
+        """
 
-        if band == 3:
-            range_low = (3.168e9 + (kvalue * 1440)) / 2 / 1e6
-            range_high = (3.168e9 + (kvalue * 1440)) / 1e6
-        else:
-            range_low = 0
-            range_high = (3.96e9 + (1 / 1800)) / 2 / 1e6
+        band, kvalue = frame.band, frame.kvalue
+        attH, attV = frame.atten_h, frame.atten_v
+        if (band, kvalue) != self._axes_key:
+            self._axes_key = (band, kvalue)
+            self.setFrequencyAxes(band, kvalue)
 
-        self._ax1.cla()
-        self._ax1.plot(self._data_xx[1], "r", self._data_xx[0], "b")
-        self._ax1.legend(["ND Off", "ND On"])
-        self._ax1.set_xlabel("Frequency (MHz)")
-        self._ax1.set_ylabel("Power (dB, uncal)")
-        self._ax1.set_title("Vertical Polarization")
-        self._ax1.set_ylim(20, 95)
-        self._ax1.set_xlim(1, 1024)
-        self._ax1.grid()
-
-        plt.setp(
-            self._ax1,
-            xticks=(np.linspace(0, 1025, 7)),
-            xticklabels=(
-                np.linspace(range_low, int(range_high), 7, dtype=int)
-            ),
+        self._textbox.set_text(
+            f"BAND {band}  kValue {kvalue}  time {str(timestamp)}  "
+            f"rendered {self._rendered + 1}/{self._acquisition.acquired}  "
+            f"dropped {self._acquisition.dropped}"
         )
-        if attH >= 0:
-            self._ax1.annotate(
-                f"Atten: {attH} dB", xy=(0.15, 0.8), xycoords="figure fraction"
-            )
-
-        self._textbox = self._ax1.text(
-            0.05, 0.95, "", transform=plt.gcf().transFigure
+        self._atten_h_text.set_text(
+            f"Atten: {attH} dB" if attH is not None and attH >= 0 else ""
         )
-        anno_str = f"BAND {band}  kValue {kvalue}  time {str(timestamp)}"
-        self._textbox.set_text(anno_str)
-
-        self._ax2.cla()
-        self._ax2.plot(self._data_yy[1], "r", self._data_yy[0], "b")
-        self._ax2.legend(["ND Off", "ND On"])
-        self._ax2.set_xlabel("Frequency (MHz)")
-        self._ax2.set_ylabel("Power (dB, uncal)")
-        self._ax2.set_title("Horizontal Polarization")
-        self._ax2.set_ylim(20, 95)
-        self._ax2.set_xlim(1, 1024)
-        self._ax2.grid()
-
-        plt.setp(
-            self._ax2,
-            xticks=(np.linspace(0, 1025, 7)),
-            xticklabels=(np.linspace(range_low, range_high, 7, dtype=int)),
+        self._atten_v_text.set_text(
+            f"Atten: {attV} dB" if attV is not None and attV >= 0 else ""
         )
-        if attV >= 0:
-            self._ax2.annotate(
-                f"Atten: {attV} dB", xy=(0.35, 0.8), xycoords="figure fraction"
-            )
 
-        if mag:
+        if self._mag:
             # calculate power values
-            data_xy_mag_ndoff = 5.0 * np.log(
-                np.sqrt(
-                    np.square(self._data_xy_re[1])
-                    + np.square(self._data_xy_im[1])
-                )
-            )
-            data_xy_mag_ndon = 5.0 * np.log(
-                np.sqrt(
-                    np.square(self._data_xy_re[0])
-                    + np.square(self._data_xy_im[0])
-                )
-            )
-
-        self._ax3.cla()
-        if mag:
-            self._ax3.plot(data_xy_mag_ndoff, "r", data_xy_mag_ndon, "b")
-            self._ax3.set_ylabel("Magnitude (dB)")
-            self._ax3.set_ylim(0, 95)
-            self._ax3.set_title("Magnitude")
-        else:
-            self._ax3.plot(self._data_xy_re[1], "r", self._data_xy_re[0], "b")
-            # , data_xy_re[1], 'g', data_xy_im[1], 'y')
-            self._ax3.set_ylabel("Power")
-            self._ax3.set_ylim(-30000, 30000)
-            self._ax3.set_title("Cross Power (Real)")
-
-        self._ax3.legend(["ND Off", "ND On"])  # , 'XY* Re', 'XY* Im'])
-        self._ax3.set_xlabel("Frequency (MHz)")
-        self._ax3.yaxis.set_label_coords(-0.1, 0.5)
-        self._ax3.set_xlim(1, 1024)
-        self._ax3.grid()
-
-        plt.setp(
-            self._ax3,
-            xticks=(np.linspace(0, 1025, 7)),
-            xticklabels=(np.linspace(range_low, range_high, 7, dtype=int)),
-        )
-
-        if mag:
+            data_xy_mag = self._xy_mag
+            np.hypot(self._data_xy_re, self._data_xy_im, out=data_xy_mag)
+            np.log(data_xy_mag, out=data_xy_mag)
+            data_xy_mag *= 5.0
             # calculate phase values
-            data_xy_phase_ndoff = np.rad2deg(
-                np.arctan2(self._data_xy_im[1], self._data_xy_re[1])
-            )
-            data_xy_phase_ndon = np.rad2deg(
-                np.arctan2(self._data_xy_im[0], self._data_xy_re[0])
+            data_xy_phase = self._xy_phase
+            np.arctan2(self._data_xy_im, self._data_xy_re, out=data_xy_phase)
+            np.rad2deg(data_xy_phase, out=data_xy_phase)
+            series = (self._data_xx, self._data_yy, data_xy_mag)
+            self._phase_offsets[:, :, 1] = data_xy_phase
+            for scatter, offsets in zip(
+                    self._phase_scatters, self._phase_offsets[::-1]):
+                scatter.set_offsets(offsets)
+        else:
+            series = (
+                self._data_xx, self._data_yy, self._data_xy_re,
+                self._data_xy_im
             )
 
-        self._ax4.cla()
-        if mag:
-            self._ax4.scatter(
-                range(1025),
-                data_xy_phase_ndoff,
-                c="r",
-                marker=".",
-                linewidths=0.5,
-            )
-            self._ax4.scatter(
-                range(1025),
-                data_xy_phase_ndon,
-                c="b",
-                marker=".",
-                linewidths=0.5,
-            )
-            self._ax4.set_ylabel("Phase")
-            self._ax4.set_ylim(-240, 240)
-            self._ax4.set_title("Phase")
-        else:
-            self._ax4.plot(
-                self._data_xy_im[1], "r", self._data_xy_im[0], "b"
-            )  # , data_xy_re[1], 'g', data_xy_im[1], 'y')
-            self._ax4.set_ylabel("Power")
-            self._ax4.set_ylim(-30000, 30000)
-            self._ax4.set_title("Cross Power (Imaginary)")
-        self._ax4.legend(["ND Off", "ND On"])  # , 'XY* Re', 'XY* Im'])
-        self._ax4.set_xlabel("Frequency (MHz)")
-        self._ax4.yaxis.set_label_coords(-0.1, 0.5)
-        self._ax4.set_xlim(1, 1024)
-        self._ax4.grid()
+        for (off, on), data in zip(self._lines, series):
+            off.set_ydata(data[1])
+            on.set_ydata(data[0])
 
-        plt.setp(
-            self._ax4,
-            xticks=(np.linspace(0, 1025, 7)),
-            xticklabels=(np.linspace(range_low, range_high, 7, dtype=int)),
-        )
-        if mag:
-            piover2 = np.rad2deg([np.pi / 2, np.pi / 2])
-            self._ax4.plot([0, 1025], piover2, color="black", linestyle="--")
-            self._ax4.plot([0, 1025], [0, 0], color="black", linestyle="--")
-            self._ax4.plot(
-                [0, 1025], -1.0 * piover2, color="black", linestyle="--"
-            )
-        plt.show()
+        self.blit()
 
 
 if __name__ == "__main__":
@@ -513,10 +709,51 @@ if __name__ == "__main__":
         type=int,
         metavar="UPDATE_INTERVAL",
         default=DEFAULT_UPDATE_INTERVAL,
-        help="Provide the interval in milliseconds to read the spectrum "
-             "result attribute and reset the Gated Spectrometer "
+        help="Provide the interval in milliseconds to draw the newest "
+             "spectrum; spectra are acquired every throttle interval "
              f"(Default is {DEFAULT_UPDATE_INTERVAL} ms)"
     )
+    parser.add_argument(
+        "--queue_size",
+        type=int,
+        metavar="N_FRAMES",
+        help="Number of acquired spectra kept for display or recording "
+             "before the oldest are dropped (Default is "
+             f"{DEFAULT_QUEUE_SIZE}, {DEFAULT_RECORD_QUEUE_SIZE} with "
+             "--record)"
+    )
+    parser.add_argument(
+        "--record",
+        type=str,
+        metavar="PATH_PREFIX",
+        help="Record the spectra without a display to chunked, compressed "
+             "HDF5 files named PATH_PREFIX_<UTC time>_<sequence>.h5 "
+             "(requires h5py)"
+    )
+    parser.add_argument(
+        "--record_duration",
+        type=float,
+        metavar="SECONDS",
+        default=0,
+        help="Stop recording after SECONDS (Default is 0, record until "
+             "interrupted)"
+    )
+    parser.add_argument(
+        "--record_max_mb",
+        type=float,
+        metavar="MB",
+        default=DEFAULT_MAX_FILE_MB,
+        help="Start a new recording file once the current one reaches MB; "
+             f"0 for no limit (Default is {DEFAULT_MAX_FILE_MB} MB)"
+    )
+    parser.add_argument(
+        "--record_max_s",
+        type=float,
+        metavar="SECONDS",
+        default=DEFAULT_MAX_FILE_S,
+        help="Start a new recording file once the current one is SECONDS "
+             f"old; 0 for no limit (Default is {DEFAULT_MAX_FILE_S} s)"
+    )
     parser.add_argument(
         "-tm",
         "--test_mode",
@@ -530,6 +767,38 @@ if __name__ == "__main__":
         help="Use this argument to display cross products as magnitude "
         + "& phase (Default is to display cross power as real/imaginary)",
     )
+    parser.add_argument(
+        "--cache_ttl",
+        type=float,
+        metavar="SECONDS",
+        default=DEFAULT_CACHE_TTL_S,
+        help="Seconds the band, kValue and attenuation are reused without "
+             "reading the controller; change events refresh them sooner. "
+             f"0 reads them on every frame (Default is {DEFAULT_CACHE_TTL_S})"
+    )
+    parser.add_argument(
+        "--poll_period",
+        type=int,
+        metavar="MS",
+        default=DEFAULT_POLL_PERIOD_MS,
+        help="Server-side polling period set on the band, kValue and "
+             "attenuation attributes when they are not polled yet. The "
+             "polling is stored in the Tango DB while the plotter runs and "
+             "removed on exit (Default is 0, leave polling unchanged)"
+    )
+    parser.add_argument(
+        "--stats",
+        type=str,
+        choices=STATS_FORMATS,
+        help="Dump per-device, per-attribute and per-command TANGO call "
+             "counts, latency histograms, timeouts and errors at exit."
+    )
+    parser.add_argument(
+        "--stats_file",
+        type=str,
+        metavar="PATH",
+        help="Write the --stats dump to PATH instead of stdout."
+    )
     parser.add_argument(
         "-v",
         "--plotter_version",
@@ -542,6 +811,29 @@ if __name__ == "__main__":
         logger_.info(f"spfrx_spectrum_plotter VERSION:{VERSION}")
         exit(0)
 
+    if args.stats is not None:
+        dump_stats_at_exit(args.stats, args.stats_file)
+
+    recorder = None
+    queue_size = args.queue_size or DEFAULT_QUEUE_SIZE
+    if args.record is not None:
+        if importlib.util.find_spec("h5py") is None:
+            logger_.error("RECORDING REQUIRES THE h5py PACKAGE")
+            exit(1)
+        recorder = SpectrumRecorder(
+            args.record,
+            {
+                "dish": f"{args.device}/{args.name}",
+                "throttle_interval_ms": args.throttle_interval,
+                "num_packets": args.packets,
+                "test_mode": args.test_mode,
+                "plotter_version": VERSION,
+            },
+            max_file_mb=args.record_max_mb,
+            max_file_s=args.record_max_s
+        )
+        queue_size = args.queue_size or DEFAULT_RECORD_QUEUE_SIZE
+
     sp = SpectrumPlotter(
         args.throttle_interval,
         args.packets,
@@ -551,5 +843,10 @@ if __name__ == "__main__":
         args.name,
         args.controller_name,
         args.packet_capture_name,
-        args.test_mode
+        args.test_mode,
+        args.cache_ttl,
+        args.poll_period,
+        queue_size,
+        recorder,
+        args.record_duration
     )
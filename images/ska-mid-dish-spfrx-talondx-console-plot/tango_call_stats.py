@@ -0,0 +1,362 @@
+"""
+tango_call_stats
+Per-call latency instrumentation for Tango client calls.
+
+Every call made through PyTangoClientWrapper is recorded against its
+device, the kind of call (read, write, command, ...) and the attribute or
+command name: a call count, a latency histogram, and the number of
+timeouts and other errors. The statistics are process-wide and can be
+taken as a snapshot, or dumped as JSON or Prometheus text, eg. at exit.
+
+Plain counters, such as the hits and misses of the attribute cache, are
+kept alongside the calls against a device, an attribute name and a counter
+name.
+"""
+
+import atexit
+import contextlib
+import json
+import sys
+import threading
+import time
+from typing import Dict, Tuple
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS_S = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+STATS_FORMATS = ("json", "prometheus")
+METRIC_PREFIX = "spfrx_tango_call"
+
+OUTCOME_OK = "ok"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_ERROR = "error"
+
+
+def classify_error(
+        e: Exception
+        ) -> str:
+    """
+    Tell a Tango timeout apart from other failures.
+
+    :param e: The exception raised by the call
+    :returns: OUTCOME_TIMEOUT or OUTCOME_ERROR
+    """
+    for err in getattr(e, "args", ()):
+        reason = getattr(err, "reason", "")
+        if "TimedOut" in reason or "Timeout" in reason:
+            return OUTCOME_TIMEOUT
+    return OUTCOME_ERROR
+
+
+class CallStat:
+    """
+    Counters and latency histogram of one (device, kind, name) call.
+    """
+
+    __slots__ = (
+        "count", "timeouts", "errors", "total_s", "min_s", "max_s", "buckets"
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.min_s = None
+        self.max_s = 0.0
+        # One slot per bucket bound, plus the +Inf bucket
+        self.buckets = [0] * (len(LATENCY_BUCKETS_S) + 1)
+
+    def add(
+            self,
+            elapsed_s: float,
+            outcome: str
+            ) -> None:
+        self.count += 1
+        self.total_s += elapsed_s
+        self.min_s = elapsed_s if self.min_s is None \
+            else min(self.min_s, elapsed_s)
+        self.max_s = max(self.max_s, elapsed_s)
+        if outcome == OUTCOME_TIMEOUT:
+            self.timeouts += 1
+        elif outcome == OUTCOME_ERROR:
+            self.errors += 1
+        for i, bound in enumerate(LATENCY_BUCKETS_S):
+            if elapsed_s <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "total_s": self.total_s,
+            "mean_s": self.total_s / self.count if self.count else 0.0,
+            "min_s": self.min_s or 0.0,
+            "max_s": self.max_s,
+            "buckets": {
+                **{str(b): n for b, n in zip(LATENCY_BUCKETS_S, self.buckets)},
+                "+Inf": self.buckets[-1],
+            },
+        }
+
+
+class CallStats:
+    """
+    Thread-safe registry of CallStat keyed on (device, kind, name), and of
+    counters keyed on (device, name, counter).
+    """
+
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str, str], CallStat] = {}
+        self._counters: Dict[Tuple[str, str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def record(
+            self,
+            device: str,
+            kind: str,
+            name: str,
+            elapsed_s: float,
+            outcome: str = OUTCOME_OK
+            ) -> None:
+        """
+        Record one call.
+
+        :param device: Device FQDN
+        :param kind: Kind of call, eg. "read" or "command"
+        :param name: Attribute or command name
+        :param elapsed_s: Call duration in seconds
+        :param outcome: OUTCOME_OK, OUTCOME_TIMEOUT or OUTCOME_ERROR
+        """
+        key = (device, kind, name)
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                stat = self._stats[key] = CallStat()
+            stat.add(elapsed_s, outcome)
+
+    def count(
+            self,
+            device: str,
+            name: str,
+            counter: str,
+            n: int = 1
+            ) -> None:
+        """
+        Increment a counter.
+
+        :param device: Device FQDN
+        :param name: Attribute or command name
+        :param counter: Counter name, eg. "cache_hits"
+        :param n: Increment
+        """
+        key = (device, name, counter)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    @contextlib.contextmanager
+    def timed(
+            self,
+            device: str,
+            kind: str,
+            name: str
+            ):
+        """
+        Time the enclosed call and record it; exceptions are classified
+        and re-raised.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record(
+                device, kind, name, time.perf_counter() - start,
+                classify_error(e)
+            )
+            raise
+        self.record(device, kind, name, time.perf_counter() - start)
+
+    def snapshot(self) -> list:
+        """
+        Copy the current statistics.
+
+        :returns: A list of dicts with "device", "kind", "name" and the
+                  CallStat fields, slowest total time first
+        """
+        with self._lock:
+            rows = [
+                {"device": d, "kind": k, "name": n, **stat.to_dict()}
+                for (d, k, n), stat in self._stats.items()
+            ]
+        return sorted(rows, key=lambda row: row["total_s"], reverse=True)
+
+    def counters(self) -> list:
+        """
+        Copy the current counters.
+
+        :returns: A list of dicts with "device", "name", "counter" and
+                  "value", sorted by counter, device and name
+        """
+        with self._lock:
+            rows = [
+                {"device": d, "name": n, "counter": c, "value": value}
+                for (d, n, c), value in self._counters.items()
+            ]
+        return sorted(
+            rows, key=lambda row: (row["counter"], row["device"], row["name"])
+        )
+
+    def reset(self) -> None:
+        """
+        Drop all recorded statistics and counters.
+        """
+        with self._lock:
+            self._stats.clear()
+            self._counters.clear()
+
+
+def _escape(
+        value: str
+        ) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _labels(
+        row: dict
+        ) -> str:
+    return (
+        f'device="{_escape(row["device"])}",kind="{row["kind"]}",'
+        f'name="{_escape(row["name"])}"'
+    )
+
+
+def format_json(
+        snapshot: list,
+        counters: list = None
+        ) -> str:
+    """
+    Format a snapshot, and optionally counters, as JSON.
+    """
+    data = {"calls": snapshot}
+    if counters:
+        data["counters"] = counters
+    return json.dumps(data, indent=2) + "\n"
+
+
+def format_prometheus(
+        snapshot: list,
+        counters: list = None
+        ) -> str:
+    """
+    Format a snapshot, and optionally counters, in the Prometheus text
+    exposition format.
+    """
+    lines = [
+        f"# HELP {METRIC_PREFIX}_seconds Tango client call latency",
+        f"# TYPE {METRIC_PREFIX}_seconds histogram",
+    ]
+    for row in snapshot:
+        labels = _labels(row)
+        cumulative = 0
+        for bound, n in row["buckets"].items():
+            cumulative += n
+            lines.append(
+                f'{METRIC_PREFIX}_seconds_bucket{{{labels},le="{bound}"}} '
+                f"{cumulative}"
+            )
+        lines.append(
+            f"{METRIC_PREFIX}_seconds_sum{{{labels}}} {row['total_s']}"
+        )
+        lines.append(
+            f"{METRIC_PREFIX}_seconds_count{{{labels}}} {row['count']}"
+        )
+    for counter in ("timeouts", "errors"):
+        lines.append(
+            f"# HELP {METRIC_PREFIX}_{counter}_total Tango client call "
+            f"{counter}"
+        )
+        lines.append(f"# TYPE {METRIC_PREFIX}_{counter}_total counter")
+        for row in snapshot:
+            lines.append(
+                f"{METRIC_PREFIX}_{counter}_total{{{_labels(row)}}} "
+                f"{row[counter]}"
+            )
+    for counter in sorted({row["counter"] for row in counters or []}):
+        metric = f"{METRIC_PREFIX}_{counter}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for row in counters:
+            if row["counter"] == counter:
+                lines.append(
+                    f'{metric}{{device="{_escape(row["device"])}",'
+                    f'name="{_escape(row["name"])}"}} {row["value"]}'
+                )
+    return "\n".join(lines) + "\n"
+
+
+def format_stats(
+        fmt: str,
+        snapshot: list = None,
+        counters: list = None
+        ) -> str:
+    """
+    Format the process-wide statistics.
+
+    :param fmt: "json" or "prometheus"
+    :param snapshot: Snapshot to format, defaults to a new one
+    :param counters: Counters to format, defaults to the current ones
+    """
+    if snapshot is None:
+        snapshot = _call_stats.snapshot()
+    if counters is None:
+        counters = _call_stats.counters()
+    if fmt == "prometheus":
+        return format_prometheus(snapshot, counters)
+    return format_json(snapshot, counters)
+
+
+def dump_stats(
+        fmt: str,
+        path: str = None
+        ) -> None:
+    """
+    Write the process-wide statistics to a file, or stdout.
+
+    :param fmt: "json" or "prometheus"
+    :param path: Output file; stdout if None
+    """
+    text = format_stats(fmt)
+    if path is None:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+    else:
+        with open(path, "w") as stats_fd:
+            stats_fd.write(text)
+
+
+def dump_stats_at_exit(
+        fmt: str,
+        path: str = None
+        ) -> None:
+    """
+    Dump the process-wide statistics when the interpreter exits, including
+    exits from within an action.
+
+    :param fmt: "json" or "prometheus"
+    :param path: Output file; stdout if None
+    """
+    atexit.register(dump_stats, fmt, path)
+
+
+_call_stats = CallStats()
+
+
+def get_call_stats() -> CallStats:
+    """
+    Return the process-wide call statistics.
+    """
+    return _call_stats
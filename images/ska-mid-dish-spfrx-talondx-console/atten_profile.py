@@ -0,0 +1,193 @@
+"""
+atten_profile
+Bulk programming of the SPFRx attenuators.
+
+An attenuation profile covers any subset of the band x polarisation
+matrix, keyed by band then polarisation::
+
+    {"1": {"H": 10.0, "V": 10.5}, "2": {"H": 8.0, "V": 8.0}, "3": {"V": 12}}
+
+Band keys are normalised to decimal strings and polarisations to upper
+case, as in the attenuation of a reconcile desired state. A profile is
+written with a single write_attributes call and verified with a single
+read_attributes call.
+"""
+
+import json
+from typing import Dict, Iterable, List, Tuple
+
+from pytango_client_wrapper import PyTangoClientWrapper
+
+ATTEN_TOLERANCE = 0.1
+MIN_ATTEN: float = 0.0
+MAX_ATTEN: float = 31.75
+POLS = ("H", "V")
+
+
+def atten_attr(
+        band: int,
+        pol: str
+        ) -> str:
+    """
+    Name of the controller attenuation attribute for a band and pol.
+    """
+    return f"b{band}Pol{pol}Attenuation"
+
+
+def normalize_atten_profile(
+        profile: Dict[str, Dict[str, float]]
+        ) -> Dict[str, Dict[str, float]]:
+    """
+    Check a profile and normalise its keys and values.
+
+    :param profile: The profile, eg. loaded from JSON
+    :returns: The profile with decimal string band keys, upper case
+              polarisations and float attenuations
+    :raises ValueError: If a band, polarisation or attenuation is invalid
+    """
+    if not isinstance(profile, dict):
+        raise ValueError("an attenuation profile maps bands to polarisations")
+    normalized = {}
+    for band, pols in profile.items():
+        try:
+            band_key = str(int(band))
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid band {band!r}") from None
+        if not isinstance(pols, dict):
+            raise ValueError(
+                f"band {band_key}: expected polarisations, got {pols!r}"
+            )
+        for pol, value in pols.items():
+            pol_key = str(pol).upper()
+            if pol_key not in POLS:
+                raise ValueError(
+                    f"band {band_key}: invalid polarisation {pol!r}"
+                )
+            if isinstance(value, bool) or \
+                    not isinstance(value, (int, float)):
+                raise ValueError(
+                    f"band {band_key} pol {pol_key}: attenuation {value!r} "
+                    "is not a number"
+                )
+            normalized.setdefault(band_key, {})[pol_key] = float(value)
+    return normalized
+
+
+def profile_items(
+        profile: Dict[str, Dict[str, float]]
+        ) -> List[Tuple[int, str, float]]:
+    """
+    Flatten a profile into (band, pol, attenuation) entries. Unreadable
+    entries of a profile read back (None) are kept as None.
+    """
+    return [
+        (int(band), pol.upper(), None if value is None else float(value))
+        for band, pols in profile.items()
+        for pol, value in pols.items()
+    ]
+
+
+def load_atten_profile(
+        path: str
+        ) -> Dict[str, Dict[str, float]]:
+    """
+    Load an attenuation profile from a JSON file.
+
+    :raises ValueError: If the file is not a valid profile
+    """
+    with open(path, "r") as profile_fd:
+        return normalize_atten_profile(json.load(profile_fd))
+
+
+def save_atten_profile(
+        path: str,
+        profile: Dict[str, Dict[str, float]]
+        ) -> List[str]:
+    """
+    Save an attenuation profile to a JSON file, leaving out the entries
+    that could not be read (None) so the file can be loaded again.
+
+    :returns: The "band/pol" entries left out
+    """
+    readable = {}
+    skipped = []
+    for band, pol, value in profile_items(profile):
+        if value is None:
+            skipped.append(f"{band}/{pol}")
+        else:
+            readable.setdefault(str(band), {})[pol] = value
+    with open(path, "w") as profile_fd:
+        json.dump(readable, profile_fd, indent=4)
+    return skipped
+
+
+def read_atten_profile(
+        client: PyTangoClientWrapper,
+        bands: Iterable[int],
+        pols: Iterable[str] = POLS
+        ) -> Dict[str, Dict[str, float]]:
+    """
+    Read the attenuation of several bands and polarisations in one call.
+
+    :param client: Client of the SPFRx controller
+    :param bands: Bands to read
+    :param pols: Polarisations to read, defaults to both
+    :returns: The profile
+    :raises TangoClientError: If the read fails
+    """
+    entries = [(band, pol) for band in bands for pol in pols]
+    attrs = client.read_attributes(
+        [atten_attr(band, pol) for band, pol in entries]
+    )
+    profile = {}
+    for (band, pol), attr in zip(entries, attrs):
+        profile.setdefault(str(band), {})[pol] = (
+            None if attr.has_failed else float(attr.value)
+        )
+    return profile
+
+
+def write_atten_profile(
+        client: PyTangoClientWrapper,
+        profile: Dict[str, Dict[str, float]]
+        ) -> None:
+    """
+    Write every entry of a profile in one call.
+
+    :param client: Client of the SPFRx controller
+    :param profile: The profile to write
+    """
+    client.write_attributes(
+        [
+            (atten_attr(band, pol), value)
+            for band, pol, value in profile_items(profile)
+        ]
+    )
+
+
+def verify_atten_profile(
+        client: PyTangoClientWrapper,
+        profile: Dict[str, Dict[str, float]]
+        ) -> Tuple[bool, Dict[str, Dict[str, float]]]:
+    """
+    Read back every entry of a profile in one call and compare.
+
+    :param client: Client of the SPFRx controller
+    :param profile: The expected profile
+    :returns: (True if every entry matches, the profile read back)
+    :raises TangoClientError: If the read fails
+    """
+    items = profile_items(profile)
+    attrs = client.read_attributes(
+        [atten_attr(band, pol) for band, pol, _ in items]
+    )
+    readback = {}
+    ok = True
+    for i, (band, pol, value) in enumerate(items):
+        live = None
+        if not attrs[i].has_failed:
+            live = float(attrs[i].value)
+        readback.setdefault(str(band), {})[pol] = live
+        if live is None or abs(live - value) >= ATTEN_TOLERANCE:
+            ok = False
+    return ok, readback
@@ -0,0 +1,296 @@
+"""
+attribute_dump
+Dump every attribute of a set of Tango devices, and compare two dumps.
+
+The attributes of each device are discovered with attribute_list_query
+and read in chunks with read_attributes, the devices being swept
+concurrently (see device_sweep). Each device is written to the dump as
+soon as it is done, as one compact JSON line; the first line is a header::
+
+    {"format":"spfrx-attribute-dump","version":1,"time":"...","dish":"..."}
+    {"device":"ctrl","fqdn":"...","class":"...","error":null,
+     "elapsed_s":0.05,"attributes":{"configuredBand":2,
+     "kValue":{"error":"..."},...}}
+
+Dumps whose path ends with ".gz" are gzip compressed. An attribute that
+could not be read is stored as {"error": reason}.
+"""
+
+from __future__ import annotations
+
+import datetime
+import fnmatch
+import gzip
+import json
+from typing import Dict, Iterable, List, Tuple
+
+from device_sweep import Deadline, _describe
+from lazy_import import lazy_import
+
+np = lazy_import("numpy")
+tango = lazy_import("tango")
+
+DUMP_FORMAT = "spfrx-attribute-dump"
+DUMP_VERSION = 1
+DEFAULT_CHUNK_SIZE = 32
+DEFAULT_REL_TOL = 1e-6
+DEFAULT_ABS_TOL = 0.0
+
+
+def _jsonable(value):
+    if isinstance(value, tango.DevState):
+        # Before int, DevState is an int subclass on recent PyTango
+        return str(value)
+    if value is None or isinstance(value, (bool, int, float, str)):
+        # Including the IntEnum values of DevEnum attributes
+        return value
+    if hasattr(value, "tolist"):
+        # NumPy arrays and scalars
+        return value.tolist()
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return str(value)
+
+
+def probe_attributes(
+        dev_proxy: tango.DeviceProxy,
+        deadline: Deadline,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+        ) -> dict:
+    """
+    Read the device class and every attribute of a device, with one
+    read_attributes call per chunk of attributes. A chunk that cannot be
+    read as a whole is stored with the error of each of its attributes.
+
+    :returns: A dict with "class" and "attributes", a dict of attribute
+              name to value
+    """
+    with deadline.timed(dev_proxy, "command", "info"):
+        values = {"class": dev_proxy.info().dev_class}
+    with deadline.timed(dev_proxy, "command", "attribute_list_query"):
+        names = [info.name for info in dev_proxy.attribute_list_query()]
+    attributes = {}
+    for i in range(0, len(names), chunk_size):
+        chunk = names[i:i + chunk_size]
+        try:
+            with deadline.timed(dev_proxy, "read_attributes", ",".join(chunk)):
+                attrs = dev_proxy.read_attributes(chunk)
+        except tango.DevFailed as e:
+            for name in chunk:
+                attributes[name] = {"error": _describe(e)}
+            continue
+        for name, attr in zip(chunk, attrs):
+            if attr.has_failed:
+                errors = attr.get_err_stack()
+                attributes[name] = {
+                    "error": errors[0].desc.strip() if errors else "failed"
+                }
+            else:
+                attributes[name] = _jsonable(attr.value)
+    values["attributes"] = attributes
+    return values
+
+
+def _open(
+        path: str,
+        mode: str
+        ):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t")
+    return open(path, mode)
+
+
+class DumpWriter:
+    """
+    Streams a dump to a file, one device at a time.
+
+    :param path: Path of the dump file; gzip compressed if it ends with
+                 ".gz"
+    :param dish: The dish FQDN prefix ("device/name")
+    """
+
+    def __init__(self, path: str, dish: str):
+        self._fd = _open(path, "w")
+        self.devices = 0
+        self.attributes = 0
+        self.errors = 0
+        self._write({
+            "format": DUMP_FORMAT,
+            "version": DUMP_VERSION,
+            "time": datetime.datetime.now(datetime.timezone.utc).isoformat(
+                timespec="microseconds").replace("+00:00", "Z"),
+            "dish": dish,
+        })
+
+    def _write(self, record: dict) -> None:
+        self._fd.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def write_result(self, result) -> None:
+        """
+        Write the SweepResult of a device swept with probe_attributes,
+        then release its values.
+        """
+        attributes = result.values.get("attributes", {})
+        error = result.error
+        if error is None and not result.exported:
+            error = "device not exported"
+        self._write({
+            "device": result.key,
+            "fqdn": result.fqdn,
+            "class": result.values.get("class"),
+            "error": error,
+            "elapsed_s": round(result.elapsed_s, 6),
+            "attributes": attributes,
+        })
+        self.devices += 1
+        self.attributes += len(attributes)
+        self.errors += sum(
+            isinstance(v, dict) and "error" in v for v in attributes.values()
+        )
+        result.values = {}
+
+    def close(self) -> None:
+        self._fd.close()
+
+
+def load_dump(
+        path: str
+        ) -> Tuple[dict, Dict[str, dict]]:
+    """
+    Load a dump.
+
+    :param path: Path of the dump file
+    :returns: A (header, devices) tuple, devices mapping each device key to
+              its record
+    :raises ValueError: If the file is not a dump
+    """
+    with _open(path, "r") as dump_fd:
+        header = json.loads(dump_fd.readline() or "null")
+        if not isinstance(header, dict) or \
+                header.get("format") != DUMP_FORMAT:
+            raise ValueError(f"{path} is not an SPFRx attribute dump")
+        if header.get("version", 0) > DUMP_VERSION:
+            raise ValueError(
+                f"{path} has dump version {header.get('version')}; this "
+                f"console reads versions up to {DUMP_VERSION}"
+            )
+        devices = {}
+        for line in dump_fd:
+            record = json.loads(line)
+            devices[record["device"]] = record
+    return header, devices
+
+
+def _is_error(value) -> bool:
+    return isinstance(value, dict) and "error" in value
+
+
+def values_differ(
+        old,
+        new,
+        rel_tol: float = DEFAULT_REL_TOL,
+        abs_tol: float = DEFAULT_ABS_TOL
+        ) -> bool:
+    """
+    Compare two dumped values, numbers and numeric arrays within the
+    tolerances, with NumPy for arrays.
+
+    :param old: Value of the first dump
+    :param new: Value of the second dump
+    :param rel_tol: Relative tolerance of numeric values
+    :param abs_tol: Absolute tolerance of numeric values
+    :returns: True if the values differ
+    """
+    if old == new:
+        return False
+    if isinstance(old, bool) or isinstance(new, bool):
+        return True
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+        return abs(old - new) > max(abs_tol, rel_tol * max(abs(old), abs(new)))
+    if isinstance(old, list) and isinstance(new, list):
+        try:
+            old_array = np.asarray(old, dtype=float)
+            new_array = np.asarray(new, dtype=float)
+        except (TypeError, ValueError):
+            # Strings, or ragged nesting
+            return True
+        if old_array.shape != new_array.shape:
+            return True
+        return not np.allclose(
+            old_array, new_array, rtol=rel_tol, atol=abs_tol, equal_nan=True
+        )
+    return True
+
+
+def diff_dumps(
+        old: Dict[str, dict],
+        new: Dict[str, dict],
+        rel_tol: float = DEFAULT_REL_TOL,
+        abs_tol: float = DEFAULT_ABS_TOL,
+        ignore: Iterable[str] = ()
+        ) -> List[tuple]:
+    """
+    Compare the devices of two dumps.
+
+    :param old: Devices of the first dump, as returned by load_dump
+    :param new: Devices of the second dump
+    :param rel_tol: Relative tolerance of numeric values
+    :param abs_tol: Absolute tolerance of numeric values
+    :param ignore: Glob patterns of attributes ("attribute" or
+                   "device/attribute") left out of the comparison
+    :returns: (device, attribute, change, old value, new value) tuples,
+              change being "changed", "added", "removed", "error" or
+              "recovered"; attribute is None for a whole device
+    """
+    ignore = list(ignore)
+    changes = []
+    for device in list(old) + [d for d in new if d not in old]:
+        if device not in new:
+            changes.append((device, None, "removed", None, None))
+            continue
+        if device not in old:
+            changes.append((device, None, "added", None, None))
+            continue
+        old_attrs = old[device].get("attributes", {})
+        new_attrs = new[device].get("attributes", {})
+        for name in list(old_attrs) + \
+                [n for n in new_attrs if n not in old_attrs]:
+            if any(fnmatch.fnmatch(name, pattern) or
+                   fnmatch.fnmatch(f"{device}/{name}", pattern)
+                   for pattern in ignore):
+                continue
+            if name not in new_attrs:
+                changes.append((device, name, "removed", old_attrs[name],
+                                None))
+            elif name not in old_attrs:
+                changes.append((device, name, "added", None,
+                                new_attrs[name]))
+            elif _is_error(old_attrs[name]) != _is_error(new_attrs[name]):
+                changes.append((
+                    device, name,
+                    "error" if _is_error(new_attrs[name]) else "recovered",
+                    old_attrs[name], new_attrs[name],
+                ))
+            elif not _is_error(new_attrs[name]) and values_differ(
+                    old_attrs[name], new_attrs[name], rel_tol, abs_tol):
+                changes.append((device, name, "changed", old_attrs[name],
+                                new_attrs[name]))
+    return changes
+
+
+def format_value(
+        value,
+        width: int = 40
+        ) -> str:
+    """
+    Shorten a dumped value for display.
+    """
+    if _is_error(value):
+        text = f"ERROR: {value['error']}"
+    elif isinstance(value, list):
+        text = f"[{len(value)} values] {json.dumps(value)}"
+    else:
+        text = json.dumps(value)
+    return text if len(text) <= width else text[:width - 3] + "..."
@@ -0,0 +1,270 @@
+"""
+autolevel
+Closed-loop leveling of the band attenuators on the spectrometer power.
+
+For each iteration, the attenuation of both polarizations is written with
+one call and one gated spectrometer result is retrieved. The mean in-band
+power of XX (pol H) and YY (pol V) without the noise diode is then taken
+with NumPy. Each polarization has its own search over the attenuator
+steps. The next attenuation comes from the secant through the last two
+measurements, or from the nominal 1 dB per dB slope after the first one.
+It is kept within the bracket still compatible with the measurements and
+bisects that bracket when the secant would leave it, unless it points
+beyond an untried end of the attenuator range. The bracket shrinks
+by at least one attenuator step per iteration, so the search ends within
+a few iterations even on a noisy or saturated receiver. A polarization
+that does not converge is put back to the attenuation it started from.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Dict, List, Tuple
+
+from atten_profile import (
+    MAX_ATTEN,
+    MIN_ATTEN,
+    POLS,
+    atten_attr,
+    write_atten_profile,
+)
+from lazy_import import lazy_import
+from pytango_client_wrapper import PyTangoClientWrapper
+
+np = lazy_import("numpy")
+
+ATTEN_STEP_DB = 0.25
+
+DEFAULT_TOLERANCE_DB = 0.5
+DEFAULT_MAX_ITERATIONS = 12
+DEFAULT_SETTLE_SPECTRA = 1
+# Spectrometer result: a timestamp word, a spare word, then XX, YY and the
+# real and imaginary XY products of 1025 channels, with the noise diode on
+# then off
+SPECTRUM_CHANNELS = 1025
+ND_OFF = 1
+# The channels outside the filter roll-off at each edge
+DEFAULT_CHANNELS = (51, 974)
+
+
+def in_band_power_db(
+        raw,
+        channels: Tuple[int, int] = DEFAULT_CHANNELS
+        ):
+    """
+    Mean in-band power per polarization of a spectrometer result.
+
+    :param raw: The spectrometer_spectrum_result value
+    :param channels: First and last + 1 channels to average over
+    :returns: A NumPy array with the (H, V) power in dB
+    """
+    products = np.asarray(raw)[2:].reshape(2, 4, SPECTRUM_CHANNELS)
+    mean = products[ND_OFF, :2, channels[0]:channels[1]].mean(axis=-1)
+    return 10 * np.log10(np.maximum(mean, 1.0))
+
+
+def quantize(
+        atten: float
+        ) -> float:
+    """
+    Round an attenuation to the attenuator step, within its range.
+    """
+    atten = round(atten / ATTEN_STEP_DB) * ATTEN_STEP_DB
+    return min(MAX_ATTEN, max(MIN_ATTEN, atten))
+
+
+class PolSearch:
+    """
+    Search of the attenuation of one polarization.
+
+    :param target_db: Power to reach
+    :param tolerance_db: Accepted distance from target_db
+    """
+
+    __slots__ = ("target_db", "tolerance_db", "low", "high", "points",
+                 "done", "reason")
+
+    def __init__(self, target_db: float, tolerance_db: float):
+        self.target_db = target_db
+        self.tolerance_db = tolerance_db
+        # The attenuations still compatible with the measurements
+        self.low = MIN_ATTEN
+        self.high = MAX_ATTEN
+        # (attenuation, power - target) of each measurement
+        self.points: List[Tuple[float, float]] = []
+        self.done = False
+        self.reason = ""
+
+    def best(self) -> Tuple[float, float]:
+        """
+        :returns: The (attenuation, power - target) measurement closest to
+                  the target
+        """
+        return min(self.points, key=lambda point: abs(point[1]))
+
+    def update(
+            self,
+            atten: float,
+            power_db: float
+            ) -> float:
+        """
+        Record a measurement and choose the next attenuation.
+
+        :param atten: Attenuation the power was measured with
+        :param power_db: Measured power
+        :returns: The next attenuation to try, None once the search is done
+        """
+        error = power_db - self.target_db
+        self.points.append((atten, error))
+        if abs(error) <= self.tolerance_db:
+            self.done, self.reason = True, "converged"
+            return None
+        # More attenuation lowers the power
+        if error > 0:
+            self.low = max(self.low, atten + ATTEN_STEP_DB)
+        else:
+            self.high = min(self.high, atten - ATTEN_STEP_DB)
+        if self.low > self.high:
+            self.done = True
+            if error > 0 and atten >= MAX_ATTEN:
+                self.reason = "above target at maximum attenuation"
+            elif error < 0 and atten <= MIN_ATTEN:
+                self.reason = "below target at minimum attenuation"
+            else:
+                self.reason = "attenuator resolution reached"
+            return None
+
+        slope = -1.0
+        if len(self.points) > 1:
+            (a0, e0), (a1, e1) = self.points[-2:]
+            if a1 != a0 and (e1 - e0) / (a1 - a0) < 0:
+                slope = (e1 - e0) / (a1 - a0)
+        guess = atten - error / slope
+        if guess > self.high == MAX_ATTEN or guess < self.low == MIN_ATTEN:
+            # Try the end of the range first, it may be out of reach
+            guess = min(self.high, max(self.low, guess))
+        elif not self.low <= guess <= self.high:
+            guess = (self.low + self.high) / 2
+        return min(self.high, max(self.low, quantize(guess)))
+
+
+class LevelResult:
+    """
+    Outcome of leveling one band.
+
+    :param band: The band ID
+    """
+
+    __slots__ = ("band", "atten", "power_db", "converged", "reason",
+                 "iterations", "elapsed_s")
+
+    def __init__(self, band: int):
+        self.band = band
+        self.atten: Dict[str, float] = {}
+        self.power_db: Dict[str, float] = {}
+        self.converged: Dict[str, bool] = {}
+        self.reason: Dict[str, str] = {}
+        self.iterations = 0
+        self.elapsed_s = 0.0
+
+    def __bool__(self) -> bool:
+        return bool(self.converged) and all(self.converged.values())
+
+
+def read_spectrum_power(
+        pktcap: PyTangoClientWrapper,
+        channels: Tuple[int, int] = DEFAULT_CHANNELS,
+        settle_spectra: int = 0
+        ):
+    """
+    Retrieve a gated spectrometer result and measure its power.
+
+    :param pktcap: Client of the pktcap device
+    :param channels: First and last + 1 channels to average over
+    :param settle_spectra: Results to discard first, eg. because they
+                           were integrated before an attenuation change
+    :returns: A NumPy array with the (H, V) power in dB
+    """
+    for _ in range(settle_spectra + 1):
+        pktcap.command_read_write("spectrometer_retrieve_result")
+    return in_band_power_db(
+        pktcap.read_attribute("spectrometer_spectrum_result"), channels
+    )
+
+
+def level_band(
+        ctrl: PyTangoClientWrapper,
+        pktcap: PyTangoClientWrapper,
+        band: int,
+        target_db: float,
+        tolerance_db: float = DEFAULT_TOLERANCE_DB,
+        channels: Tuple[int, int] = DEFAULT_CHANNELS,
+        max_iterations: int = DEFAULT_MAX_ITERATIONS,
+        settle_spectra: int = DEFAULT_SETTLE_SPECTRA
+        ) -> LevelResult:
+    """
+    Level both polarizations of the configured band on the spectrometer
+    power, starting from their current attenuation. A polarization that
+    converges is left at the attenuation closest to the target; one that
+    does not is put back to its initial attenuation, as reported in the
+    result.
+
+    :param ctrl: Client of the SPFRx controller
+    :param pktcap: Client of the pktcap device, with the spectrometer
+                   enabled
+    :param band: The configured band ID
+    :param target_db: In-band power to reach, in dB
+    :param tolerance_db: Accepted distance from target_db
+    :param channels: First and last + 1 channels to average over
+    :param max_iterations: Upper bound on the spectra measured
+    :param settle_spectra: Results discarded after each attenuation change
+    :returns: The LevelResult
+    :raises TangoClientError: If a device call fails
+    """
+    result = LevelResult(band)
+    start = time.perf_counter()
+    attrs = [atten_attr(band, pol) for pol in POLS]
+    initial = dict(zip(
+        POLS, (float(a.value) for a in ctrl.read_attributes(attrs))
+    ))
+    atten = {pol: quantize(a) for pol, a in initial.items()}
+    # The attenuation configured on the controller
+    configured = dict(initial)
+    searches = {pol: PolSearch(target_db, tolerance_db) for pol in POLS}
+
+    power = read_spectrum_power(pktcap, channels)
+    while True:
+        result.iterations += 1
+        changes = {}
+        for pol, power_db in zip(POLS, power):
+            search = searches[pol]
+            if search.done:
+                continue
+            next_atten = search.update(atten[pol], float(power_db))
+            if next_atten is not None:
+                changes[pol] = next_atten
+        if not changes or result.iterations >= max_iterations:
+            break
+        atten.update(changes)
+        write_atten_profile(ctrl, {band: changes})
+        configured.update(changes)
+        power = read_spectrum_power(pktcap, channels, settle_spectra)
+
+    for pol, search in searches.items():
+        best_atten, best_error = search.best()
+        result.converged[pol] = abs(best_error) <= tolerance_db
+        result.reason[pol] = search.reason or "iteration limit reached"
+        if not result.converged[pol]:
+            # Rather than eg. maximum attenuation for an unreachable target;
+            # the first measurement was taken at the initial attenuation
+            best_atten, best_error = initial[pol], search.points[0][1]
+        result.atten[pol] = best_atten
+        result.power_db[pol] = target_db + best_error
+
+    restore = {
+        pol: a for pol, a in result.atten.items() if a != configured[pol]
+    }
+    if restore:
+        write_atten_profile(ctrl, {band: restore})
+    result.elapsed_s = time.perf_counter() - start
+    return result
@@ -0,0 +1,204 @@
+"""
+band_profile
+History of band switch durations, with percentile summaries per dish.
+
+Each band switch is appended to a JSON lines file as one record::
+
+    {"time": "2026-10-18T10:15:02.123456Z", "dish": "ska001/spfrxpu",
+     "from_band": 1, "band": 2, "synchronize": false, "ok": true,
+     "standby": 0.051, "configure_cmd": 0.004, "data_capture": 1.502,
+     "band_readback": 0.001, "total": 1.558}
+
+where the phase durations are in seconds (see spfrx.configureBand). The
+file only ever grows, so runs on different days and boards can be
+summarised together.
+"""
+
+import datetime
+import fnmatch
+import json
+import os
+from typing import Dict, List, Tuple
+
+from fqdn_index import cache_dir
+
+PHASES = ("standby", "configure_cmd", "data_capture", "band_readback", "total")
+PERCENTILES = (50, 90, 99)
+DEFAULT_PROFILE_CYCLES = 10
+
+
+def default_history_path() -> str:
+    """
+    Path of the band switch history used when none is given.
+    """
+    return os.path.join(cache_dir(), "band-switch-history.jsonl")
+
+
+def switch_record(
+        dish: str,
+        from_band: int,
+        band: int,
+        synchronize: bool,
+        ok: bool,
+        timings: Dict[str, float]
+        ) -> dict:
+    """
+    Build the history record of one band switch.
+
+    :param dish: The dish FQDN prefix ("device/name")
+    :param from_band: Band configured before the switch, 0 if unknown
+    :param band: Band switched to
+    :param synchronize: Synchronize flag of the switch
+    :param ok: True if the switch succeeded
+    :param timings: Phase durations in seconds, as filled by configureBand
+    :returns: The record
+    """
+    record = {
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(
+            timespec="microseconds").replace("+00:00", "Z"),
+        "dish": dish,
+        "from_band": from_band,
+        "band": band,
+        "synchronize": synchronize,
+        "ok": ok,
+    }
+    for phase in PHASES:
+        if phase in timings:
+            record[phase] = round(timings[phase], 6)
+    return record
+
+
+def append_history(
+        path: str,
+        records: List[dict]
+        ) -> None:
+    """
+    Append records to a history file, creating it if needed.
+
+    :param path: Path of the JSON lines history file
+    :param records: Records to append
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a") as history_fd:
+        for record in records:
+            history_fd.write(json.dumps(record) + "\n")
+
+
+def load_history(
+        path: str,
+        dish_pattern: str = None
+        ) -> List[dict]:
+    """
+    Read the records of a history file. Lines that cannot be parsed (eg.
+    one cut short by an interrupted run) are ignored.
+
+    :param path: Path of the JSON lines history file
+    :param dish_pattern: Optional glob pattern the dish must match
+    :returns: The records, oldest first; empty if the file does not exist
+    """
+    records = []
+    try:
+        with open(path, "r") as history_fd:
+            for line in history_fd:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if dish_pattern is None or \
+                        fnmatch.fnmatch(record.get("dish", ""), dish_pattern):
+                    records.append(record)
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def percentile(
+        ordered: List[float],
+        q: float
+        ) -> float:
+    """
+    Percentile of sorted values, interpolating between the closest ranks.
+
+    :param ordered: Values sorted in ascending order, not empty
+    :param q: Percentile in [0, 100]
+    :returns: The percentile value
+    """
+    rank = (len(ordered) - 1) * q / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize_history(
+        records: List[dict]
+        ) -> Dict[Tuple[str, int, bool], dict]:
+    """
+    Summarise the successful switches per dish, band and synchronize flag.
+
+    :param records: History records
+    :returns: A dict keyed on (dish, band, synchronize), holding "count",
+              "failed" and, per phase, a dict with "p50", "p90", "p99"
+              and "max" in seconds
+    """
+    groups: Dict[Tuple[str, int, bool], List[dict]] = {}
+    failed: Dict[Tuple[str, int, bool], int] = {}
+    for record in records:
+        key = (
+            record.get("dish", ""),
+            int(record.get("band", 0)),
+            bool(record.get("synchronize", False)),
+        )
+        if record.get("ok"):
+            groups.setdefault(key, []).append(record)
+        else:
+            failed[key] = failed.get(key, 0) + 1
+
+    summary = {}
+    for key in sorted(set(groups) | set(failed)):
+        switches = groups.get(key, [])
+        entry = {"count": len(switches), "failed": failed.get(key, 0)}
+        for phase in PHASES:
+            ordered = sorted(r[phase] for r in switches if phase in r)
+            if ordered:
+                entry[phase] = {
+                    f"p{q}": percentile(ordered, q) for q in PERCENTILES
+                }
+                entry[phase]["max"] = ordered[-1]
+        summary[key] = entry
+    return summary
+
+
+def format_summary(
+        summary: Dict[Tuple[str, int, bool], dict]
+        ) -> str:
+    """
+    Tabulate a summary returned by summarize_history, in milliseconds.
+
+    :param summary: The summary
+    :returns: A printable table
+    """
+    columns = "".join(f"{f'P{q}':>10}" for q in PERCENTILES)
+    lines = [
+        f"{'DISH':<20} {'BAND':>4} {'SYNC':>5} {'N':>5} {'FAIL':>5}  "
+        f"{'PHASE':<14}{columns}{'MAX':>10}"
+    ]
+    for (dish, band, synchronize), entry in summary.items():
+        prefix = (
+            f"{dish:<20} {band:>4} {str(synchronize):>5} "
+            f"{entry['count']:>5} {entry['failed']:>5}  "
+        )
+        phases = [phase for phase in PHASES if phase in entry]
+        if not phases:
+            lines.append(prefix + "-")
+        for phase in phases:
+            values = "".join(
+                f"{entry[phase][f'p{q}'] * 1e3:>10.1f}" for q in PERCENTILES
+            )
+            lines.append(
+                f"{prefix}{phase:<14}{values}"
+                f"{entry[phase]['max'] * 1e3:>10.1f}"
+            )
+            prefix = " " * len(prefix)
+    return "\n".join(lines)
@@ -0,0 +1,192 @@
+"""
+device_sweep
+Concurrent sweep over a set of Tango devices. Each device is probed on a
+worker thread with its own deadline, and the results are gathered in the
+order the devices were given, so one slow or hung board only costs its own
+deadline instead of serialising the whole sweep behind it. Every call made
+on a device is recorded in the call statistics (see tango_call_stats).
+"""
+
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List
+
+from lazy_import import lazy_import
+from tango_call_stats import get_call_stats
+
+tango = lazy_import("tango")
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_DEADLINE_S = 5.0
+
+NO_DB_SUFFIX = "#dbase=no"
+
+VERSION_ATTRIBUTES = [
+    "dsVersionId",
+    "dsBuildDateTime",
+    "dsGitCommitHash",
+]
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised by a probe step that is started after the device deadline.
+    """
+
+
+class SweepResult:
+    """
+    Outcome of probing a single device.
+
+    :param key: The key identifying the device in the sweep
+    :param fqdn: The device FQDN
+    """
+
+    __slots__ = ("key", "fqdn", "exported", "values", "error", "elapsed_s")
+
+    def __init__(self, key: str, fqdn: str):
+        self.key = key
+        self.fqdn = fqdn
+        self.exported = False
+        self.values = {}
+        self.error = None
+        self.elapsed_s = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.exported and self.error is None
+
+
+class Deadline:
+    """
+    Tracks the time remaining for one device and bounds each Tango call
+    made on its proxy to that remaining time.
+
+    :param deadline_s: Time budget in seconds for the device
+    :param fqdn: Device FQDN the calls are recorded against
+    """
+
+    def __init__(self, deadline_s: float, fqdn: str = None):
+        self._expiry = time.monotonic() + deadline_s
+        self.fqdn = fqdn
+
+    def arm(self, dev_proxy: tango.DeviceProxy) -> None:
+        remaining_ms = int((self._expiry - time.monotonic()) * 1000)
+        if remaining_ms <= 0:
+            raise DeadlineExceeded("device deadline exceeded")
+        dev_proxy.set_timeout_millis(remaining_ms)
+
+    def timed(
+            self,
+            dev_proxy: tango.DeviceProxy,
+            kind: str,
+            name: str
+            ):
+        """
+        Arm the proxy for the next call, and record that call in the call
+        statistics.
+
+        :returns: A context manager timing the call
+        """
+        self.arm(dev_proxy)
+        return get_call_stats().timed(self.fqdn, kind, name)
+
+
+def _describe(
+        e: Exception
+        ) -> str:
+    if isinstance(e, tango.DevFailed) and len(e.args) > 0:
+        return e.args[0].desc.strip()
+    return str(e).strip()
+
+
+def probe_status(
+        dev_proxy: tango.DeviceProxy,
+        deadline: Deadline
+        ) -> dict:
+    """
+    Read the state and status of a device.
+    """
+    with deadline.timed(dev_proxy, "command", "State"):
+        state = str(dev_proxy.state())
+    with deadline.timed(dev_proxy, "command", "Status"):
+        status = dev_proxy.status()
+    return {"state": state, "status": status}
+
+
+def probe_version(
+        dev_proxy: tango.DeviceProxy,
+        deadline: Deadline
+        ) -> dict:
+    """
+    Read the device class and the version attributes of a device, using a
+    single read_attributes call for the attributes.
+    """
+    with deadline.timed(dev_proxy, "command", "info"):
+        values = {"class": dev_proxy.info().dev_class}
+    with deadline.timed(
+            dev_proxy, "read_attributes", ",".join(VERSION_ATTRIBUTES)):
+        attrs = dev_proxy.read_attributes(VERSION_ATTRIBUTES)
+    for attr in attrs:
+        values[attr.name] = None if attr.has_failed else attr.value
+    return values
+
+
+def _probe_device(
+        key: str,
+        fqdn: str,
+        probe: Callable,
+        deadline_s: float
+        ) -> SweepResult:
+    result = SweepResult(key, fqdn)
+    start = time.monotonic()
+    deadline = Deadline(deadline_s, fqdn)
+    try:
+        with get_call_stats().timed(fqdn, "connect", "DeviceProxy"):
+            dev_proxy = tango.DeviceProxy(fqdn)
+        if fqdn.endswith(NO_DB_SUFFIX):
+            # Devices outside a Tango DB (eg. spfrx_simulator.py) have no
+            # import info; a proxy that could be created is reachable
+            result.exported = True
+        else:
+            with deadline.timed(dev_proxy, "db", "import_info"):
+                result.exported = dev_proxy.import_info().exported
+        if result.exported:
+            result.values = probe(dev_proxy, deadline)
+    except Exception as e:
+        result.error = _describe(e)
+    result.elapsed_s = time.monotonic() - start
+    return result
+
+
+def sweep_devices(
+        fqdns: Dict[str, str],
+        probe: Callable = probe_status,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        deadline_s: float = DEFAULT_DEADLINE_S,
+        on_result: Callable[[SweepResult], None] = None
+        ) -> List[SweepResult]:
+    """
+    Probe a set of devices concurrently.
+
+    :param fqdns: Mapping of device key to device FQDN
+    :param probe: Callable taking (DeviceProxy, deadline) and returning a
+                  dict of values; see probe_status and probe_version
+    :param max_workers: Maximum number of devices probed at the same time
+    :param deadline_s: Time budget in seconds for each device
+    :param on_result: Optional callable given each SweepResult as soon as
+                      its device is done, on the calling thread
+    :returns: One SweepResult per device, in the order of fqdns
+    """
+    workers = max(1, min(max_workers, len(fqdns)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_probe_device, key, fqdn, probe, deadline_s)
+            for key, fqdn in fqdns.items()
+        ]
+        if on_result is not None:
+            for future in as_completed(futures):
+                on_result(future.result())
+        return [future.result() for future in futures]
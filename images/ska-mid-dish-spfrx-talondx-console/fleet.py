@@ -0,0 +1,181 @@
+"""
+fleet
+Run a console action across many SPFRx dishes in parallel.
+
+Dishes are identified by their FQDN prefix ("device/name", eg.
+"ska001/spfrxpu"). Targets can be given literally, as glob patterns that
+are resolved against the Tango DB, or as a directory of spfrx_boardmap
+JSON files.
+"""
+
+import glob
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+from fqdn_index import load_fqdn_index
+
+DEFAULT_FLEET_WORKERS = 16
+BOARDMAP_GLOB = "*boardmap*.json"
+GLOB_CHARS = "*?["
+
+
+class FleetResult:
+    """
+    Outcome of running an action against one dish.
+
+    :param dish: The dish FQDN prefix ("device/name")
+    """
+
+    __slots__ = ("dish", "ok", "summary", "elapsed_s")
+
+    def __init__(self, dish: str):
+        self.dish = dish
+        self.ok = False
+        self.summary = ""
+        self.elapsed_s = 0.0
+
+
+def split_dish(
+        dish: str,
+        default_name: str
+        ) -> Tuple[str, str]:
+    """
+    Split a dish prefix into its device and name parts.
+
+    :param dish: "device/name", or "device" to use default_name
+    :param default_name: Name used when the prefix has no name part
+    :returns: A (device, name) tuple
+    """
+    parts = dish.strip("/").split("/")
+    if len(parts) == 1:
+        return parts[0], default_name
+    return parts[0], parts[1]
+
+
+def dishes_from_boardmaps(
+        boardmap_dir: str
+        ) -> List[str]:
+    """
+    Collect the dish prefixes declared in every boardmap file of a
+    directory.
+
+    :param boardmap_dir: Directory containing spfrx_boardmap JSON files
+    :returns: Dish prefixes in file order, without duplicates
+    """
+    dishes = []
+    for path in sorted(glob.glob(os.path.join(boardmap_dir, BOARDMAP_GLOB))):
+        with open(path, "r") as boardmap_fd:
+            boardmap = json.load(boardmap_fd)
+        for server in boardmap.get("tango-db", {}).get("db_servers", []):
+            dish = f'{server["device"]}/{server["name"]}'
+            if dish not in dishes:
+                dishes.append(dish)
+    return dishes
+
+
+def dishes_from_pattern(
+        pattern: str,
+        default_name: str
+        ) -> List[str]:
+    """
+    Resolve a glob pattern of dish prefixes against the cached FQDN index
+    of the Tango DB.
+
+    :param pattern: Glob pattern, eg. "ska00*" or "ska0[0-4]?/spfrxpu"
+    :param default_name: Name used when the pattern has no name part
+    :returns: Matching dish prefixes, sorted
+    """
+    return load_fqdn_index().dishes(
+        "/".join(split_dish(pattern, default_name))
+    )
+
+
+def resolve_dishes(
+        targets: List[str],
+        boardmap_dir: str,
+        default_name: str
+        ) -> List[str]:
+    """
+    Build the list of dishes for a fleet run.
+
+    :param targets: Literal dish prefixes and/or glob patterns
+    :param boardmap_dir: Optional directory of boardmap files
+    :param default_name: Name used when a target has no name part
+    :returns: Dish prefixes ("device/name"), without duplicates
+    """
+    dishes = []
+    if boardmap_dir is not None:
+        dishes += dishes_from_boardmaps(boardmap_dir)
+    for target in targets or []:
+        if any(c in target for c in GLOB_CHARS):
+            dishes += dishes_from_pattern(target, default_name)
+        else:
+            dishes.append("/".join(split_dish(target, default_name)))
+    return list(dict.fromkeys(dishes))
+
+
+def _run_one(
+        dish: str,
+        action: Callable,
+        default_name: str
+        ) -> FleetResult:
+    result = FleetResult(dish)
+    start = time.monotonic()
+    try:
+        result.ok, result.summary = action(*split_dish(dish, default_name))
+    except Exception as e:
+        # Keep one unreachable dish from taking down the rest of the fleet
+        result.summary = f"ERROR: {str(e).strip()}"
+    result.elapsed_s = time.monotonic() - start
+    return result
+
+
+def run_fleet(
+        dishes: List[str],
+        action: Callable,
+        default_name: str,
+        max_workers: int = DEFAULT_FLEET_WORKERS
+        ) -> List[FleetResult]:
+    """
+    Run an action against every dish concurrently.
+
+    :param dishes: Dish prefixes ("device/name")
+    :param action: Callable taking (device, name) and returning a
+                   (ok, summary) tuple
+    :param default_name: Name used when a dish has no name part
+    :param max_workers: Maximum number of dishes handled at the same time
+    :returns: One FleetResult per dish, in the order of dishes
+    """
+    if not dishes:
+        return []
+    workers = max(1, min(max_workers, len(dishes)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_run_one, dish, action, default_name)
+            for dish in dishes
+        ]
+        return [future.result() for future in futures]
+
+
+def format_fleet_table(
+        results: List[FleetResult]
+        ) -> List[str]:
+    """
+    Format fleet results as aligned table rows.
+
+    :param results: Results returned by run_fleet
+    :returns: A list of lines, header first
+    """
+    width = max([len(r.dish) for r in results] + [4])
+    lines = [f"{'DISH':<{width}}  {'RESULT':<6}  {'TIME':>7}  SUMMARY"]
+    for r in results:
+        lines.append(
+            f"{r.dish:<{width}}  {'OK' if r.ok else 'FAIL':<6}  "
+            f"{r.elapsed_s:>6.2f}s  {r.summary}"
+        )
+    passed = sum(1 for r in results if r.ok)
+    lines.append(f"{passed}/{len(results)} dishes OK")
+    return lines
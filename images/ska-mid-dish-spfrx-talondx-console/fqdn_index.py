@@ -0,0 +1,247 @@
+"""
+fqdn_index
+Index of the device FQDNs registered in the Tango DB, with their class.
+
+The index is built with one wildcard query for the class list and one
+wildcard query per class, so its cost does not grow with the number of
+dishes or servers in a shared DB. It is cached on disk per TANGO_HOST and
+reused for a time-to-live; once that has elapsed, two cheap DB queries
+check whether devices or servers were added, removed, renamed or moved
+before the index is rebuilt. Renames are detected from the names of the
+exported devices, so a device renamed while its server is stopped is only
+seen once the server runs again or the index is rebuilt (ttl 0 or
+refresh).
+"""
+
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import time
+from typing import List, Tuple
+
+from lazy_import import lazy_import
+
+tango = lazy_import("tango")
+
+DEFAULT_FQDN_TTL_S = 300.0
+CACHE_VERSION = 1
+EXCLUDED_DOMAINS = ("dserver", "sys")
+# Lines of DbInfo that change when devices or servers are added or removed
+FINGERPRINT_PREFIXES = ("Devices defined", "Device servers defined")
+
+
+def cache_dir() -> str:
+    """
+    Directory holding the cached indexes.
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "spfrx-console")
+
+
+def cache_path(
+        tango_host: str = None
+        ) -> str:
+    """
+    Path of the cached index for a Tango DB.
+
+    :param tango_host: TANGO_HOST of the DB, defaults to the environment
+    :returns: The cache file path
+    """
+    host = tango_host or os.environ.get("TANGO_HOST", "default")
+    return os.path.join(
+        cache_dir(), f"fqdn-index-{re.sub(r'[^A-Za-z0-9.-]', '_', host)}.json"
+    )
+
+
+def db_fingerprint(
+        db
+        ) -> str:
+    """
+    Summarise the DB content that the index depends on in two queries.
+
+    :param db: tango.Database
+    :returns: A hash of the device and server counts and of the names of
+              the exported devices
+    """
+    lines = [
+        line.strip()
+        for line in db.get_info().splitlines()
+        if line.strip().startswith(FINGERPRINT_PREFIXES)
+    ]
+    # Counts alone miss a rename or move that keeps them unchanged
+    lines += sorted(name.lower() for name in db.get_device_exported("*"))
+    return hashlib.sha1("\n".join(lines).encode()).hexdigest()
+
+
+def _matches(
+        value: str,
+        pattern: str
+        ) -> bool:
+    return pattern is None or fnmatch.fnmatchcase(value, pattern)
+
+
+class FqdnIndex:
+    """
+    Device FQDNs and their classes, queryable by dish, class and alias.
+
+    :param entries: List of (fqdn, class name) tuples
+    :param fingerprint: DB fingerprint at the time the index was built
+    :param built_at: Time the index was built or last revalidated (epoch s)
+    """
+
+    def __init__(
+            self,
+            entries: List[Tuple[str, str]],
+            fingerprint: str = "",
+            built_at: float = 0.0
+            ):
+        self.entries = sorted(entries)
+        self.fingerprint = fingerprint
+        self.built_at = built_at
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def query(
+            self,
+            dish: str = None,
+            dev_class: str = None,
+            alias: str = None
+            ) -> List[str]:
+        """
+        List the FQDNs matching all the given glob patterns.
+
+        :param dish: Pattern on "device/name", eg. "ska00*/spfrxpu". A
+                     pattern without "/" only matches the device part.
+        :param dev_class: Pattern on the device class, eg. "Spfrx*"
+        :param alias: Pattern on the alias part, eg. "bsp*"
+        :returns: Matching FQDNs, sorted
+        """
+        fqdns = []
+        for fqdn, entry_class in self.entries:
+            domain, family, member = fqdn.split("/", 2)
+            dish_value = domain
+            if dish is not None and "/" in dish.strip("/"):
+                dish_value = f"{domain}/{family}"
+                dish = dish.strip("/")
+            if _matches(dish_value, dish) and \
+                    _matches(entry_class, dev_class) and \
+                    _matches(member, alias):
+                fqdns.append(fqdn)
+        return fqdns
+
+    def dishes(
+            self,
+            pattern: str = None
+            ) -> List[str]:
+        """
+        List the dish prefixes ("device/name") present in the index.
+
+        :param pattern: Optional glob pattern on "device/name"
+        :returns: Dish prefixes, sorted
+        """
+        dishes = {fqdn.rsplit("/", 1)[0] for fqdn in self.query(dish=pattern)}
+        return sorted(dishes)
+
+    def to_json(self) -> dict:
+        return {
+            "version": CACHE_VERSION,
+            "fingerprint": self.fingerprint,
+            "built_at": self.built_at,
+            "entries": self.entries,
+        }
+
+    @classmethod
+    def from_json(
+            cls,
+            data: dict
+            ) -> "FqdnIndex":
+        if data.get("version") != CACHE_VERSION:
+            raise ValueError("unsupported FQDN index cache version")
+        return cls(
+            [tuple(entry) for entry in data["entries"]],
+            data["fingerprint"],
+            data["built_at"],
+        )
+
+
+def build_fqdn_index(
+        db
+        ) -> FqdnIndex:
+    """
+    Build the index from the Tango DB, excluding "sys" and "dserver" names.
+
+    :param db: tango.Database
+    :returns: A new FqdnIndex
+    """
+    fingerprint = db_fingerprint(db)
+    entries = []
+    for dev_class in db.get_class_list("*"):
+        if dev_class == "DServer":
+            continue
+        for fqdn in db.get_device_name("*", dev_class):
+            if fqdn.lower().split("/", 1)[0] not in EXCLUDED_DOMAINS:
+                entries.append((fqdn, dev_class))
+    return FqdnIndex(entries, fingerprint, time.time())
+
+
+def _read_cache(
+        path: str
+        ) -> FqdnIndex:
+    try:
+        with open(path, "r") as cache_fd:
+            return FqdnIndex.from_json(json.load(cache_fd))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _write_cache(
+        path: str,
+        index: FqdnIndex
+        ) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as cache_fd:
+            json.dump(index.to_json(), cache_fd)
+        os.replace(tmp_path, path)
+    except OSError:
+        # A read-only home only costs the rebuild next time
+        pass
+
+
+def load_fqdn_index(
+        ttl_s: float = DEFAULT_FQDN_TTL_S,
+        refresh: bool = False,
+        db=None
+        ) -> FqdnIndex:
+    """
+    Return the FQDN index, from the disk cache when it is still valid.
+
+    Within ttl_s of being built or revalidated, the cached index is used
+    without contacting the DB. After that, the DB fingerprint is compared
+    and the index is only rebuilt if devices or servers were added,
+    removed, renamed or moved.
+
+    :param ttl_s: Seconds the cached index is trusted without any DB query
+    :param refresh: Rebuild the index regardless of the cache
+    :param db: tango.Database to use, created when needed
+    :returns: The FqdnIndex
+    """
+    path = cache_path()
+    index = None if refresh else _read_cache(path)
+    if index is not None and time.time() - index.built_at < ttl_s:
+        return index
+
+    if db is None:
+        db = tango.Database()
+    if index is not None and index.fingerprint == db_fingerprint(db):
+        index.built_at = time.time()
+    else:
+        index = build_fqdn_index(db)
+    _write_cache(path, index)
+    return index
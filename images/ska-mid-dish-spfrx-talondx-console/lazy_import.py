@@ -0,0 +1,49 @@
+"""
+lazy_import
+Defer the import of heavy modules until they are first used.
+
+``tango = lazy_import("tango")`` returns a stand-in module object; the real
+module is imported the first time one of its attributes is accessed, so
+actions that never touch it do not pay for the import.
+"""
+
+import importlib
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is imported on first attribute access.
+    Safe to first use from several threads at once.
+
+    :param name: Fully qualified name of the module to import
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_lock = threading.Lock()
+        self._lazy_module = None
+
+    def _load(self) -> types.ModuleType:
+        with self._lazy_lock:
+            if self._lazy_module is None:
+                self._lazy_module = importlib.import_module(self.__name__)
+        return self._lazy_module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(
+        name: str
+        ) -> LazyModule:
+    """
+    Return a module that is only imported when first used.
+
+    :param name: Fully qualified name of the module
+    """
+    return LazyModule(name)
@@ -0,0 +1,171 @@
+"""
+proxy_pool
+A process-wide pool of PyTangoClientWrapper instances, keyed on device FQDN
+and timeout, shared by every SPFRx console operation.
+
+Connections are established lazily on first use, re-checked with a ping
+when they have not been verified recently, and evicted after sitting idle.
+"""
+
+import threading
+import time
+from typing import Dict, Tuple
+
+from pytango_client_wrapper import PyTangoClientWrapper
+
+DEFAULT_TIMEOUT_MS = 5000
+DEFAULT_HEALTH_INTERVAL_S = 30.0
+DEFAULT_IDLE_TIMEOUT_S = 300.0
+
+
+class _PoolEntry:
+    """
+    A single pooled client and its bookkeeping timestamps.
+    """
+
+    __slots__ = ("client", "last_used", "last_checked")
+
+    def __init__(self, client: PyTangoClientWrapper, now: float):
+        self.client = client
+        self.last_used = now
+        self.last_checked = now
+
+
+class DeviceProxyPool:
+    """
+    Keyed pool of Tango clients.
+
+    :param health_interval_s: Age in seconds after which a pooled connection
+                              is pinged before being handed out again
+    :param idle_timeout_s: Idle time in seconds after which a pooled
+                           connection is dropped
+    """
+
+    def __init__(
+            self,
+            health_interval_s: float = DEFAULT_HEALTH_INTERVAL_S,
+            idle_timeout_s: float = DEFAULT_IDLE_TIMEOUT_S
+            ):
+        self.health_interval_s = health_interval_s
+        self.idle_timeout_s = idle_timeout_s
+        self._entries: Dict[Tuple[str, int], _PoolEntry] = {}
+        self._key_locks: Dict[Tuple[str, int], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(
+            self,
+            fqdn: str,
+            timeout_ms: int = DEFAULT_TIMEOUT_MS
+            ) -> PyTangoClientWrapper:
+        """
+        Return a connected client for the given device, creating it on
+        first use.
+
+        :param fqdn: Device FQDN to connect to
+        :param timeout_ms: Client timeout in milliseconds
+        :returns: A pooled PyTangoClientWrapper
+        """
+        key = (fqdn, timeout_ms)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Creation and health checks are serialized per key only, so that
+        # a slow device does not hold up clients for other devices
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+
+            if entry is not None and \
+                    now - entry.last_checked > self.health_interval_s:
+                if self._is_healthy(entry.client):
+                    entry.last_checked = now
+                else:
+                    self.evict(fqdn, timeout_ms)
+                    entry = None
+
+            if entry is None:
+                client = PyTangoClientWrapper()
+                client.create_tango_client(fqdn)
+                client.set_timeout_millis(timeout_ms)
+                entry = _PoolEntry(client, time.monotonic())
+                with self._lock:
+                    self._entries[key] = entry
+
+            entry.last_used = time.monotonic()
+            return entry.client
+
+    def evict(
+            self,
+            fqdn: str,
+            timeout_ms: int = None
+            ) -> None:
+        """
+        Drop pooled clients for a device.
+
+        :param fqdn: Device FQDN
+        :param timeout_ms: Only drop the client with this timeout.
+                           All clients for the device are dropped if None.
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == fqdn and timeout_ms in (None, key[1]):
+                    self._drop(key)
+
+    def clear(self) -> None:
+        """
+        Drop every pooled client.
+        """
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+
+    def _evict_idle(
+            self,
+            now: float
+            ) -> None:
+        """
+        Drop clients that have been idle for longer than the idle timeout.
+        Must be called with the pool lock held.
+        """
+        for key, entry in list(self._entries.items()):
+            if now - entry.last_used > self.idle_timeout_s:
+                self._drop(key)
+
+    def _drop(
+            self,
+            key: Tuple[str, int]
+            ) -> None:
+        """
+        Drop the client of a key, and its lock unless a get() holds it.
+        Must be called with the pool lock held.
+        """
+        del self._entries[key]
+        key_lock = self._key_locks.get(key)
+        if key_lock is not None and not key_lock.locked():
+            del self._key_locks[key]
+
+    @staticmethod
+    def _is_healthy(
+            client: PyTangoClientWrapper
+            ) -> bool:
+        try:
+            client.dp.ping()
+            return True
+        except Exception:
+            return False
+
+
+_proxy_pool = DeviceProxyPool()
+
+
+def get_proxy_pool() -> DeviceProxyPool:
+    """
+    Return the process-wide proxy pool.
+    """
+    return _proxy_pool
@@ -0,0 +1,388 @@
+"""
+reconcile
+Bring the SPFRx receiver to a desired state with the fewest commands.
+
+The desired state is a dict (usually loaded from JSON) in the form::
+
+    {
+        "band": 2,
+        "synchronize": false,
+        "attenuation": {"1": {"H": 10.0, "V": 10.5}, "2": {"H": 8.0}},
+        "spectral_inversion": {"1": true, "3": false},
+        "noise_diode": {
+            "mode": 1,
+            "enabled": true,
+            "periodic": [100, 50, 0],
+            "pseudoRandom": [1, 2, 3]
+        },
+        "spectrometer_bridge": 1,
+        "spectrometer": {"throttle_interval": 0, "num_packets": 1}
+    }
+
+Every entry is optional. The live state is read with one read_attributes
+call per device involved, with the devices read concurrently; the
+differences are then turned into an ordered list of steps so that at most
+one standby transition takes place.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from atten_profile import (
+    ATTEN_TOLERANCE,
+    atten_attr,
+    normalize_atten_profile,
+    write_atten_profile,
+)
+from pytango_client_wrapper import PyTangoClientWrapper
+from transition_wait import (
+    OPERATING_MODE_DATA_CAPTURE,
+    OPERATING_MODE_STANDBY,
+    wait_for_attribute,
+)
+
+STATE_KEYS = (
+    "band",
+    "synchronize",
+    "attenuation",
+    "spectral_inversion",
+    "noise_diode",
+    "spectrometer_bridge",
+    "spectrometer",
+)
+ND_PARS = ("periodic", "pseudoRandom")
+ND_KEYS = ("mode", "enabled") + ND_PARS
+# Each of the noise diode parameter lists holds 3 integers
+ND_PARS_LENGTH = 3
+# "spectrometer" entry: pktcap attribute
+SPECTROMETER_ATTRS = {
+    "throttle_interval": "spectrometer_throttle_interval",
+    "num_packets": "spectrometer_num_packets",
+}
+
+
+class ReconcileError(Exception):
+    """
+    Raised when a reconcile step does not reach its expected result.
+    """
+
+
+class ReconcileStep:
+    """
+    A single write or command needed to reach the desired state.
+
+    :param description: Human readable description of the step
+    :param apply: Callable performing the step
+    """
+
+    __slots__ = ("description", "apply")
+
+    def __init__(self, description: str, apply: Callable[[], None]):
+        self.description = description
+        self.apply = apply
+
+    def __repr__(self) -> str:
+        return f"ReconcileStep({self.description!r})"
+
+
+def load_desired_state(
+        path: str
+        ) -> dict:
+    """
+    Load a desired receiver state from a JSON file.
+
+    :param path: Path of the JSON file
+    :returns: The desired state dict
+    """
+    with open(path, "r") as state_fd:
+        return json.load(state_fd)
+
+
+def controller_attributes(
+        desired: dict
+        ) -> List[str]:
+    """
+    List the controller attributes needed to compare against the desired
+    state.
+
+    :param desired: The desired state dict
+    :returns: Attribute names, read together in one call
+    """
+    attrs = ["operatingMode", "configuredBand"]
+    for band, pols in desired.get("attenuation", {}).items():
+        attrs += [atten_attr(int(band), pol.upper()) for pol in pols]
+    if "noise_diode" in desired:
+        attrs += [
+            "noiseDiodeState",
+            "noiseDiodeMode",
+            "periodicNoiseDiodePars",
+            "pseudoRandomNoiseDiodePars",
+        ]
+    return attrs
+
+
+def _read_values(
+        client: PyTangoClientWrapper,
+        names: List[str]
+        ) -> Dict[str, object]:
+    attrs = client.read_attributes(names)
+    return {
+        name: (None if attr.has_failed else attr.value)
+        for name, attr in zip(names, attrs)
+    }
+
+
+def read_live_state(
+        ctrl: PyTangoClientWrapper,
+        bp_clients: Dict[int, PyTangoClientWrapper],
+        desired: dict,
+        pktcap: PyTangoClientWrapper = None
+        ) -> dict:
+    """
+    Read the part of the live state that the desired state refers to, with
+    one call per device and the devices read concurrently.
+
+    :param ctrl: Client of the SPFRx controller
+    :param bp_clients: Band processor client for each band in
+                       "spectral_inversion"
+    :param desired: The desired state dict
+    :param pktcap: Packet capture client, needed for "spectrometer"
+    :returns: A dict of attribute name to value for the controller, plus
+              "spec_inv" mapping band to the live spectral inversion and
+              "spectrometer" mapping each "spectrometer" entry to its live
+              value; values that could not be read are None
+    :raises TangoClientError: If a device cannot be read
+    """
+    # Bands sharing a band processor read it once
+    bp_bands: Dict[int, List[int]] = {}
+    for band in desired.get("spectral_inversion", {}):
+        bp_bands.setdefault(id(bp_clients[int(band)]), []).append(int(band))
+    spectrometer = list(desired.get("spectrometer", {}))
+
+    with ThreadPoolExecutor(max_workers=2 + len(bp_bands)) as executor:
+        ctrl_future = executor.submit(
+            _read_values, ctrl, controller_attributes(desired)
+        )
+        bp_futures = {
+            bp_id: executor.submit(
+                _read_values, bp_clients[bands[0]], ["spec_inv"]
+            )
+            for bp_id, bands in bp_bands.items()
+        }
+        pktcap_future = None
+        if spectrometer:
+            pktcap_future = executor.submit(
+                _read_values,
+                pktcap,
+                [SPECTROMETER_ATTRS[key] for key in spectrometer]
+            )
+
+        live = ctrl_future.result()
+        live["spec_inv"] = {
+            band: bp_futures[bp_id].result()["spec_inv"]
+            for bp_id, bands in bp_bands.items()
+            for band in bands
+        }
+        live["spectrometer"] = {}
+        if pktcap_future is not None:
+            values = pktcap_future.result()
+            live["spectrometer"] = {
+                key: values[SPECTROMETER_ATTRS[key]] for key in spectrometer
+            }
+    return live
+
+
+def _command_step(
+        client: PyTangoClientWrapper,
+        description: str,
+        command: str,
+        *args
+        ) -> ReconcileStep:
+    return ReconcileStep(
+        description, lambda: client.command_read_write(command, *args)
+    )
+
+
+def _write_step(
+        client: PyTangoClientWrapper,
+        attr: str,
+        value
+        ) -> ReconcileStep:
+    return ReconcileStep(
+        f"write {attr} = {value}",
+        lambda: client.write_attribute(attr, value)
+    )
+
+
+def _wait_step(
+        ctrl: PyTangoClientWrapper,
+        mode: int,
+        mode_name: str,
+        timeout_s: float
+        ) -> ReconcileStep:
+    def apply():
+        result = wait_for_attribute(
+            ctrl.dp, "operatingMode", mode, timeout_s, device=ctrl.dev_name
+        )
+        if not result:
+            raise ReconcileError(
+                f"operatingMode did not reach {mode_name} within "
+                f"{timeout_s} s (last value {result.value})"
+            )
+    return ReconcileStep(f"wait for operatingMode {mode_name}", apply)
+
+
+def _differs(live_value, desired_value) -> bool:
+    if live_value is None:
+        return True
+    try:
+        return list(live_value) != list(desired_value)
+    except TypeError:
+        return live_value != desired_value
+
+
+def plan_reconcile(
+        desired: dict,
+        live: dict,
+        ctrl: PyTangoClientWrapper,
+        bp_clients: Dict[int, PyTangoClientWrapper] = None,
+        pktcap: PyTangoClientWrapper = None,
+        timeout_s: float = 30.0
+        ) -> List[ReconcileStep]:
+    """
+    Compute the ordered steps that take the live state to the desired
+    state.
+
+    Steps that need the SPFRx in standby (band configuration, noise diode
+    mode and parameters) are grouped behind a single SetStandbyMode, and
+    followed by one ConfigureBand to return to DATA_CAPTURE. Attenuation
+    is written afterwards, since configuring a band reloads it.
+
+    :param desired: The desired state dict
+    :param live: The live state, as returned by read_live_state
+    :param ctrl: Client of the SPFRx controller
+    :param bp_clients: Band processor client for each band in
+                       "spectral_inversion"
+    :param pktcap: Packet capture client, needed for "spectrometer_bridge"
+                   and "spectrometer"
+    :param timeout_s: Upper bound on each operating mode transition
+    :returns: The list of steps; empty if nothing needs to change
+    """
+    steps = []
+    standby_steps = []
+
+    current_band = int(live.get("configuredBand") or 0)
+    band = int(desired.get("band", current_band))
+    configure_band = "band" in desired and (
+        band != current_band
+        or live.get("operatingMode") != OPERATING_MODE_DATA_CAPTURE
+    )
+
+    nd = desired.get("noise_diode", {})
+    if "mode" in nd and live.get("noiseDiodeMode") != nd["mode"]:
+        standby_steps.append(_write_step(ctrl, "noiseDiodeMode", nd["mode"]))
+    for kind in ND_PARS:
+        attr = f"{kind}NoiseDiodePars"
+        if kind in nd and _differs(live.get(attr), nd[kind]):
+            standby_steps.append(_write_step(ctrl, attr, list(nd[kind])))
+
+    if configure_band or standby_steps:
+        if band == 0:
+            raise ReconcileError(
+                "A band is required to return to DATA_CAPTURE after "
+                "reconfiguring the noise diode"
+            )
+        steps.append(
+            _command_step(ctrl, "command SetStandbyMode", "SetStandbyMode")
+        )
+        steps.append(
+            _wait_step(ctrl, OPERATING_MODE_STANDBY, "STANDBY", timeout_s)
+        )
+        steps += standby_steps
+        sync = bool(desired.get("synchronize", False))
+        steps.append(
+            _command_step(
+                ctrl,
+                f"command ConfigureBand{band}({sync})",
+                f"ConfigureBand{band}",
+                sync,
+            )
+        )
+        steps.append(
+            _wait_step(
+                ctrl, OPERATING_MODE_DATA_CAPTURE, "DATA_CAPTURE", timeout_s
+            )
+        )
+
+    reconfigured = configure_band or bool(standby_steps)
+    atten_changes = {}
+    attenuation = normalize_atten_profile(desired.get("attenuation", {}))
+    for band_key, pols in attenuation.items():
+        for pol, value in pols.items():
+            live_value = live.get(atten_attr(int(band_key), pol))
+            if reconfigured or live_value is None or \
+                    abs(float(live_value) - value) >= ATTEN_TOLERANCE:
+                atten_changes.setdefault(band_key, {})[pol] = value
+    if atten_changes:
+        steps.append(
+            ReconcileStep(
+                f"write attenuation {atten_changes}",
+                lambda: write_atten_profile(ctrl, atten_changes)
+            )
+        )
+
+    for band_key, invert in desired.get("spectral_inversion", {}).items():
+        live_value = live["spec_inv"].get(int(band_key))
+        if live_value is None or bool(live_value) != bool(invert):
+            steps.append(
+                _write_step(bp_clients[int(band_key)], "spec_inv", int(invert))
+            )
+
+    # noiseDiodeState: 1 = ENABLED, 2 = DISABLED
+    if "enabled" in nd and \
+            live.get("noiseDiodeState") != (1 if nd["enabled"] else 2):
+        steps.append(
+            _command_step(
+                ctrl,
+                f"command SetNoiseDiodeState({bool(nd['enabled'])})",
+                "SetNoiseDiodeState",
+                bool(nd["enabled"]),
+            )
+        )
+
+    for key, value in desired.get("spectrometer", {}).items():
+        if _differs(live["spectrometer"].get(key), value):
+            steps.append(
+                _write_step(pktcap, SPECTROMETER_ATTRS[key], int(value))
+            )
+
+    # The bridge selection cannot be read back from pktcap, so it is always
+    # applied when requested
+    if "spectrometer_bridge" in desired:
+        steps.append(
+            _command_step(
+                pktcap,
+                f"command spectrometer_set_bridge"
+                f"({desired['spectrometer_bridge']})",
+                "spectrometer_set_bridge",
+                int(desired["spectrometer_bridge"]),
+            )
+        )
+
+    return steps
+
+
+def apply_plan(
+        steps: List[ReconcileStep],
+        log: Callable[[str], None] = print
+        ) -> None:
+    """
+    Apply reconcile steps in order, stopping at the first failure.
+
+    :param steps: Steps returned by plan_reconcile
+    :param log: Callable used to report each step
+    """
+    for step in steps:
+        log(f"  {step.description}")
+        step.apply()
@@ -0,0 +1,196 @@
+"""
+snapshot
+Versioned snapshots of the SPFRx receiver configuration.
+
+A snapshot holds the receiver state in the desired state format of
+reconcile, so that restoring it is a reconcile that only changes what
+differs::
+
+    {
+        "version": 1,
+        "time": "2026-10-18T10:15:02.123456Z",
+        "dish": "ska001/spfrxpu",
+        "state": {
+            "band": 2,
+            "attenuation": {"1": {"H": 10.0, "V": 10.5}, ...},
+            "spectral_inversion": {"1": false, "2": false, "3": true},
+            "noise_diode": {"mode": 1, "enabled": true, ...},
+            "spectrometer": {"throttle_interval": 0, "num_packets": 1}
+        },
+        "unreadable": []
+    }
+
+The state is read with one read_attributes call per device, with the
+devices read concurrently (see reconcile.read_live_state). Settings that
+could not be read are listed in "unreadable" and left out of the state,
+so a restore leaves them alone. The spectrometer bridge and the band
+synchronization flag cannot be read back and are not part of a snapshot.
+"""
+
+import datetime
+import json
+from typing import Iterable, List
+
+from atten_profile import POLS, atten_attr
+from reconcile import ND_PARS, SPECTROMETER_ATTRS
+from transition_wait import OPERATING_MODE_DATA_CAPTURE
+
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_template(
+        bands: Iterable[int]
+        ) -> dict:
+    """
+    A desired state naming every setting a snapshot reads, for
+    reconcile.read_live_state.
+
+    :param bands: The band IDs of the receiver
+    :returns: The desired state dict; only its keys are meaningful
+    """
+    return {
+        "band": None,
+        "attenuation": {
+            str(band): {pol: None for pol in POLS} for band in bands
+        },
+        "spectral_inversion": {str(band): None for band in bands},
+        "noise_diode": {"mode": None, "enabled": None},
+        "spectrometer": {key: None for key in SPECTROMETER_ATTRS},
+    }
+
+
+def _plain(value):
+    # NumPy scalars and arrays from PyTango, as JSON types
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return value
+
+
+def state_from_live(
+        live: dict,
+        bands: Iterable[int]
+        ) -> tuple:
+    """
+    Convert a live state read with snapshot_template into a desired state.
+
+    :param live: The live state, as returned by reconcile.read_live_state
+    :param bands: The band IDs of the receiver
+    :returns: A (state, unreadable) tuple, where unreadable lists the
+              settings that could not be read
+    """
+    state = {}
+    unreadable: List[str] = []
+
+    band = live.get("configuredBand")
+    if band is None:
+        unreadable.append("configuredBand")
+    elif int(band) != 0 and \
+            live.get("operatingMode") == OPERATING_MODE_DATA_CAPTURE:
+        state["band"] = int(band)
+
+    attenuation = {}
+    for band in bands:
+        for pol in POLS:
+            attr = atten_attr(band, pol)
+            if live.get(attr) is None:
+                unreadable.append(attr)
+            else:
+                attenuation.setdefault(str(band), {})[pol] = float(live[attr])
+    state["attenuation"] = attenuation
+
+    spectral_inversion = {}
+    for band in bands:
+        if live["spec_inv"].get(int(band)) is None:
+            unreadable.append(f"spec_inv (band {band})")
+        else:
+            spectral_inversion[str(band)] = bool(live["spec_inv"][int(band)])
+    state["spectral_inversion"] = spectral_inversion
+
+    noise_diode = {}
+    if live.get("noiseDiodeMode") is None:
+        unreadable.append("noiseDiodeMode")
+    else:
+        noise_diode["mode"] = int(live["noiseDiodeMode"])
+    # noiseDiodeState: 1 = ENABLED, 2 = DISABLED, 0 = UNKNOWN
+    if live.get("noiseDiodeState") in (1, 2):
+        noise_diode["enabled"] = int(live["noiseDiodeState"]) == 1
+    else:
+        unreadable.append("noiseDiodeState")
+    for kind in ND_PARS:
+        attr = f"{kind}NoiseDiodePars"
+        if live.get(attr) is None:
+            unreadable.append(attr)
+        else:
+            noise_diode[kind] = [int(v) for v in _plain(live[attr])]
+    state["noise_diode"] = noise_diode
+
+    spectrometer = {}
+    for key, attr in SPECTROMETER_ATTRS.items():
+        if live["spectrometer"].get(key) is None:
+            unreadable.append(attr)
+        else:
+            spectrometer[key] = int(live["spectrometer"][key])
+    state["spectrometer"] = spectrometer
+
+    return state, unreadable
+
+
+def make_snapshot(
+        dish: str,
+        state: dict,
+        unreadable: List[str] = None
+        ) -> dict:
+    """
+    Wrap a receiver state into a snapshot.
+
+    :param dish: The dish FQDN prefix ("device/name")
+    :param state: The state, as returned by state_from_live
+    :param unreadable: Settings that could not be read
+    :returns: The snapshot dict
+    """
+    return {
+        "version": SNAPSHOT_VERSION,
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(
+            timespec="microseconds").replace("+00:00", "Z"),
+        "dish": dish,
+        "state": state,
+        "unreadable": list(unreadable or []),
+    }
+
+
+def save_snapshot(
+        path: str,
+        snapshot: dict
+        ) -> None:
+    """
+    Save a snapshot to a JSON file.
+
+    :param path: Path of the JSON file
+    :param snapshot: The snapshot dict
+    """
+    with open(path, "w") as snapshot_fd:
+        json.dump(snapshot, snapshot_fd, indent=4)
+
+
+def load_snapshot(
+        path: str
+        ) -> dict:
+    """
+    Load a snapshot from a JSON file.
+
+    :param path: Path of the JSON file
+    :returns: The snapshot dict
+    :raises ValueError: If the file is not a snapshot this version of the
+                        console can restore
+    """
+    with open(path, "r") as snapshot_fd:
+        snapshot = json.load(snapshot_fd)
+    if not isinstance(snapshot, dict) or "state" not in snapshot:
+        raise ValueError(f"{path} is not an SPFRx snapshot")
+    version = snapshot.get("version")
+    if not isinstance(version, int) or not 1 <= version <= SNAPSHOT_VERSION:
+        raise ValueError(
+            f"{path} has snapshot version {version!r}; this console "
+            f"restores versions up to {SNAPSHOT_VERSION}"
+        )
+    return snapshot
@@ -2,16 +2,93 @@
 import argparse
 import getpass
 import logging
-import tango
+import os
 import time
-
+from functools import partial
+
+from atten_profile import (
+    MAX_ATTEN,
+    MIN_ATTEN,
+    load_atten_profile,
+    normalize_atten_profile,
+    profile_items,
+    read_atten_profile,
+    save_atten_profile,
+    verify_atten_profile,
+    write_atten_profile,
+)
+from attribute_dump import (
+    DEFAULT_ABS_TOL,
+    DEFAULT_REL_TOL,
+    DumpWriter,
+    diff_dumps,
+    format_value,
+    load_dump,
+    probe_attributes,
+)
+from autolevel import (
+    DEFAULT_CHANNELS,
+    DEFAULT_TOLERANCE_DB,
+    LevelResult,
+    level_band,
+)
+from band_profile import (
+    DEFAULT_PROFILE_CYCLES,
+    append_history,
+    default_history_path,
+    format_summary,
+    load_history,
+    percentile,
+    summarize_history,
+    switch_record,
+)
+from device_sweep import (
+    DEFAULT_DEADLINE_S,
+    DEFAULT_MAX_WORKERS,
+    VERSION_ATTRIBUTES,
+    probe_status,
+    probe_version,
+    sweep_devices,
+)
+from fleet import (
+    DEFAULT_FLEET_WORKERS,
+    format_fleet_table,
+    resolve_dishes,
+    run_fleet,
+)
+from fqdn_index import DEFAULT_FQDN_TTL_S, load_fqdn_index
+from proxy_pool import DEFAULT_TIMEOUT_MS, get_proxy_pool
 from pytango_client_wrapper import PyTangoClientWrapper
-from tango import DeviceProxy
+from reconcile import (
+    ND_KEYS,
+    ND_PARS,
+    ND_PARS_LENGTH,
+    SPECTROMETER_ATTRS,
+    STATE_KEYS,
+    ReconcileError,
+    apply_plan,
+    load_desired_state,
+    plan_reconcile,
+    read_live_state,
+)
+from snapshot import (
+    load_snapshot,
+    make_snapshot,
+    save_snapshot,
+    snapshot_template,
+    state_from_live,
+)
+from tango_call_stats import STATS_FORMATS, dump_stats_at_exit
+from tango_resilience import TangoClientError
+from transition_wait import (
+    OPERATING_MODE_DATA_CAPTURE,
+    OPERATING_MODE_STANDBY,
+    TransitionResult,
+    wait_for_attribute,
+)
 
 MIN_BAND = 1
 MAX_BAND = 3
-MIN_ATTEN : float = 0.0
-MAX_ATTEN : float = 31.75
 POL_H = 0
 POL_V = 1
 POLS = ("H", "V")
@@ -20,12 +97,19 @@ ND_STATE = ("UNKNOWN", "ENABLED", "DISABLED")
 
 SPFRX_DEVICE = "ska001"
 SPFRX_NAME = "spfrxpu"
+# Overrides the FQDN format, eg. to address the devices of spfrx_simulator.py
+FQDN_FORMAT_ENV = "SPFRX_FQDN_FORMAT"
+FQDN_FORMAT = "{device}/{name}/{alias}"
+
+DEFAULT_TRANSITION_TIMEOUT_S = 30.0
 
 LOG_FORMAT = (
     "[spfrx.py: line %(lineno)s]%(levelname)s: %(message)s"
 )
 VERSION = "0.0.1"
 
+logger_ = logging.getLogger("spfrx-talondx.py")
+
 SPFRX_DEVICE_LIST = {
     "ctrl": "controller",
     "odl12": "odl-12",
@@ -65,128 +149,227 @@ class bcolors:
     UNDERLINE = "\033[4m"
 
 
+def getDeviceFqdns(
+        device: str = SPFRX_DEVICE,
+        name: str = SPFRX_NAME,
+        ) -> dict:
+    """
+    Construct the FQDN of every device in SPFRX_DEVICE_LIST.
+
+    :param device: Device string, defaults to SPFRX_DEVICE
+    :param name: Name string, defaults to SPFRX_NAME
+    :returns: A dict of SPFRX_DEVICE_LIST key to FQDN
+    """
+    return {
+        dev_name: getFqdn(alias, device, name)
+        for dev_name, alias in SPFRX_DEVICE_LIST.items()
+    }
+
+
 def get_device_status(
         device: str = SPFRX_DEVICE,
         name: str = SPFRX_NAME,
-        ) -> None:
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        deadline_s: float = DEFAULT_DEADLINE_S,
+        ) -> list:
     """
     Reads and displays the state and status of each HPS Tango device
-    running on the Talon DX boards, as specified in the configuration
-    commands -- ref `"config_commands"` in the talondx-config JSON file.
+    running on the Talon DX boards, as listed in SPFRX_DEVICE_LIST.
+    Devices are queried concurrently.
 
-    :param config_commands: JSON array of configure commands
-    :type config_commands: str
+    :param device: Device string, defaults to SPFRX_DEVICE
+    :param name: Name string, defaults to SPFRX_NAME
+    :param max_workers: Maximum number of devices queried at the same time
+    :param deadline_s: Time budget in seconds for each device
+    :returns: A list of SweepResult, one per device
     """
     logger_.info("================")
     logger_.info(" Target: SFPRx")
     logger_.info("================")
 
-    for dev_name in SPFRX_DEVICE_LIST:
-        try:
-            dev_proxy = DeviceProxy(
-                getFqdn(SPFRX_DEVICE_LIST[dev_name], device, name)
-            )
-        except Exception as proxy_except:
+    results = sweep_devices(
+        getDeviceFqdns(device, name), probe_status, max_workers, deadline_s
+    )
+    for result in results:
+        if result.error is not None:
             logger_.info(
-                f"Error on DeviceProxy {dev_name}: {proxy_except}"
+                f"Error reading state or status of {result.key}: "
+                f"{result.error}"
             )
-            break
-        if dev_proxy.import_info().exported:
-            try:
-                ds_state = str(dev_proxy.state())
-                ds_status = dev_proxy.status()
-                logger_.info(
-                    f"{dev_name:<50}: state {ds_state:<8}  "
-                    f"status={ds_status}"
-                )
-            except Exception as status_except:
-                logger_.info(
-                    f"Error reading state or status of {dev_name}: "
-                    f"{status_except}"
-                )
+        elif not result.exported:
+            logger_.info(f"{result.key}   DEVICE NOT EXPORTED!")
         else:
-            logger_.info(f"{dev_name}   DEVICE NOT EXPORTED!")
+            logger_.info(
+                f"{result.key:<50}: state {result.values['state']:<8}  "
+                f"status={result.values['status']}"
+            )
+    return results
 
 
-def get_device_fqdn_list() -> list:
+def get_device_fqdn_list(
+        dish: str = None,
+        dev_class: str = None,
+        alias: str = None,
+        refresh: bool = False,
+        ttl_s: float = DEFAULT_FQDN_TTL_S,
+        ) -> list:
     """
-    Get full list of fully-qualified device names (FQDNs) from the Tango
-    database, excluding "sys" and "dserver" names.
+    Get the list of fully-qualified device names (FQDNs) from the Tango
+    database, excluding "sys" and "dserver" names. The list comes from the
+    cached FQDN index, which is only rebuilt when it has expired and the
+    DB content has changed.
 
     Ref: https://tango-controls.readthedocs.io/en/latest/
     tutorials-and-howtos/how-tos/how-to-pytango.html
 
+    :param dish: Optional glob pattern on "device/name" or "device"
+    :param dev_class: Optional glob pattern on the device class
+    :param alias: Optional glob pattern on the alias part of the FQDN
+    :param refresh: Rebuild the index from the DB
+    :param ttl_s: Seconds a cached index is used without querying the DB
     :returns: alphabetically-sorted list of FQDNs (str)
     """
     try:
-        db = tango.Database()
+        index = load_fqdn_index(ttl_s, refresh)
     except Exception as db_except:
         logger_.info(f"Database error: {db_except}")
         exit()
 
-    instances = []
-    for server in db.get_server_list():
-        # Filter out the unwanted items from the list to get just the FQDNs
-        # of our devices... the full list from get_device_class_list() has
-        # the structure:
-        # [device name, class name, device name, class name, ...]
-        # and also includes the admin server (dserver/exec_name/instance)
-        instances += [
-            dev
-            for dev in db.get_device_class_list(server)
-            if "/" in dev
-            and not dev.startswith("dserver")
-            and not dev.startswith("sys")
-        ]
-
-    return sorted(instances)
+    return index.query(dish, dev_class, alias)
 
 
 def get_device_version_info(
         device: str = SPFRX_DEVICE,
         name: str = SPFRX_NAME,
-        ) -> None:
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        deadline_s: float = DEFAULT_DEADLINE_S,
+        ) -> list:
     """
     Reads and displays the `dsVersionId`, `dsBuildDateTime`, and
     `dsGitCommitHash` attributes of each HPS Tango device running
-    on the SPFRx Talon DX boards, as specified in the configuration
-    commands -- ref `"config_commands"` in the spfrx-config JSON file.
+    on the SPFRx Talon DX boards, as listed in SPFRX_DEVICE_LIST.
+    Devices are queried concurrently.
 
-    :param config_commands: JSON array of configure commands
-    :type config_commands: str
+    :param device: Device string, defaults to SPFRX_DEVICE
+    :param name: Name string, defaults to SPFRX_NAME
+    :param max_workers: Maximum number of devices queried at the same time
+    :param deadline_s: Time budget in seconds for each device
+    :returns: A list of SweepResult, one per device
     """
     logger_.info("================")
     logger_.info(" Target: SPFRx")
     logger_.info("================")
 
-    for dev_name in SPFRX_DEVICE_LIST:
-        try:
-            dev_proxy = DeviceProxy(
-                getFqdn(SPFRX_DEVICE_LIST[dev_name], device, name)
-            )
-            if dev_proxy.import_info().exported:
-                logger_.info(f"{dev_proxy.info().dev_class:<20}{dev_name}")
-                attr_names = [
-                    "dsVersionId",
-                    "dsBuildDateTime",
-                    "dsGitCommitHash",
-                ]
-                for attr_name in attr_names:
-                    try:
-                        attr_value = dev_proxy.read_attribute(attr_name)
-                        logger_.info(
-                            f"  {attr_value.name:<20}: {attr_value.value}"
-                        )
-                    except Exception as attr_except:
-                        logger_.info(
-                            f"Error reading attribute: {attr_except}"
-                        )
-            else:
-                logger_.info(f"{dev_name}   DEVICE NOT EXPORTED!")
-        except Exception as proxy_except:
+    results = sweep_devices(
+        getDeviceFqdns(device, name), probe_version, max_workers, deadline_s
+    )
+    for result in results:
+        if result.error is not None:
             logger_.info(
-                f"Error on DeviceProxy ({dev_name}): {proxy_except}"
+                f"Error on DeviceProxy ({result.key}): {result.error}"
+            )
+        elif not result.exported:
+            logger_.info(f"{result.key}   DEVICE NOT EXPORTED!")
+        else:
+            logger_.info(f"{result.values['class']:<20}{result.key}")
+            for attr_name in VERSION_ATTRIBUTES:
+                logger_.info(
+                    f"  {attr_name:<20}: {result.values.get(attr_name)}"
+                )
+    return results
+
+
+def dump_device_attributes(
+        path: str,
+        device: str = SPFRX_DEVICE,
+        name: str = SPFRX_NAME,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        deadline_s: float = DEFAULT_DEADLINE_S,
+        ) -> bool:
+    """
+    Dumps every attribute of each HPS Tango device running on the SPFRx
+    Talon DX boards, as listed in SPFRX_DEVICE_LIST, to a JSON lines file
+    (see attribute_dump). Devices are read concurrently and written as
+    soon as they are done.
+
+    :param path: Path of the dump file; gzip compressed if it ends with
+                 ".gz"
+    :param device: Device string, defaults to SPFRX_DEVICE
+    :param name: Name string, defaults to SPFRX_NAME
+    :param max_workers: Maximum number of devices read at the same time
+    :param deadline_s: Time budget in seconds for each device
+    :returns: True if every attribute of every device was read
+    """
+    writer = DumpWriter(path, f"{device}/{name}")
+    failed = []
+
+    def write(result):
+        writer.write_result(result)
+        if not result.ok:
+            failed.append(result)
+
+    start = time.perf_counter()
+    try:
+        sweep_devices(
+            getDeviceFqdns(device, name), probe_attributes, max_workers,
+            deadline_s, on_result=write
+        )
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+
+    for result in failed:
+        logger_.info(
+            f"{result.key:<20}: {result.error or 'DEVICE NOT EXPORTED!'}"
+        )
+    print(
+        f"  Dumped {writer.attributes} attributes of {writer.devices} "
+        f"devices in {elapsed * 1e3:.1f} ms ({writer.errors} unreadable "
+        f"attributes, {len(failed)} unreachable devices)"
+    )
+    return not failed and writer.errors == 0
+
+
+def diff_device_attribute_dumps(
+        old_path: str,
+        new_path: str,
+        rel_tol: float = DEFAULT_REL_TOL,
+        abs_tol: float = DEFAULT_ABS_TOL,
+        ignore: list = None,
+        ) -> bool:
+    """
+    Compares two dumps written by dump_device_attributes and displays the
+    attributes that changed, numeric values being compared within the
+    tolerances.
+
+    :param old_path: Path of the first dump
+    :param new_path: Path of the second dump
+    :param rel_tol: Relative tolerance of numeric values
+    :param abs_tol: Absolute tolerance of numeric values
+    :param ignore: Glob patterns of attributes ("attribute" or
+                   "device/attribute") left out of the comparison
+    :returns: True if no attribute changed
+    """
+    try:
+        old_header, old = load_dump(old_path)
+        new_header, new = load_dump(new_path)
+    except (OSError, ValueError) as e:
+        logger_.error(f"Unable to load attribute dump: {e}")
+        return False
+
+    print(f"  --- {old_path} ({old_header['dish']}, {old_header['time']})")
+    print(f"  +++ {new_path} ({new_header['dish']}, {new_header['time']})")
+    changes = diff_dumps(old, new, rel_tol, abs_tol, ignore or ())
+    for dev, attr, change, old_value, new_value in changes:
+        if attr is None:
+            print(f"  {dev:<10} {'':<40} {change}")
+        else:
+            print(
+                f"  {dev:<10} {attr:<40} {change:<9} "
+                f"{format_value(old_value):<40} -> {format_value(new_value)}"
             )
+    print(f"  {len(changes)} differences")
+    return not changes
 
 
 def getFqdn(
@@ -198,12 +381,38 @@ def getFqdn(
     Construct the TANGO FQDN from supplied string values in the following form:
     device/name/alias
 
+    The form can be overridden with the SPFRX_FQDN_FORMAT environment
+    variable.
+
     :param alias: Alias string
     :param device: Device string, defaults to SPFRX_DEVICE
     :param name: Name string, defaults to SPFRX_NAME
     :returns: A TANGO FQDN string
     """
-    return f"{device}/{name}/{alias}"
+    fqdn_format = os.environ.get(FQDN_FORMAT_ENV) or FQDN_FORMAT
+    return fqdn_format.format(device=device, name=name, alias=alias)
+
+
+def getDeviceClient(
+        key: str,
+        device: str = SPFRX_DEVICE,
+        name: str = SPFRX_NAME,
+        timeout_ms: int = DEFAULT_TIMEOUT_MS,
+        ) -> PyTangoClientWrapper:
+    """
+    Retrieve a client for an SPFRx device from the process-wide proxy pool.
+    The connection is created on first use and reused by later calls.
+
+    :param key: Key of the device alias in SPFRX_DEVICE_LIST (eg. "ctrl")
+    :param device: Device string, defaults to SPFRX_DEVICE
+    :param name: Name string, defaults to SPFRX_NAME
+    :param timeout_ms: Client timeout in milliseconds
+    :returns: A connected PyTangoClientWrapper
+    """
+    return get_proxy_pool().get(
+        getFqdn(SPFRX_DEVICE_LIST[key], device, name),
+        timeout_ms
+    )
 
 
 def validateBand(
@@ -262,11 +471,7 @@ def getConfiguredAtten(
     :returns: A tuple containing attenuation values [POL_H,POL_V]
     """
 
-    spfrx_ctrl = PyTangoClientWrapper()
-    spfrx_ctrl.create_tango_client(
-        getFqdn(SPFRX_DEVICE_LIST["ctrl"], device, name)
-    )
-    spfrx_ctrl.set_timeout_millis(5000)
+    spfrx_ctrl = getDeviceClient("ctrl", device, name)
 
     if validateBand(band):
         try:
@@ -276,10 +481,9 @@ def getConfiguredAtten(
                     f"b{band}pol{POLS[POL_V]}Attenuation",
                 ]
             )
-            if atts is not None:
-                return (atts[POL_H].value, atts[POL_V].value)
-        except Exception as e:
-            print(e)
+            return (atts[POL_H].value, atts[POL_V].value)
+        except TangoClientError as e:
+            logger_.error(f"Unable to read band {band} attenuation: {e}")
     return (0.0, 0.0)
 
 
@@ -296,84 +500,193 @@ def getConfiguredBand(
               Returns 0 on error.
     """
 
-    spfrx_ctrl = PyTangoClientWrapper()
-    spfrx_ctrl.create_tango_client(
-        getFqdn(SPFRX_DEVICE_LIST["ctrl"], device, name)
-    )
-    spfrx_ctrl.set_timeout_millis(5000)
+    spfrx_ctrl = getDeviceClient("ctrl", device, name)
 
     try:
         value = spfrx_ctrl.read_attribute("configuredBand")
         return int(value)
-    except Exception as e:
-        print(e)
+    except TangoClientError as e:
+        logger_.error(f"Unable to read the configured band: {e}")
         return 0
 
 
+def setStandbyMode(
+        spfrx_ctrl: PyTangoClientWrapper,
+        timeout_s: float = DEFAULT_TRANSITION_TIMEOUT_S
+        ) -> TransitionResult:
+    """
+    Put the SPFRx into standby mode and wait for the controller to report
+    STANDBY, instead of sleeping for a fixed time.
+
+    :param spfrx_ctrl: Client of the SPFRx controller
+    :param timeout_s: Upper bound on the wait in seconds
+    :returns: The TransitionResult of the wait
+    """
+    spfrx_ctrl.command_read_write("SetStandbyMode")
+    standby = wait_for_attribute(
+        spfrx_ctrl.dp, "operatingMode", OPERATING_MODE_STANDBY, timeout_s,
+        device=spfrx_ctrl.dev_name
+    )
+    if standby:
+        logger_.info(f"  Reached STANDBY after {standby.elapsed_s:.3f} s")
+    else:
+        logger_.warning(
+            f"  STANDBY not reported within {timeout_s} s "
+            f"(operatingMode={standby.value})"
+        )
+    return standby
+
+
 def configureBand(
         band: int, synchronize: bool,
         device: str = SPFRX_DEVICE,
-        name: str = SPFRX_NAME
+        name: str = SPFRX_NAME,
+        timeout_s: float = DEFAULT_TRANSITION_TIMEOUT_S,
+        timings: dict = None
         ) -> bool:
     """
     Attempts to configure the specified band ID in the SPFRx
 
+    Each transition is detected as soon as the controller reports it
+    (see transition_wait), bounded by timeout_s.
+
     :param band: The integer band ID to be configured (value will be validated)
     :param synchronize: Specify True to synchronize.
     :param device: Optional - TANGO FQDN Device (defaults to SPFRX_DEVICE)
     :param name: Optional - TANGO FQDN Name (defaults to SPFRX_NAME)
+    :param timeout_s: Optional - Upper bound in seconds on each transition
+    :param timings: Optional - dict filled with the duration in seconds of
+                    each phase: "standby", "configure_cmd", "data_capture",
+                    "band_readback" and "total"
     :returns: True on success.
     """
 
+    if timings is None:
+        timings = {}
+
     if validateBand(band):
 
-        currentBand = getConfiguredBand()
+        currentBand = getConfiguredBand(device, name)
 
-        spfrx_ctrl = PyTangoClientWrapper()
-        spfrx_ctrl.create_tango_client(
-            getFqdn(SPFRX_DEVICE_LIST["ctrl"], device, name)
-            )
-        spfrx_ctrl.set_timeout_millis(5000)
+        spfrx_ctrl = getDeviceClient("ctrl", device, name)
 
         try:
-            spfrx_ctrl.command_read_write("SetStandbyMode")
-            time.sleep(3)
+            start = time.perf_counter()
+            standby = setStandbyMode(spfrx_ctrl, timeout_s)
+            timings["standby"] = standby.elapsed_s
+            if not standby:
+                # DATA_CAPTURE could otherwise be matched on the mode the
+                # controller was already in
+                print(f"  Unable to configure band {band}: STANDBY not "
+                      "reached")
+                return False
 
             print(f"Configuring band {band}")
+            t0 = time.perf_counter()
             spfrx_ctrl.command_read_write(f"ConfigureBand{band}", synchronize)
-            time.sleep(10)
-            operating_mode = spfrx_ctrl.read_attribute("operatingMode")
+            timings["configure_cmd"] = time.perf_counter() - t0
+
+            capture = wait_for_attribute(
+                spfrx_ctrl.dp,
+                "operatingMode",
+                OPERATING_MODE_DATA_CAPTURE,
+                timeout_s,
+                device=spfrx_ctrl.dev_name
+            )
+            timings["data_capture"] = capture.elapsed_s
+            operating_mode = capture.value
 
-            if operating_mode != 4:
-                tango.Except.throw_exception(
-                    "OPERATING_MODE_INCORRECT",
+            if operating_mode != OPERATING_MODE_DATA_CAPTURE:
+                logger_.error(
                     "Expected operating mode to be DATA_CAPTURE\n"
-                    + f"Query returned (enum): {operating_mode}",
-                    f"configureBand({band},{synchronize}",
+                    + f"Query returned (enum): {operating_mode}"
                 )
+                return False
+            print(
+                f"  Reached DATA_CAPTURE after {capture.elapsed_s:.3f} s "
+                f"({capture.method})"
+            )
 
-            currentBand = int(spfrx_ctrl.read_attribute("configuredBand"))
+            readback = wait_for_attribute(
+                spfrx_ctrl.dp,
+                "configuredBand",
+                lambda v: v is not None and int(v) == band,
+                timeout_s,
+                device=spfrx_ctrl.dev_name
+            )
+            timings["band_readback"] = readback.elapsed_s
+            timings["total"] = time.perf_counter() - start
+            currentBand = int(readback.value or 0)
 
             if band != currentBand:
                 print(f"  Unable to configure band {band}")
                 return False
 
-            print(f"  Successfully configured band {band}")
-            a = getConfiguredAtten(band)
+            print(
+                f"  Successfully configured band {band} "
+                f"in {timings['total']:.3f} s"
+            )
+            a = getConfiguredAtten(band, device, name)
             print(f"  Configured attenuation : H:{a[POL_H]} V:{a[POL_V]}")
             return True
 
-        except tango.DevFailed:
-            tango.Except.throw_exception(
-                "UNABLE_TO_CONFIGURE_BAND",
-                f"Unable to configure band {band}",
-                f"configureBand({band},{synchronize}",
-            )
+        except TangoClientError as e:
+            logger_.error(f"Unable to configure band {band}: {e}")
+            return False
 
     else:
         return False
 
 
+def profileBandSwitches(
+        bands: list,
+        cycles: int = DEFAULT_PROFILE_CYCLES,
+        synchronize: bool = False,
+        device: str = SPFRX_DEVICE,
+        name: str = SPFRX_NAME,
+        timeout_s: float = DEFAULT_TRANSITION_TIMEOUT_S,
+        history_path: str = None
+        ) -> list:
+    """
+    Repeatedly switch between bands and append the duration of each phase
+    of every switch (see configureBand) to the band switch history
+
+    :param bands: The band IDs to switch to in turn (values will be validated)
+    :param cycles: Optional - Number of passes through bands
+    :param synchronize: Optional - Specify True to synchronize.
+    :param device: Optional - TANGO FQDN Device (defaults to SPFRX_DEVICE)
+    :param name: Optional - TANGO FQDN Name (defaults to SPFRX_NAME)
+    :param timeout_s: Optional - Upper bound in seconds on each transition
+    :param history_path: Optional - JSON lines history file (defaults to
+                         band_profile.default_history_path())
+    :returns: The history records of the switches, empty if a band is
+              not valid
+    """
+
+    if not bands or not all(validateBand(band) for band in bands):
+        return []
+    if history_path is None:
+        history_path = default_history_path()
+
+    dish = f"{device}/{name}"
+    records = []
+    fromBand = getConfiguredBand(device, name)
+    for cycle in range(cycles):
+        for band in bands:
+            timings = {}
+            ok = configureBand(
+                int(band), synchronize, device, name, timeout_s, timings
+            )
+            record = switch_record(
+                dish, fromBand, int(band), synchronize, ok, timings
+            )
+            # Written per switch, so an interrupted run keeps its data
+            append_history(history_path, [record])
+            records.append(record)
+            fromBand = int(band) if ok else getConfiguredBand(device, name)
+    return records
+
+
 def configureAtten(
         band: int,
         pol: int,
@@ -394,11 +707,7 @@ def configureAtten(
 
     if validateBand(band) and validateAtten(atten) and (pol == 0 or pol == 1):
 
-        spfrx_ctrl = PyTangoClientWrapper()
-        spfrx_ctrl.create_tango_client(
-            getFqdn(SPFRX_DEVICE_LIST["ctrl"], device, name)
-        )
-        spfrx_ctrl.set_timeout_millis(5000)
+        spfrx_ctrl = getDeviceClient("ctrl", device, name)
 
         print(f"Setting band {band} pol {POLS[pol]} attenuator value: {atten}")
         try:
@@ -418,15 +727,172 @@ def configureAtten(
                     f"pol {POLS[pol]} attenuator."
                 )
 
-        except tango.DevFailed:
-            tango.Except.throw_exception(
-                "UNABLE_TO_CONFIGURE_ATTENUATOR",
-                f"configAtten({band},{POLS[pol]},{atten}",
+        except TangoClientError as e:
+            logger_.error(
+                f"Unable to configure band {band} pol {POLS[pol]} "
+                f"attenuator: {e}"
             )
 
     return False
 
 
+def getAttenProfile(
+        bands: list = None,
+        device: str = SPFRX_DEVICE,
+        name: str = SPFRX_NAME
+        ) -> dict:
+    """
+    Retrieve the attenuation of several bands, both polarizations, with a
+    single read
+
+    :param bands: Optional - Band IDs to read (defaults to all bands)
+    :param device: Optional - TANGO FQDN Device (defaults to SPFRX_DEVICE)
+    :param name: Optional - TANGO FQDN Name (defaults to SPFRX_NAME)
+    :returns: An attenuation profile (see atten_profile), None on error
+    """
+
+    if bands is None:
+        bands = range(MIN_BAND, MAX_BAND + 1)
+    if not all(validateBand(band) for band in bands):
+        return None
+
+    spfrx_ctrl = getDeviceClient("ctrl", device, name)
+    return read_atten_profile(spfrx_ctrl, bands)
+
+
+def configureAttenProfile(
+        profile: dict,
+        device: str = SPFRX_DEVICE,
+        name: str = SPFRX_NAME
+        ) -> bool:
+    """
+    Configure any subset of the band/polarization attenuator matrix with
+    one write and verify it with one read
+
+    :param profile: An attenuation profile (see atten_profile)
+    :param device: Optional - TANGO FQDN Device (defaults to SPFRX_DEVICE)
+    :param name: Optional - TANGO FQDN Name (defaults to SPFRX_NAME)
+    :returns: True on success.
+    """
+
+    try:
+        profile = normalize_atten_profile(profile)
+    except ValueError as e:
+        logger_.error(f"Invalid attenuation profile: {e}")
+        return False
+    for band, pol, atten in profile_items(profile):
+        if not (validateBand(band) and validateAtten(atten)) or \
+                pol not in POLS:
+            return False
+
+    spfrx_ctrl = getDeviceClient("ctrl", device, name)
+
+    try:
+        write_atten_profile(spfrx_ctrl, profile)
+        ok, readback = verify_atten_profile(spfrx_ctrl, profile)
+        for band, pol, atten in profile_items(readback):
+            print(f"  Band {band} pol {pol} atten : {atten}")
+        if not ok:
+            print("  Unable to configure attenuation profile.")
+        return ok
+
+    except TangoClientError as e:
+        logger_.error(f"Unable to configure attenuation profile: {e}")
+    return False
+
+
+def autoLevelAttenuation(
+        target_db: float,
+        bands: list = None,
+        tolerance_db: float = DEFAULT_TOLERANCE_DB,
+        channels: tuple = DEFAULT_CHANNELS,
+        synchronize: bool = False,
+        device: str = SPFRX_DEVICE,
+        name: str = SPFRX_NAME,
+        timeout_s: float = DEFAULT_TRANSITION_TIMEOUT_S
+        ) -> list:
+    """
+    Level the attenuation of both polarizations of each band on the
+    in-band power of the gated spectrometer (see autolevel). Each band is
+    configured in turn and the band configured beforehand is restored at
+    the end. The spectrometer bridge and enable state cannot be read back,
+    so the spectrometer is disabled at the end and its bridge is left on
+    LW. A polarization that does not converge keeps its initial
+    attenuation.
+
+    :param target_db: In-band spectrometer power to reach, in dB
+    :param bands: Optional - Band IDs to level (defaults to all bands)
+    :param tolerance_db: Optional - Accepted distance from target_db
+    :param channels: Optional - First and last + 1 spectrometer channels
+                     to average over
+    :param synchronize: Optional - Specify True to synchronize when
+                        configuring a band.
+    :param device: Optional - TANGO FQDN Device (defaults to SPFRX_DEVICE)
+    :param name: Optional - TANGO FQDN Name (defaults to SPFRX_NAME)
+    :param timeout_s: Optional - Upper bound in seconds on each transition
+    :returns: The LevelResult of each band, None if a band is not valid
+    """
+
+    if bands is None:
+        bands = range(MIN_BAND, MAX_BAND + 1)
+    if not all(validateBand(band) for band in bands):
+        return None
+
+    initialBand = getConfiguredBand(device, name)
+    spfrx_ctrl = getDeviceClient("ctrl", device, name)
+    spfrx_pktcap = getDeviceClient("pktcap", device, name)
+
+    results = []
+    start = time.perf_counter()
+    try:
+        for band in bands:
+            band = int(band)
+            result = LevelResult(band)
+            results.append(result)
+            if getConfiguredBand(device, name) != band and not \
+                    configureBand(band, synchronize, device, name, timeout_s):
+                print(f"  Unable to level band {band}: band not configured")
+                continue
+            try:
+                spfrx_pktcap.command_read_write("spectrometer_set_bridge", 1)
+                spfrx_ctrl.command_read_write("SpectrometerCtrl", 1)
+                result = level_band(
+                    spfrx_ctrl, spfrx_pktcap, band, target_db, tolerance_db,
+                    channels
+                )
+                results[-1] = result
+            except TangoClientError as e:
+                logger_.error(f"Unable to level band {band}: {e}")
+                continue
+            for pol in POLS:
+                kept = "" if result.converged[pol] else ", initial kept"
+                print(
+                    f"  Band {band} pol {pol} atten : {result.atten[pol]} "
+                    f"power : {result.power_db[pol]:.2f} dB "
+                    f"({result.reason[pol]}{kept})"
+                )
+            print(
+                f"  Band {band} leveled in {result.iterations} iterations, "
+                f"{result.elapsed_s:.3f} s"
+            )
+        print(
+            f"  Leveled {sum(bool(r) for r in results)}/{len(results)} "
+            f"bands in {time.perf_counter() - start:.3f} s"
+        )
+    finally:
+        if MIN_BAND <= initialBand <= MAX_BAND and \
+                getConfiguredBand(device, name) != initialBand:
+            print(f"Restoring band {initialBand}")
+            configureBand(initialBand, synchronize, device, name, timeout_s)
+        # The bridge selection is not readable, so it cannot be restored
+        try:
+            spfrx_ctrl.command_read_write("SpectrometerCtrl", False)
+            print("  Spectrometer disabled, bridge left on LW")
+        except TangoClientError as e:
+            logger_.error(f"Unable to disable the spectrometer: {e}")
+    return results
+
+
 def invertSpectralSense(
         band: int,
         sense: bool = True,
@@ -442,26 +908,17 @@ def invertSpectralSense(
     :returns: True on success.
     """
 
-    spfrx_bp = PyTangoClientWrapper()
     if (band == 1) or (band ==2):
-        spfrx_bp.create_tango_client(
-            getFqdn(SPFRX_DEVICE_LIST["bp12"], device, name)
-        )
+        spfrx_bp = getDeviceClient("bp12", device, name)
     if (band == 3):
-        spfrx_bp.create_tango_client(
-            getFqdn(SPFRX_DEVICE_LIST["bp3"], device, name)
-        )
+        spfrx_bp = getDeviceClient("bp3", device, name)
 
-    spfrx_bp.set_timeout_millis(5000)
     attr = "spec_inv"
 
     try:
         spfrx_bp.write_attribute(attr, int(sense))
-    except tango.DevFailed:
-        tango.Except.throw_exception(
-            f"UNABLE TO WRITE TO {attr} on band {band}",
-            f"invertSpectralSense({band}, {sense})",
-        )
+    except TangoClientError as e:
+        logger_.error(f"Unable to write to {attr} on band {band}: {e}")
         return False
 
     return True
@@ -482,23 +939,70 @@ def enableNoiseDiode(
     :returns: True on success.
     """
 
-    spfrx_ctrl = PyTangoClientWrapper()
-    spfrx_ctrl.create_tango_client(
-        getFqdn(SPFRX_DEVICE_LIST["ctrl"], device, name)
-    )
-    spfrx_ctrl.set_timeout_millis(5000)
+    spfrx_ctrl = getDeviceClient("ctrl", device, name)
 
     try:
         spfrx_ctrl.command_read_write("SetNoiseDiodeState", enable)
         return True
-    except tango.DevFailed:
-        tango.Except.throw_exception(
-            "UNABLE TO EXECUTE COMMAND on controller",
-            f"SetNoiseDiodeState({enable})",
-        )
+    except TangoClientError as e:
+        logger_.error(f"Unable to execute SetNoiseDiodeState: {e}")
         return False
 
 
+def readNoiseDiodeConfig(
+        device: str = SPFRX_DEVICE,
+        name: str = SPFRX_NAME
+        ) -> dict:
+    """
+    Retrieve the noise diode control parameters with a single read
+
+    :param device: Optional - TANGO FQDN Device (defaults to SPFRX_DEVICE)
+    :param name: Optional - TANGO FQDN Name (defaults to SPFRX_NAME)
+    :returns: A dict with "state", "mode", "periodic" and "pseudoRandom"
+              entries
+    :raises TangoClientError: If the attributes could not be read
+    """
+
+    spfrx_ctrl = getDeviceClient("ctrl", device, name)
+
+    atts = spfrx_ctrl.read_attributes(
+        [
+            "noiseDiodeState",
+            "noiseDiodeMode",
+            "periodicNoiseDiodePars",
+            "pseudoRandomNoiseDiodePars"
+        ]
+    )
+    return {
+        "state": int(atts[0].value),
+        "mode": int(atts[1].value),
+        "periodic": list(atts[2].value),
+        "pseudoRandom": list(atts[3].value),
+    }
+
+
+def formatNoiseDiodeConfig(
+        nd: dict
+        ) -> str:
+    """
+    Describe the parameters of the active noise diode mode
+
+    :param nd: A dict as returned by readNoiseDiodeConfig
+    :returns: A printable description
+    """
+    if nd["mode"] == 1:
+        config = f" Period : {nd['periodic'][0]}\n"
+        config += f" Duty Cycle : {nd['periodic'][1]}\n"
+        config += f" Phase Shift : {nd['periodic'][2]}"
+    elif nd["mode"] == 2:
+        config = f" Binary Polynomial : {nd['pseudoRandom'][0]}\n"
+        config += f" Seed : {nd['pseudoRandom'][1]}\n"
+        config += f" Dwell : {nd['pseudoRandom'][2]}"
+    else:
+        config = "N/A"
+    return config
+
+
 def getNoiseDiodeConfig(
         device: str = SPFRX_DEVICE,
         name: str = SPFRX_NAME
@@ -510,51 +1014,25 @@ def getNoiseDiodeConfig(
     :param name: Optional - TANGO FQDN Name (defaults to SPFRX_NAME)
     """
 
-    spfrx_ctrl = PyTangoClientWrapper()
-    spfrx_ctrl.create_tango_client(
-        getFqdn(SPFRX_DEVICE_LIST["ctrl"], device, name)
-    )
-    spfrx_ctrl.set_timeout_millis(5000)
-
     try:
-        atts = spfrx_ctrl.read_attributes(
-            [
-                "noiseDiodeState",
-                "noiseDiodeMode",
-                "periodicNoiseDiodePars",
-                "pseudoRandomNoiseDiodePars"
-            ]
+        nd = readNoiseDiodeConfig(device, name)
+        logger_.info(
+            "Noise Diode configuration:\n"
+            f" Mode : {ND_MODE[nd['mode']]}\n"
+            f" State : {ND_STATE[nd['state']]}\n"
+            f" Config : {formatNoiseDiodeConfig(nd)}"
         )
-        if atts is not None:
-            if atts[1].value == 1:
-                config = f" Period : {atts[2][0]}\n"
-                config += f" Duty Cycle : {atts[2][1]}\n"
-                config += f" Phase Shift : {atts[2][2]}"
-            elif atts[1].value == 2:
-                config = f" Binary Polynomial : {atts[3][0]}\n"
-                config += f" Seed : {atts[3][1]}\n"
-                config += f" Dwell : {atts[3][2]}"
-            else:
-                config = "N/A"
-            logger_.info(
-                "Noise Diode configuration:\n"
-                f" Mode : {ND_MODE[atts[1].value]}\n"
-                f" State : {ND_STATE[atts[0].value]}\n"
-                f" Config : {config}"
-            )
 
-    except tango.DevFailed:
-        tango.Except.throw_exception(
-            "UNABLE TO RETRIEVE ATTRIBUTE VALUES"
-        )
-        return False
+    except TangoClientError as e:
+        logger_.error(f"Unable to retrieve noise diode configuration: {e}")
 
 
 def configureNoiseDiode(
         values: list[int],
         attr: str,
         device: str = SPFRX_DEVICE,
-        name: str = SPFRX_NAME
+        name: str = SPFRX_NAME,
+        timeout_s: float = DEFAULT_TRANSITION_TIMEOUT_S
         ) -> bool:
     """
     Configure the noise diode parameters after setting the
@@ -566,49 +1044,50 @@ def configureNoiseDiode(
                 (Must be either 'periodic' or 'pseudoRandom')
     :param device: Optional - TANGO FQDN Device (defaults to SPFRX_DEVICE)
     :param name: Optional - TANGO FQDN Name (defaults to SPFRX_NAME)
+    :param timeout_s: Optional - Upper bound in seconds on the wait for
+                      standby mode
     :returns: True on success.
     """
 
-    spfrx_ctrl = PyTangoClientWrapper()
-    spfrx_ctrl.create_tango_client(
-        getFqdn(SPFRX_DEVICE_LIST["ctrl"], device, name)
-    )
-    spfrx_ctrl.set_timeout_millis(5000)
+    spfrx_ctrl = getDeviceClient("ctrl", device, name)
 
     try:
         logger_.info("Setting SPFRx into STANDBY mode")
-        spfrx_ctrl.command_read_write("SetStandbyMode")
-        time.sleep(3)
+        if not setStandbyMode(spfrx_ctrl, timeout_s):
+            # The parameters are only accepted in standby
+            print(f"  Unable to configure {attr} noise diode: STANDBY not "
+                  f"reached")
+            return False
 
         spfrx_ctrl.write_attribute(
             f"{attr}NoiseDiodePars",
             values
             )
-    except tango.DevFailed:
-        tango.Except.throw_exception(
-            f"UNABLE TO WRITE TO {attr}NoiseDiodePars on controller",
-            f"configureNoiseDiode({values},{attr},{device},{name})",
-        )
+        return True
+    except TangoClientError as e:
+        logger_.error(f"Unable to write to {attr}NoiseDiodePars: {e}")
         return False
 
 
 def configureNoiseDiodePeriodic(
         values: list[int],
         device: str = SPFRX_DEVICE,
-        name: str = SPFRX_NAME
+        name: str = SPFRX_NAME,
+        timeout_s: float = DEFAULT_TRANSITION_TIMEOUT_S
         ) -> bool:
     return configureNoiseDiode(
-        values, "periodicNoiseDiodePars", device, name
+        values, "periodic", device, name, timeout_s
     )
 
 
 def configureNoiseDiodePseudoRandom(
         values: list[int],
         device: str = SPFRX_DEVICE,
-        name: str = SPFRX_NAME
+        name: str = SPFRX_NAME,
+        timeout_s: float = DEFAULT_TRANSITION_TIMEOUT_S
         ) -> bool:
     return configureNoiseDiode(
-        values, "pseudoRandomNoiseDiodePars", device, name
+        values, "pseudoRandom", device, name, timeout_s
     )
 
 
@@ -626,20 +1105,13 @@ def enableSpectrometer(
     :returns: True on success.
     """
 
-    spfrx_ctrl = PyTangoClientWrapper()
-    spfrx_ctrl.create_tango_client(
-        getFqdn(SPFRX_DEVICE_LIST["ctrl"], device, name)
-    )
-    spfrx_ctrl.set_timeout_millis(5000)
+    spfrx_ctrl = getDeviceClient("ctrl", device, name)
 
     try:
         spfrx_ctrl.command_read_write("SpectrometerCtrl", enable)
         return True
-    except tango.DevFailed:
-        tango.Except.throw_exception(
-            "UNABLE TO EXECUTE COMMAND on controller",
-            f"SpectrometerCtrl({enable})",
-        )
+    except TangoClientError as e:
+        logger_.error(f"Unable to execute SpectrometerCtrl: {e}")
         return False
 
 
@@ -657,64 +1129,617 @@ def setSpectrometerBridge(
     :returns: True on success.
     """
 
-    spfrx_pktcap = PyTangoClientWrapper()
-    spfrx_pktcap.create_tango_client(
-        getFqdn(SPFRX_DEVICE_LIST["pktcap"], device, name)
-    )
-    spfrx_pktcap.set_timeout_millis(5000)
+    spfrx_pktcap = getDeviceClient("pktcap", device, name)
 
     try:
         spfrx_pktcap.command_read_write("spectrometer_set_bridge", bridge)
         return True
-    except tango.DevFailed:
-        tango.Except.throw_exception(
-            "UNABLE TO EXECUTE COMMAND on controller",
-            f"spectrometer_set_bridge({bridge})",
-        )
+    except TangoClientError as e:
+        logger_.error(f"Unable to execute spectrometer_set_bridge: {e}")
         return False
 
 
-if __name__ == "__main__":
-    logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
-    logger_ = logging.getLogger("spfrx-talondx.py")
-    logger_.info(f"User: {getpass.getuser()}")
-    parser = argparse.ArgumentParser(description="MID DISH SPFRx Console Ops.")
-    parser.add_argument(
-        "-v",
-        "--version",
-        action="store_true",
-        help="Print version information for this module.",
-    )
-    parser.add_argument(
-        "-sync",
-        "--synchronize_on_band_config",
-        action="store_true",
-        help="Specify sychronization when configuring band. " +
-             "Default is FALSE." +
-             "Only applicable when configuring a band."
-    )
-    parser.add_argument(
-        "-d",
-        "--device",
-        type=str,
-        metavar="DEVICE",
-        default=SPFRX_DEVICE,
-        help=f"Override the default FQDN device (default is {SPFRX_DEVICE})."
-    )
-    parser.add_argument(
-        "-n",
-        "--name",
-        type=str,
-        metavar="NAME",
-        default=SPFRX_NAME,
-        help=f"Override the default FQDN name (default is {SPFRX_NAME})."
-    )
-    spfrx_action = parser.add_mutually_exclusive_group()
-    spfrx_action.add_argument(
-        "-vall",
-        "--version_tango_all",
-        action="store_true",
-        help="Print TANGO version information for all device servers.",
+def validateDesiredState(
+        desired: dict
+        ) -> bool:
+    """
+    Validate a desired receiver state (see reconcile) without touching a
+    device.
+
+    :param desired: The desired state dict
+    :returns: A boolean True if valid
+    """
+    if not isinstance(desired, dict):
+        logger_.error("The desired state must be a JSON object")
+        return False
+    unknown = [key for key in desired if key not in STATE_KEYS]
+    if unknown:
+        logger_.error(f"Unknown desired state entries: {', '.join(unknown)}")
+        return False
+    nd = desired.get("noise_diode", {})
+    spectrometer = desired.get("spectrometer", {})
+    try:
+        if "band" in desired and not validateBand(desired["band"]):
+            return False
+        attenuation = normalize_atten_profile(desired.get("attenuation", {}))
+        for band, pols in attenuation.items():
+            if not validateBand(int(band)):
+                return False
+            if not all(validateAtten(a) for a in pols.values()):
+                return False
+        for band in desired.get("spectral_inversion", {}):
+            if not validateBand(int(band)):
+                return False
+        unknown = [key for key in nd if key not in ND_KEYS] + \
+            [key for key in spectrometer if key not in SPECTROMETER_ATTRS]
+        if unknown:
+            raise ValueError(f"unknown entries {', '.join(unknown)}")
+        for kind in ND_PARS:
+            if kind in nd and len(nd[kind]) != ND_PARS_LENGTH:
+                raise ValueError(
+                    f"noise_diode {kind} needs {ND_PARS_LENGTH} values"
+                )
+    except (TypeError, ValueError) as e:
+        logger_.error(f"Invalid desired state: {e}")
+        return False
+    return True
+
+
+def reconcileReceiver(
+        desired: dict,
+        device: str = SPFRX_DEVICE,
+        name: str = SPFRX_NAME,
+        dry_run: bool = False,
+        timeout_s: float = DEFAULT_TRANSITION_TIMEOUT_S
+        ) -> bool:
+    """
+    Bring the SPFRx receiver to the desired state, issuing only the
+    commands and writes needed to get there (see reconcile).
+
+    :param desired: The desired state dict
+    :param device: Optional - TANGO FQDN Device (defaults to SPFRX_DEVICE)
+    :param name: Optional - TANGO FQDN Name (defaults to SPFRX_NAME)
+    :param dry_run: Optional - Only display the steps if True
+    :param timeout_s: Optional - Upper bound in seconds on each transition
+    :returns: True on success.
+    """
+
+    if not validateDesiredState(desired):
+        return False
+
+    spfrx_ctrl = getDeviceClient("ctrl", device, name)
+    bp_clients = {
+        int(band): getDeviceClient(
+            "bp3" if int(band) == 3 else "bp12", device, name
+        )
+        for band in desired.get("spectral_inversion", {})
+    }
+    spfrx_pktcap = None
+    if "spectrometer_bridge" in desired or "spectrometer" in desired:
+        spfrx_pktcap = getDeviceClient("pktcap", device, name)
+
+    try:
+        live = read_live_state(spfrx_ctrl, bp_clients, desired, spfrx_pktcap)
+        steps = plan_reconcile(
+            desired, live, spfrx_ctrl, bp_clients, spfrx_pktcap, timeout_s
+        )
+        if not steps:
+            logger_.info("SPFRx already in the desired state")
+            return True
+        logger_.info(
+            f"{'Planned' if dry_run else 'Applying'} {len(steps)} steps:"
+        )
+        if dry_run:
+            for step in steps:
+                logger_.info(f"  {step.description}")
+            return True
+        apply_plan(steps, logger_.info)
+        return True
+    except ReconcileError as e:
+        logger_.warning(f"Reconcile FAILED: {e}")
+    except TangoClientError as e:
+        logger_.error(f"Unable to reconcile the SPFRx receiver state: {e}")
+    return False
+
+
+def snapshotReceiver(
+        path: str,
+        device: str = SPFRX_DEVICE,
+        name: str = SPFRX_NAME
+        ) -> bool:
+    """
+    Save the whole receiver configuration (band, attenuation, spectral
+    inversion, noise diode and spectrometer settings) to a versioned JSON
+    snapshot (see snapshot)
+
+    :param path: Path of the snapshot file to write
+    :param device: Optional - TANGO FQDN Device (defaults to SPFRX_DEVICE)
+    :param name: Optional - TANGO FQDN Name (defaults to SPFRX_NAME)
+    :returns: True if every setting was read.
+    """
+
+    bands = range(MIN_BAND, MAX_BAND + 1)
+    spfrx_ctrl = getDeviceClient("ctrl", device, name)
+    bp_clients = {
+        band: getDeviceClient("bp3" if band == 3 else "bp12", device, name)
+        for band in bands
+    }
+    spfrx_pktcap = getDeviceClient("pktcap", device, name)
+
+    try:
+        start = time.perf_counter()
+        live = read_live_state(
+            spfrx_ctrl, bp_clients, snapshot_template(bands), spfrx_pktcap
+        )
+        elapsed = time.perf_counter() - start
+    except TangoClientError as e:
+        logger_.error(f"Unable to read the SPFRx receiver state: {e}")
+        return False
+
+    state, unreadable = state_from_live(live, bands)
+    save_snapshot(path, make_snapshot(f"{device}/{name}", state, unreadable))
+    print(f"  Read receiver state in {elapsed * 1e3:.1f} ms")
+    for setting in unreadable:
+        print(f"  Unable to read {setting}; not part of the snapshot")
+    return not unreadable
+
+
+def restoreReceiver(
+        path: str,
+        device: str = SPFRX_DEVICE,
+        name: str = SPFRX_NAME,
+        dry_run: bool = False,
+        timeout_s: float = DEFAULT_TRANSITION_TIMEOUT_S
+        ) -> bool:
+    """
+    Restore a snapshot saved by snapshotReceiver, changing only the
+    settings that differ from it (see reconcileReceiver)
+
+    :param path: Path of the snapshot file
+    :param device: Optional - TANGO FQDN Device (defaults to SPFRX_DEVICE)
+    :param name: Optional - TANGO FQDN Name (defaults to SPFRX_NAME)
+    :param dry_run: Optional - Only display the steps if True
+    :param timeout_s: Optional - Upper bound in seconds on each transition
+    :returns: True on success.
+    """
+
+    try:
+        snapshot = load_snapshot(path)
+    except (OSError, ValueError) as e:
+        logger_.error(f"Unable to load snapshot: {e}")
+        return False
+    if snapshot.get("dish") != f"{device}/{name}":
+        logger_.warning(
+            f"Snapshot of {snapshot.get('dish')} restored to {device}/{name}"
+        )
+    logger_.info(f"Restoring snapshot taken at {snapshot.get('time')}")
+    return reconcileReceiver(
+        snapshot["state"], device, name, dry_run, timeout_s
+    )
+
+
+def summarizeSweep(
+        results: list
+        ) -> tuple:
+    """
+    Reduce a device sweep to a single fleet summary.
+
+    :param results: A list of SweepResult
+    :returns: A (ok, summary) tuple
+    """
+    failed = [r.key for r in results if not r.ok]
+    summary = f"{len(results) - len(failed)}/{len(results)} devices OK"
+    if failed:
+        summary += f" (failed: {', '.join(failed)})"
+    return (not failed, summary)
+
+
+def fleetStatus(
+        device: str,
+        name: str,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        deadline_s: float = DEFAULT_DEADLINE_S
+        ) -> tuple:
+    """
+    Fleet action: state of every device of one dish.
+
+    :returns: A (ok, summary) tuple
+    """
+    results = sweep_devices(
+        getDeviceFqdns(device, name), probe_status, max_workers, deadline_s
+    )
+    ok, summary = summarizeSweep(results)
+    faulty = [
+        f"{r.key}={r.values['state']}" for r in results
+        if r.ok and r.values["state"] in ("FAULT", "ALARM", "UNKNOWN")
+    ]
+    if faulty:
+        summary += f" [{', '.join(faulty)}]"
+    return (ok and not faulty, summary)
+
+
+def fleetVersion(
+        device: str,
+        name: str,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        deadline_s: float = DEFAULT_DEADLINE_S
+        ) -> tuple:
+    """
+    Fleet action: version of every device of one dish.
+
+    :returns: A (ok, summary) tuple
+    """
+    results = sweep_devices(
+        getDeviceFqdns(device, name), probe_version, max_workers, deadline_s
+    )
+    ok, summary = summarizeSweep(results)
+    versions = sorted(
+        {str(r.values.get("dsVersionId")) for r in results if r.ok}
+    )
+    return (ok, f"{summary} versions: {', '.join(versions)}")
+
+
+def fleetBand(
+        device: str,
+        name: str
+        ) -> tuple:
+    """
+    Fleet action: currently configured band of one dish.
+
+    :returns: A (ok, summary) tuple
+    """
+    band = getConfiguredBand(device, name)
+    return (band != 0, f"BAND {band}")
+
+
+def fleetAtten(
+        band: int,
+        device: str,
+        name: str
+        ) -> tuple:
+    """
+    Fleet action: attenuation of one band of one dish.
+
+    :returns: A (ok, summary) tuple
+    """
+    if not validateBand(band):
+        return (False, f"BAND {band} is not a valid band")
+    # Read directly rather than with getConfiguredAtten, which reports an
+    # unreadable attenuator as 0.0 dB; a read error fails the dish
+    atts = getDeviceClient("ctrl", device, name).read_attributes(
+        [
+            f"b{band}pol{POLS[POL_H]}Attenuation",
+            f"b{band}pol{POLS[POL_V]}Attenuation",
+        ]
+    )
+    failed = [attr.name for attr in atts if attr.has_failed]
+    if failed:
+        return (False, f"BAND {band} unable to read {', '.join(failed)}")
+    return (
+        True,
+        f"BAND {band} POL_H : {atts[POL_H].value}  "
+        f"POL_V : {atts[POL_V].value}"
+    )
+
+
+def fleetNoiseDiode(
+        device: str,
+        name: str
+        ) -> tuple:
+    """
+    Fleet action: noise diode configuration of one dish.
+
+    :returns: A (ok, summary) tuple
+    """
+    nd = readNoiseDiodeConfig(device, name)
+    config = " ".join(formatNoiseDiodeConfig(nd).split())
+    return (
+        True,
+        f"Mode {ND_MODE[nd['mode']]} State {ND_STATE[nd['state']]} "
+        f"Config {config}"
+    )
+
+
+def fleetBandProfile(
+        bands: list,
+        cycles: int,
+        synchronize: bool,
+        timeout_s: float,
+        history_path: str,
+        device: str,
+        name: str
+        ) -> tuple:
+    """
+    Fleet action: band switch profile of one dish.
+
+    :returns: A (ok, summary) tuple
+    """
+    records = profileBandSwitches(
+        bands, cycles, synchronize, device, name, timeout_s, history_path
+    )
+    totals = sorted(r["total"] for r in records if r["ok"] and "total" in r)
+    summary = f"{len(totals)}/{len(records)} switches OK"
+    if totals:
+        summary += (
+            f" total p50 {percentile(totals, 50) * 1e3:.1f} ms"
+            f" p90 {percentile(totals, 90) * 1e3:.1f} ms"
+            f" max {totals[-1] * 1e3:.1f} ms"
+        )
+    return (bool(records) and len(totals) == len(records), summary)
+
+
+def runFleetMode(
+        args: argparse.Namespace
+        ) -> bool:
+    """
+    Run the requested console action against every dish selected by the
+    --fleet and --fleet_boardmap_dir options, and display one result
+    line per dish.
+
+    :param args: The parsed command line arguments
+    :returns: True if the action succeeded on every dish
+    """
+    if args.status_tango_all:
+        action = partial(
+            fleetStatus,
+            max_workers=args.sweep_workers,
+            deadline_s=args.sweep_deadline
+        )
+    elif args.version_tango_all:
+        action = partial(
+            fleetVersion,
+            max_workers=args.sweep_workers,
+            deadline_s=args.sweep_deadline
+        )
+    elif args.verify_band:
+        action = fleetBand
+    elif args.verify_atten is not None:
+        if not validateBand(args.verify_atten):
+            return False
+        action = partial(fleetAtten, int(args.verify_atten))
+    elif args.noise_diode_current_config:
+        action = fleetNoiseDiode
+    elif args.band_profile is not None:
+        action = partial(
+            fleetBandProfile,
+            args.band_profile,
+            args.profile_cycles,
+            args.synchronize_on_band_config,
+            args.transition_timeout,
+            args.profile_history
+        )
+    else:
+        logger_.warning(
+            "Fleet mode supports -status, -vall, -vb, -va, -ndc and "
+            "-bprof only"
+        )
+        return False
+
+    dishes = resolve_dishes(args.fleet, args.fleet_boardmap_dir, args.name)
+    if not dishes:
+        logger_.warning("No dishes matched the fleet selection")
+        return False
+    logger_.info(f"Running fleet action on {len(dishes)} dishes")
+
+    results = run_fleet(dishes, action, args.name, args.fleet_workers)
+    for line in format_fleet_table(results):
+        logger_.info(line)
+    return all(r.ok for r in results)
+
+
+def buildParser() -> argparse.ArgumentParser:
+    """
+    Build the console command line parser.
+
+    :returns: The argparse parser for the console options
+    """
+    parser = argparse.ArgumentParser(
+        prog="spfrx.py",
+        description="MID DISH SPFRx Console Ops."
+    )
+    parser.add_argument(
+        "-v",
+        "--version",
+        action="store_true",
+        help="Print version information for this module.",
+    )
+    parser.add_argument(
+        "-sync",
+        "--synchronize_on_band_config",
+        action="store_true",
+        help="Specify sychronization when configuring band. " +
+             "Default is FALSE." +
+             "Only applicable when configuring a band."
+    )
+    parser.add_argument(
+        "-d",
+        "--device",
+        type=str,
+        metavar="DEVICE",
+        default=SPFRX_DEVICE,
+        help=f"Override the default FQDN device (default is {SPFRX_DEVICE})."
+    )
+    parser.add_argument(
+        "-n",
+        "--name",
+        type=str,
+        metavar="NAME",
+        default=SPFRX_NAME,
+        help=f"Override the default FQDN name (default is {SPFRX_NAME})."
+    )
+    parser.add_argument(
+        "-w",
+        "--sweep_workers",
+        type=int,
+        metavar="N_WORKERS",
+        default=DEFAULT_MAX_WORKERS,
+        help="Maximum number of devices queried concurrently by the status, "
+             "version and attribute dump sweeps "
+             f"(default is {DEFAULT_MAX_WORKERS})."
+    )
+    parser.add_argument(
+        "--sweep_deadline",
+        type=float,
+        metavar="SECONDS",
+        default=DEFAULT_DEADLINE_S,
+        help="Time budget per device for the status, version and "
+             f"attribute dump sweeps (default is {DEFAULT_DEADLINE_S} s)."
+    )
+    parser.add_argument(
+        "-fleet",
+        "--fleet",
+        type=str,
+        nargs="+",
+        metavar="DISH",
+        help="Run the action on several dishes in parallel. Each DISH is a "
+             "DEVICE or DEVICE/NAME prefix, or a glob pattern (eg. 'ska00*') "
+             "resolved against the TANGO DB. Supported actions are "
+             "-status, -vall, -vb, -va, -ndc and -bprof."
+    )
+    parser.add_argument(
+        "--fleet_boardmap_dir",
+        type=str,
+        metavar="DIR",
+        help="Add every dish declared in the boardmap JSON files of DIR "
+             "to the fleet."
+    )
+    parser.add_argument(
+        "--fleet_workers",
+        type=int,
+        metavar="N_WORKERS",
+        default=DEFAULT_FLEET_WORKERS,
+        help="Maximum number of dishes handled concurrently in fleet mode "
+             f"(default is {DEFAULT_FLEET_WORKERS})."
+    )
+    parser.add_argument(
+        "--transition_timeout",
+        type=float,
+        metavar="SECONDS",
+        default=DEFAULT_TRANSITION_TIMEOUT_S,
+        help="Upper bound on each operating mode transition when "
+             "configuring a band or the noise diode "
+             f"(default is {DEFAULT_TRANSITION_TIMEOUT_S} s)."
+    )
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="Only display the steps a reconcile or restore would apply."
+    )
+    parser.add_argument(
+        "--fqdn_dish",
+        type=str,
+        metavar="PATTERN",
+        help="Only list FQDNs whose DEVICE or DEVICE/NAME matches PATTERN "
+             "(eg. 'ska00*/spfrxpu') with -fqdn."
+    )
+    parser.add_argument(
+        "--fqdn_class",
+        type=str,
+        metavar="PATTERN",
+        help="Only list FQDNs whose device class matches PATTERN with -fqdn."
+    )
+    parser.add_argument(
+        "--fqdn_alias",
+        type=str,
+        metavar="PATTERN",
+        help="Only list FQDNs whose alias matches PATTERN (eg. 'bsp*') "
+             "with -fqdn."
+    )
+    parser.add_argument(
+        "--fqdn_refresh",
+        action="store_true",
+        help="Rebuild the cached FQDN index from the TANGO DB."
+    )
+    parser.add_argument(
+        "--fqdn_ttl",
+        type=float,
+        metavar="SECONDS",
+        default=DEFAULT_FQDN_TTL_S,
+        help="Seconds the cached FQDN index is used without querying the "
+             f"TANGO DB (default is {DEFAULT_FQDN_TTL_S} s)."
+    )
+    parser.add_argument(
+        "--stats",
+        type=str,
+        choices=STATS_FORMATS,
+        help="Dump per-device, per-attribute and per-command TANGO call "
+             "counts, latency histograms, timeouts and errors at exit."
+    )
+    parser.add_argument(
+        "--stats_file",
+        type=str,
+        metavar="PATH",
+        help="Write the --stats dump to PATH instead of stdout."
+    )
+    parser.add_argument(
+        "--profile_cycles",
+        type=int,
+        metavar="N",
+        default=DEFAULT_PROFILE_CYCLES,
+        help="Number of passes through the bands with -bprof "
+             f"(default is {DEFAULT_PROFILE_CYCLES})."
+    )
+    parser.add_argument(
+        "--profile_history",
+        type=str,
+        metavar="PATH",
+        help="Band switch history file used by -bprof and -bprofsum "
+             f"(default is {default_history_path()})."
+    )
+    parser.add_argument(
+        "--level_bands",
+        type=int,
+        nargs="+",
+        metavar="BAND",
+        help="Bands leveled by -al (default is all bands)."
+    )
+    parser.add_argument(
+        "--level_tolerance",
+        type=float,
+        metavar="DB",
+        default=DEFAULT_TOLERANCE_DB,
+        help="Accepted distance from the -al target power "
+             f"(default is {DEFAULT_TOLERANCE_DB} dB)."
+    )
+    parser.add_argument(
+        "--level_channels",
+        type=int,
+        nargs=2,
+        metavar=("FIRST", "END"),
+        default=DEFAULT_CHANNELS,
+        help="Spectrometer channels FIRST to END-1 averaged by -al "
+             f"(default is {DEFAULT_CHANNELS[0]} {DEFAULT_CHANNELS[1]})."
+    )
+    parser.add_argument(
+        "--diff_rel_tol",
+        type=float,
+        metavar="TOL",
+        default=DEFAULT_REL_TOL,
+        help="Relative tolerance of numeric values with -dumpdiff "
+             f"(default is {DEFAULT_REL_TOL})."
+    )
+    parser.add_argument(
+        "--diff_abs_tol",
+        type=float,
+        metavar="TOL",
+        default=DEFAULT_ABS_TOL,
+        help="Absolute tolerance of numeric values with -dumpdiff "
+             f"(default is {DEFAULT_ABS_TOL})."
+    )
+    parser.add_argument(
+        "--diff_ignore",
+        type=str,
+        nargs="+",
+        metavar="PATTERN",
+        help="Attributes left out by -dumpdiff, as glob patterns on "
+             "ATTRIBUTE or DEVICE/ATTRIBUTE (eg. 'pktcap/spectrometer_*')."
+    )
+    spfrx_action = parser.add_mutually_exclusive_group()
+    spfrx_action.add_argument(
+        "-vall",
+        "--version_tango_all",
+        action="store_true",
+        help="Print TANGO version information for all device servers.",
     )
     spfrx_action.add_argument(
         "-fqdn",
@@ -771,6 +1796,23 @@ if __name__ == "__main__":
         + "Provide H pol attenuation value as a float "
         + "between 0 and 31.75",
     )
+    spfrx_action.add_argument(
+        "-ap",
+        "--atten_profile",
+        type=str,
+        metavar="PROFILE_FILE",
+        help="Configure the attenuators listed in the JSON PROFILE_FILE "
+             "(any subset of bands and polarizations) in a single write, "
+             'eg. {"1": {"H": 10.0, "V": 10.5}, "3": {"V": 12.0}}',
+    )
+    spfrx_action.add_argument(
+        "-aps",
+        "--atten_profile_save",
+        type=str,
+        metavar="PROFILE_FILE",
+        help="Save the attenuation of all bands and polarizations to the "
+             "JSON PROFILE_FILE.",
+    )
     spfrx_action.add_argument(
         "-vb",
         "--verify_band",
@@ -846,8 +1888,165 @@ if __name__ == "__main__":
         metavar="SPECTROMETER_BRIDGE",
         help="1 to configure LW bridge, 0 to configure HP bridge.",
     )
+    spfrx_action.add_argument(
+        "-al",
+        "--autolevel",
+        type=float,
+        metavar="TARGET_DB",
+        help="Level the attenuation of both polarizations of each of "
+             "--level_bands on the in-band gated spectrometer power "
+             "TARGET_DB. Note that invoking this command will configure "
+             "each band in turn.",
+    )
+    spfrx_action.add_argument(
+        "-bprof",
+        "--band_profile",
+        type=int,
+        nargs="+",
+        metavar="BAND",
+        help="Switch between the BANDs in turn --profile_cycles times, "
+             "recording the duration of each phase of every switch in the "
+             "band switch history.",
+    )
+    spfrx_action.add_argument(
+        "-bprofsum",
+        "--band_profile_summary",
+        type=str,
+        nargs="?",
+        const="*",
+        metavar="DISH_PATTERN",
+        help="Display band switch duration percentiles per dish, band and "
+             "sync flag from the band switch history, optionally only for "
+             "dishes matching DISH_PATTERN (eg. 'ska00*/spfrxpu').",
+    )
+    spfrx_action.add_argument(
+        "-snap",
+        "--snapshot",
+        type=str,
+        metavar="SNAPSHOT_FILE",
+        help="Save the whole receiver configuration (band, attenuation, "
+             "spectral inversion, noise diode, spectrometer settings) to "
+             "the JSON SNAPSHOT_FILE.",
+    )
+    spfrx_action.add_argument(
+        "-restore",
+        "--restore",
+        type=str,
+        metavar="SNAPSHOT_FILE",
+        help="Restore the receiver configuration saved with -snap, "
+             "changing only the settings that differ.",
+    )
+    spfrx_action.add_argument(
+        "-dump",
+        "--dump_attributes",
+        type=str,
+        metavar="DUMP_FILE",
+        help="Dump every attribute of all SPFRx devices to the JSON lines "
+             "DUMP_FILE, gzip compressed if it ends with '.gz'.",
+    )
+    spfrx_action.add_argument(
+        "-dumpdiff",
+        "--diff_dumps",
+        type=str,
+        nargs=2,
+        metavar=("OLD_DUMP", "NEW_DUMP"),
+        help="Display the attributes that differ between two -dump files.",
+    )
+    spfrx_action.add_argument(
+        "-rec",
+        "--reconcile",
+        type=str,
+        metavar="STATE_FILE",
+        help="Bring the receiver to the desired state described in the "
+             "JSON STATE_FILE (band, attenuation, spectral inversion, "
+             "noise diode, spectrometer bridge), applying only the "
+             "changes needed.",
+    )
 
-    args = parser.parse_args()
+    return parser
+
+
+def runActions(
+        args: argparse.Namespace
+        ) -> bool:
+    """
+    Perform the console actions selected on the command line.
+
+    :param args: The parsed command line arguments
+    :returns: False if fleet mode was requested and failed on any dish
+    """
+
+    if args.fleet is not None or args.fleet_boardmap_dir is not None:
+        return runFleetMode(args)
+
+    if args.reconcile is not None:
+        logger_.info(f"Reconciling SPFRx state with {args.reconcile}")
+        try:
+            desired = load_desired_state(args.reconcile)
+        except (OSError, ValueError) as e:
+            logger_.error(f"Unable to load the desired state: {e}")
+            desired = None
+        if desired is not None and reconcileReceiver(
+            desired,
+            args.device,
+            args.name,
+            args.dry_run,
+            args.transition_timeout
+        ):
+            logger_.info("SUCCESS")
+        else:
+            logger_.warning("FAILED")
+
+    if args.dump_attributes is not None:
+        logger_.info(
+            f"Dumping all SPFRx device attributes to {args.dump_attributes}"
+        )
+        if dump_device_attributes(
+            args.dump_attributes,
+            args.device,
+            args.name,
+            args.sweep_workers,
+            args.sweep_deadline
+        ):
+            logger_.info("SUCCESS")
+        else:
+            logger_.warning("Dump INCOMPLETE")
+
+    if args.diff_dumps is not None:
+        logger_.info(
+            f"Comparing attribute dumps {args.diff_dumps[0]} and "
+            f"{args.diff_dumps[1]}"
+        )
+        if diff_device_attribute_dumps(
+            args.diff_dumps[0],
+            args.diff_dumps[1],
+            args.diff_rel_tol,
+            args.diff_abs_tol,
+            args.diff_ignore
+        ):
+            logger_.info("No differences")
+        else:
+            logger_.warning("Dumps DIFFER")
+
+    if args.snapshot is not None:
+        logger_.info(f"Saving SPFRx receiver snapshot to {args.snapshot}")
+        if snapshotReceiver(args.snapshot, args.device, args.name):
+            logger_.info("SUCCESS")
+        else:
+            logger_.warning("Snapshot INCOMPLETE")
+
+    if args.restore is not None:
+        logger_.info(f"Restoring SPFRx receiver snapshot {args.restore}")
+        if restoreReceiver(
+            args.restore,
+            args.device,
+            args.name,
+            args.dry_run,
+            args.transition_timeout
+        ):
+            logger_.info("SUCCESS")
+        else:
+            logger_.warning("FAILED")
 
     if args.version:
         logger_.info(
@@ -858,16 +2057,31 @@ if __name__ == "__main__":
         logger_.info("Accessing version information for all Device Servers.")
         get_device_version_info(
             args.device,
-            args.name
+            args.name,
+            args.sweep_workers,
+            args.sweep_deadline
         )
 
     if args.fqdn_list_all:
         logger_.info("Accessing TANGO DB for full FQDN Device Server list.")
-        logger_.info(get_device_fqdn_list())
+        logger_.info(
+            get_device_fqdn_list(
+                args.fqdn_dish,
+                args.fqdn_class,
+                args.fqdn_alias,
+                args.fqdn_refresh,
+                args.fqdn_ttl,
+            )
+        )
 
     if args.status_tango_all:
         logger_.info("Accessing status information for TANGO Device Servers")
-        get_device_status()
+        get_device_status(
+            args.device,
+            args.name,
+            args.sweep_workers,
+            args.sweep_deadline
+        )
 
     if args.band is not None:
         logger_.info(
@@ -878,37 +2092,119 @@ if __name__ == "__main__":
             int(args.band),
             args.synchronize_on_band_config,
             args.device,
-            args.name)
+            args.name,
+            args.transition_timeout)
         if result:
             logger_.info("Band configuration SUCCESSFUL")
         else:
             logger_.warning("Band configuration FAILED")
 
+    if args.autolevel is not None:
+        logger_.info(
+            f"Leveling attenuation to {args.autolevel} dB for "
+            f"BANDS:{args.level_bands or 'all'}"
+        )
+        results = autoLevelAttenuation(
+            args.autolevel,
+            args.level_bands,
+            args.level_tolerance,
+            tuple(args.level_channels),
+            args.synchronize_on_band_config,
+            args.device,
+            args.name,
+            args.transition_timeout
+        )
+        if results and all(results):
+            logger_.info("Attenuation leveling SUCCESSFUL")
+        else:
+            logger_.warning("Attenuation leveling FAILED")
+
+    if args.band_profile is not None:
+        logger_.info(
+            f"Profiling band switches BANDS:{args.band_profile} "
+            f"CYCLES:{args.profile_cycles} "
+            f"SYNC:{args.synchronize_on_band_config}"
+        )
+        records = profileBandSwitches(
+            args.band_profile,
+            args.profile_cycles,
+            args.synchronize_on_band_config,
+            args.device,
+            args.name,
+            args.transition_timeout,
+            args.profile_history
+        )
+        if records:
+            logger_.info(
+                "Band switch durations (ms):\n"
+                + format_summary(summarize_history(records))
+            )
+        else:
+            logger_.warning("Band switch profiling FAILED")
+
+    if args.band_profile_summary is not None:
+        history = args.profile_history or default_history_path()
+        records = load_history(history, args.band_profile_summary)
+        if records:
+            logger_.info(
+                f"Band switch durations (ms) from {history}:\n"
+                + format_summary(summarize_history(records))
+            )
+        else:
+            logger_.warning(f"No band switches recorded in {history}")
+
     if args.atten is not None:
         logger_.info(
             f"Initiating attenuator config for BAND:{args.atten[0]} "
             f"POL_H:{args.atten[1]} "
             f"POL_V:{args.atten[2]}"
         )
-        result = configureAtten(int(args.atten[0]), int(POL_H), 
-                                float(args.atten[1]),
-                                args.device, args.name)
+        result = configureAttenProfile(
+            {
+                args.atten[0]: {
+                    POLS[POL_H]: float(args.atten[1]),
+                    POLS[POL_V]: float(args.atten[2]),
+                }
+            },
+            args.device,
+            args.name
+        )
         if result:
-            logger_.info(f"BAND:{args.atten[0]} POL_H attenuator set to "
-                         f"{args.atten[1]} SUCCESSFULLY")
+            logger_.info(f"BAND:{args.atten[0]} POL_H/POL_V attenuators set "
+                         f"to {args.atten[1]}/{args.atten[2]} SUCCESSFULLY")
         else:
             logger_.warning(f"BAND:{args.atten[0]} "
-                            f" POL_H attenuator config FAILED")
+                            f"attenuator config FAILED")
 
-        result = configureAtten(int(args.atten[0]), int(POL_V), 
-                                float(args.atten[2]),
-                                args.device, args.name)
-        if result:
-            logger_.info(f"BAND:{args.atten[0]} POL_V attenuator set to "
-                         f"{args.atten[2]} SUCCESSFULLY")
+    if args.atten_profile is not None:
+        logger_.info(f"Applying attenuation profile {args.atten_profile}")
+        try:
+            profile = load_atten_profile(args.atten_profile)
+        except ValueError as e:
+            logger_.error(f"Invalid attenuation profile: {e}")
+            profile = None
+        if profile is not None and configureAttenProfile(
+            profile,
+            args.device,
+            args.name
+        ):
+            logger_.info("SUCCESS")
         else:
-            logger_.warning(f"BAND:{args.atten[0]} "
-                            f"POL_V attenuator config FAILED")
+            logger_.warning("FAILED")
+
+    if args.atten_profile_save is not None:
+        profile = getAttenProfile(None, args.device, args.name)
+        if profile is not None:
+            skipped = save_atten_profile(args.atten_profile_save, profile)
+            if skipped:
+                logger_.warning(
+                    f"Unreadable attenuators left out: {', '.join(skipped)}"
+                )
+            logger_.info(
+                f"Attenuation profile saved to {args.atten_profile_save}"
+            )
+        else:
+            logger_.warning("Unable to read attenuation profile")
 
     if args.attenv is not None:
         logger_.info(
@@ -1023,7 +2319,8 @@ if __name__ == "__main__":
         if configureNoiseDiodePeriodic(
              args.noise_diode_periodic_config,
              args.device,
-             args.name
+             args.name,
+             args.transition_timeout
         ):
             logger_.info("SUCCESS")
         else:
@@ -1039,7 +2336,8 @@ if __name__ == "__main__":
         if configureNoiseDiodePseudoRandom(
              args.noise_diode_random_config,
              args.device,
-             args.name
+             args.name,
+             args.transition_timeout
         ):
             logger_.info("SUCCESS")
         else:
@@ -1073,3 +2371,19 @@ if __name__ == "__main__":
 
     else:
         logger_.info("Hello from Mid DISH SPFRx Console")
+
+    return True
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
+    logger_.info(f"User: {getpass.getuser()}")
+    args = buildParser().parse_args()
+    if args.stats is not None:
+        dump_stats_at_exit(args.stats, args.stats_file)
+    try:
+        if not runActions(args):
+            exit(1)
+    except TangoClientError as e:
+        logger_.error(str(e))
+        exit(1)
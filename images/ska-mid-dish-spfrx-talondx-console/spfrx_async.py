@@ -0,0 +1,552 @@
+"""
+spfrx_async
+asyncio client for the SPFRx, built on the PyTango asyncio green mode.
+
+Each operation of spfrx.py has an awaitable equivalent on SpfrxAsyncClient.
+Calls go through the same retry, backoff and circuit breaker policy as
+PyTangoClientWrapper (see tango_resilience) and are recorded in the call
+statistics. Many devices and dishes are driven from one event loop with
+asyncio.gather, without a thread per device::
+
+    async def main():
+        dishes = [SpfrxAsyncClient("ska001"), SpfrxAsyncClient("ska002")]
+        await asyncio.gather(*(d.configure_band(2) for d in dishes))
+
+    asyncio.run(main())
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from atten_profile import (
+    ATTEN_TOLERANCE,
+    POLS,
+    atten_attr,
+    normalize_atten_profile,
+    profile_items,
+)
+from device_sweep import (
+    DEFAULT_DEADLINE_S,
+    VERSION_ATTRIBUTES,
+    SweepResult,
+)
+from fleet import DEFAULT_FLEET_WORKERS, FleetResult, split_dish
+from lazy_import import lazy_import
+from proxy_pool import DEFAULT_TIMEOUT_MS
+from spfrx import (
+    DEFAULT_TRANSITION_TIMEOUT_S,
+    MAX_BAND,
+    MIN_BAND,
+    SPFRX_DEVICE,
+    SPFRX_DEVICE_LIST,
+    SPFRX_NAME,
+    getFqdn,
+    validateAtten,
+    validateBand,
+)
+from tango_call_stats import OUTCOME_OK, classify_error, get_call_stats
+from tango_resilience import (
+    RetryPolicy,
+    TangoClientError,
+    TangoConnectionError,
+    resilient_call_async,
+)
+from transition_wait import (
+    DEFAULT_POLL_INITIAL_S,
+    DEFAULT_POLL_MAX_S,
+    OPERATING_MODE_DATA_CAPTURE,
+    OPERATING_MODE_STANDBY,
+    POLL_BACKOFF,
+    TransitionResult,
+)
+
+tango_asyncio = lazy_import("tango.asyncio")
+
+
+async def wait_for_attribute_async(
+        client: "SpfrxAsyncClient",
+        key: str,
+        attr_name: str,
+        expected: Any,
+        timeout_s: float,
+        poll_initial_s: float = DEFAULT_POLL_INITIAL_S,
+        poll_max_s: float = DEFAULT_POLL_MAX_S
+        ) -> TransitionResult:
+    """
+    Awaitable equivalent of transition_wait.wait_for_attribute, polling
+    with a backed off interval without blocking the event loop.
+
+    :param client: Client owning the device
+    :param key: Key of the device in SPFRX_DEVICE_LIST
+    :param attr_name: Attribute to watch
+    :param expected: Expected value, or a callable predicate on the value
+    :param timeout_s: Upper bound on the wait in seconds
+    :returns: A TransitionResult with the last value seen and the time taken
+    """
+    matches: Callable[[Any], bool] = (
+        expected if callable(expected) else lambda v: v == expected
+    )
+    result = TransitionResult(attr_name)
+    start = time.monotonic()
+    deadline = start + timeout_s
+    interval = poll_initial_s
+    while True:
+        try:
+            result.value = await client.read_attribute(key, attr_name)
+        except TangoClientError:
+            result.value = None
+        if matches(result.value):
+            result.reached = True
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        await asyncio.sleep(min(interval, remaining))
+        interval = min(interval * POLL_BACKOFF, poll_max_s)
+    result.elapsed_s = time.monotonic() - start
+    return result
+
+
+class SpfrxAsyncClient:
+    """
+    Awaitable SPFRx operations for one dish.
+
+    Proxies are created on first use and kept for the life of the client.
+    A client must only be used from the event loop that created its
+    proxies.
+
+    :param device: Device part of the FQDN (defaults to SPFRX_DEVICE)
+    :param name: Name part of the FQDN (defaults to SPFRX_NAME)
+    :param timeout_ms: Client timeout of every proxy in milliseconds
+    :param retry_policy: Retry policy of every call
+    """
+
+    def __init__(
+            self,
+            device: str = SPFRX_DEVICE,
+            name: str = SPFRX_NAME,
+            timeout_ms: int = DEFAULT_TIMEOUT_MS,
+            retry_policy: RetryPolicy = None
+            ):
+        self.device = device
+        self.name = name
+        self.timeout_ms = timeout_ms
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._proxies: Dict[str, Any] = {}
+        self._stats = get_call_stats()
+
+    @property
+    def dish(self) -> str:
+        return f"{self.device}/{self.name}"
+
+    def fqdn(
+            self,
+            key: str
+            ) -> str:
+        """
+        FQDN of a device of this dish.
+
+        :param key: Key of the device in SPFRX_DEVICE_LIST (eg. "ctrl")
+        """
+        return getFqdn(SPFRX_DEVICE_LIST[key], self.device, self.name)
+
+    async def _proxy(
+            self,
+            key: str
+            ) -> Any:
+        dp = self._proxies.get(key)
+        if dp is None:
+            dp = await tango_asyncio.DeviceProxy(self.fqdn(key))
+            dp.set_timeout_millis(self.timeout_ms)
+            self._proxies[key] = dp
+        return dp
+
+    async def _call(
+            self,
+            key: str,
+            kind: str,
+            name: str,
+            call: Callable[[Any], Awaitable],
+            idempotent: bool = True
+            ) -> Any:
+        fqdn = self.fqdn(key)
+
+        async def attempt():
+            start = time.perf_counter()
+            outcome = OUTCOME_OK
+            try:
+                return await call(await self._proxy(key))
+            except Exception as e:
+                outcome = classify_error(e)
+                raise
+            finally:
+                self._stats.record(
+                    fqdn, kind, name, time.perf_counter() - start, outcome
+                )
+
+        return await resilient_call_async(
+            fqdn,
+            f"{kind} {name}",
+            attempt,
+            self.retry_policy,
+            idempotent,
+            lambda: self._proxies.pop(key, None),
+        )
+
+    async def read_attribute(
+            self,
+            key: str,
+            attr_name: str
+            ) -> Any:
+        """
+        Read the value of one attribute.
+
+        :param key: Key of the device in SPFRX_DEVICE_LIST
+        :param attr_name: Attribute to read from
+        """
+        return await self._call(
+            key, "read", attr_name,
+            lambda dp: self._value(dp.read_attribute(attr_name))
+        )
+
+    async def read_attributes(
+            self,
+            key: str,
+            attr_names: List[str]
+            ) -> list:
+        """
+        Read several attributes in one call.
+
+        :returns: The list of DeviceAttribute
+        """
+        return await self._call(
+            key, "read_attributes", ",".join(attr_names),
+            lambda dp: dp.read_attributes(attr_names)
+        )
+
+    async def write_attribute(
+            self,
+            key: str,
+            attr_name: str,
+            value: Any
+            ) -> None:
+        await self._call(
+            key, "write", attr_name,
+            lambda dp: dp.write_attribute(attr_name, value)
+        )
+
+    async def write_attributes(
+            self,
+            key: str,
+            attr_values: list
+            ) -> None:
+        await self._call(
+            key, "write_attributes",
+            ",".join(name for name, _ in attr_values),
+            lambda dp: dp.write_attributes(attr_values)
+        )
+
+    async def command(
+            self,
+            key: str,
+            command_name: str,
+            *args
+            ) -> Any:
+        """
+        Send a command; only retried when it could not be delivered.
+        """
+        return await self._call(
+            key, "command", command_name,
+            lambda dp: dp.command_inout(command_name, *args),
+            idempotent=False
+        )
+
+    @staticmethod
+    async def _value(
+            read: Awaitable
+            ) -> Any:
+        return (await read).value
+
+    async def configured_band(self) -> int:
+        return int(await self.read_attribute("ctrl", "configuredBand"))
+
+    async def set_standby_mode(
+            self,
+            timeout_s: float = DEFAULT_TRANSITION_TIMEOUT_S
+            ) -> TransitionResult:
+        """
+        Put the SPFRx into standby mode and wait for STANDBY.
+        """
+        await self.command("ctrl", "SetStandbyMode")
+        return await wait_for_attribute_async(
+            self, "ctrl", "operatingMode", OPERATING_MODE_STANDBY, timeout_s
+        )
+
+    async def configure_band(
+            self,
+            band: int,
+            synchronize: bool = False,
+            timeout_s: float = DEFAULT_TRANSITION_TIMEOUT_S,
+            timings: dict = None
+            ) -> bool:
+        """
+        Configure a band: standby, ConfigureBand, then wait for DATA_CAPTURE
+        and the configuredBand readback.
+
+        :param band: Band ID (validated)
+        :param synchronize: Synchronize the band configuration
+        :param timeout_s: Upper bound on each transition
+        :param timings: Optional dict filled like spfrx.configureBand
+        :returns: True on success
+        """
+        if not validateBand(band):
+            return False
+        if timings is None:
+            timings = {}
+        start = time.perf_counter()
+        standby = await self.set_standby_mode(timeout_s)
+        timings["standby"] = standby.elapsed_s
+        if not standby:
+            # DATA_CAPTURE could otherwise be matched on the mode the
+            # controller was already in
+            return False
+        t0 = time.perf_counter()
+        await self.command("ctrl", f"ConfigureBand{band}", synchronize)
+        timings["configure_cmd"] = time.perf_counter() - t0
+        capture = await wait_for_attribute_async(
+            self, "ctrl", "operatingMode", OPERATING_MODE_DATA_CAPTURE,
+            timeout_s
+        )
+        timings["data_capture"] = capture.elapsed_s
+        if not capture:
+            return False
+        readback = await wait_for_attribute_async(
+            self, "ctrl", "configuredBand",
+            lambda v: v is not None and int(v) == band, timeout_s
+        )
+        timings["band_readback"] = readback.elapsed_s
+        timings["total"] = time.perf_counter() - start
+        return bool(readback)
+
+    async def get_atten_profile(
+            self,
+            bands: List[int] = None
+            ) -> dict:
+        """
+        Read the attenuation of several bands, both polarizations, in one
+        call.
+
+        :returns: An attenuation profile (see atten_profile)
+        """
+        if bands is None:
+            bands = range(MIN_BAND, MAX_BAND + 1)
+        entries = [(band, pol) for band in bands for pol in POLS]
+        attrs = await self.read_attributes(
+            "ctrl", [atten_attr(band, pol) for band, pol in entries]
+        )
+        profile = {}
+        for (band, pol), attr in zip(entries, attrs):
+            profile.setdefault(str(band), {})[pol] = (
+                None if attr.has_failed else float(attr.value)
+            )
+        return profile
+
+    async def configure_atten_profile(
+            self,
+            profile: dict
+            ) -> bool:
+        """
+        Write an attenuation profile in one call and verify it with one
+        read.
+
+        :param profile: An attenuation profile (see atten_profile)
+        :returns: True if every entry reads back within ATTEN_TOLERANCE
+        """
+        try:
+            items = profile_items(normalize_atten_profile(profile))
+        except ValueError:
+            return False
+        if not all(validateBand(b) and validateAtten(a) for b, _, a in items):
+            return False
+        await self.write_attributes(
+            "ctrl", [(atten_attr(b, p), a) for b, p, a in items]
+        )
+        attrs = await self.read_attributes(
+            "ctrl", [atten_attr(b, p) for b, p, _ in items]
+        )
+        return all(
+            not attr.has_failed
+            and abs(float(attr.value) - a) < ATTEN_TOLERANCE
+            for attr, (_, _, a) in zip(attrs, items)
+        )
+
+    async def enable_noise_diode(
+            self,
+            enable: bool
+            ) -> None:
+        await self.command("ctrl", "SetNoiseDiodeState", enable)
+
+    async def read_noise_diode_config(self) -> dict:
+        """
+        Read the noise diode parameters in one call.
+
+        :returns: A dict like spfrx.readNoiseDiodeConfig
+        """
+        atts = await self.read_attributes(
+            "ctrl",
+            [
+                "noiseDiodeState",
+                "noiseDiodeMode",
+                "periodicNoiseDiodePars",
+                "pseudoRandomNoiseDiodePars",
+            ]
+        )
+        return {
+            "state": int(atts[0].value),
+            "mode": int(atts[1].value),
+            "periodic": list(atts[2].value),
+            "pseudoRandom": list(atts[3].value),
+        }
+
+    async def configure_noise_diode(
+            self,
+            values: List[int],
+            attr: str,
+            timeout_s: float = DEFAULT_TRANSITION_TIMEOUT_S
+            ) -> bool:
+        """
+        Write the noise diode parameters after setting standby mode.
+
+        :param values: The 3 parameters of the mode
+        :param attr: "periodic" or "pseudoRandom"
+        :returns: True once written, False if STANDBY was not reached
+        """
+        if not await self.set_standby_mode(timeout_s):
+            # The parameters are only accepted in standby
+            return False
+        await self.write_attribute("ctrl", f"{attr}NoiseDiodePars", values)
+        return True
+
+    async def enable_spectrometer(
+            self,
+            enable: bool
+            ) -> None:
+        await self.command("ctrl", "SpectrometerCtrl", enable)
+
+    async def set_spectrometer_bridge(
+            self,
+            bridge: int
+            ) -> None:
+        await self.command("pktcap", "spectrometer_set_bridge", bridge)
+
+    async def _probe(
+            self,
+            key: str,
+            probe: Callable[[str], Awaitable[dict]],
+            deadline_s: float
+            ) -> SweepResult:
+        result = SweepResult(key, self.fqdn(key))
+        start = time.monotonic()
+        try:
+            result.values = await asyncio.wait_for(probe(key), deadline_s)
+            result.exported = True
+        except asyncio.TimeoutError:
+            result.error = "device deadline exceeded"
+        except TangoConnectionError as e:
+            # Not reached, as a device that is not exported
+            result.error = e.desc.strip()
+        except TangoClientError as e:
+            # The device answered, or timed out once connected
+            result.exported = True
+            result.error = e.desc.strip()
+        result.elapsed_s = time.monotonic() - start
+        return result
+
+    async def device_class(
+            self,
+            key: str
+            ) -> str:
+        """
+        Class of a device. DeviceProxy.info is not green, so it runs on
+        the default executor instead of blocking the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        info = await self._call(
+            key, "command", "info",
+            lambda dp: loop.run_in_executor(None, dp.info)
+        )
+        return info.dev_class
+
+    async def status(
+            self,
+            deadline_s: float = DEFAULT_DEADLINE_S
+            ) -> List[SweepResult]:
+        """
+        State and status of every device in SPFRX_DEVICE_LIST, read
+        concurrently.
+        """
+        async def probe(key):
+            state = await self._call(
+                key, "command", "State", lambda dp: dp.state()
+            )
+            status = await self._call(
+                key, "command", "Status", lambda dp: dp.status()
+            )
+            return {"state": str(state), "status": status}
+
+        return await asyncio.gather(
+            *(self._probe(key, probe, deadline_s) for key in SPFRX_DEVICE_LIST)
+        )
+
+    async def version(
+            self,
+            deadline_s: float = DEFAULT_DEADLINE_S
+            ) -> List[SweepResult]:
+        """
+        Version attributes of every device in SPFRX_DEVICE_LIST, read
+        concurrently with one read_attributes call per device.
+        """
+        async def probe(key):
+            values = {"class": await self.device_class(key)}
+            for attr in await self.read_attributes(key, VERSION_ATTRIBUTES):
+                values[attr.name] = None if attr.has_failed else attr.value
+            return values
+
+        return await asyncio.gather(
+            *(self._probe(key, probe, deadline_s) for key in SPFRX_DEVICE_LIST)
+        )
+
+
+async def gather_dishes(
+        dishes: List[str],
+        action: Callable[[SpfrxAsyncClient], Awaitable[tuple]],
+        default_name: str = SPFRX_NAME,
+        max_concurrency: int = DEFAULT_FLEET_WORKERS
+        ) -> List[FleetResult]:
+    """
+    Run an action against many dishes concurrently on the running loop.
+
+    :param dishes: Dish prefixes ("device/name" or "device")
+    :param action: Coroutine function taking a SpfrxAsyncClient and
+                   returning an (ok, summary) tuple
+    :param default_name: Name used when a dish has no name part
+    :param max_concurrency: Maximum number of dishes in flight at once
+    :returns: One FleetResult per dish, in the order of dishes
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run_one(dish: str) -> FleetResult:
+        result = FleetResult(dish)
+        async with semaphore:
+            start = time.monotonic()
+            try:
+                result.ok, result.summary = await action(
+                    SpfrxAsyncClient(*split_dish(dish, default_name))
+                )
+            except Exception as e:
+                result.summary = f"ERROR: {str(e).strip()}"
+            result.elapsed_s = time.monotonic() - start
+        return result
+
+    return list(await asyncio.gather(*(run_one(d) for d in dishes)))
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+spfrx_client
+Thin client for the spfrx_session.py command server.
+
+Sends the spfrx.py options given on the command line to a running
+session and prints the result, eg.::
+
+    ./spfrx_client.py -va 2
+    ./spfrx_client.py --socket /tmp/my.sock -a 1 10.0 10.5
+
+Only the standard library is imported, so start-up stays cheap.
+"""
+import json
+import os
+import socket
+import sys
+
+DEFAULT_SOCKET_PATH = "/tmp/spfrx-console.sock"
+SOCKET_ENV = "SPFRX_SESSION_SOCKET"
+
+
+def sendCommand(
+        argv: list,
+        socket_path: str = DEFAULT_SOCKET_PATH
+        ) -> tuple:
+    """
+    Send one command to the session server.
+
+    :param argv: The spfrx.py options
+    :param socket_path: Path of the session Unix socket
+    :returns: A (status, output) tuple
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(argv).encode() + b"\n")
+        with sock.makefile("rb") as reply:
+            response = json.loads(reply.readline())
+    return response["status"], response["output"]
+
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    socket_path = os.environ.get(SOCKET_ENV, DEFAULT_SOCKET_PATH)
+    if len(argv) >= 2 and argv[0] == "--socket":
+        socket_path = argv[1]
+        argv = argv[2:]
+    try:
+        status, output = sendCommand(argv, socket_path)
+    except (ConnectionError, FileNotFoundError) as e:
+        sys.exit(
+            f"Unable to reach SPFRx session at {socket_path}: {e}\n"
+            "Start one with: ./spfrx_session.py --serve"
+        )
+    sys.stdout.write(output)
+    sys.exit(status)
@@ -0,0 +1,699 @@
+#!/usr/bin/env python3
+"""
+spfrx_scheduler
+Run a timeline of time-tagged SPFRx operations.
+
+A timeline is a JSON list of steps, each giving the UTC time at which it
+must start, the operation and its parameters::
+
+    [
+        {"at": "2026-10-18T21:00:00Z", "op": "band", "band": 2},
+        {"at": "+30", "op": "noise_diode", "enable": true},
+        {"at": "+30.5", "op": "atten", "band": 2, "H": 10.0, "V": 10.5}
+    ]
+
+"at" is an ISO 8601 UTC time, or "+SECONDS" relative to the start of the
+timeline; a bare number is rejected rather than taken as a POSIX time.
+The operations and their parameters are listed in OPERATIONS. Every
+parameter is checked and converted when the timeline is loaded, including
+bands, attenuation ranges, the noise diode values and reconcile states
+(with the same checks reconcileReceiver makes), so a malformed step is
+reported before the first step runs.
+
+Every proxy the timeline needs is created and pinged before the first
+step, and again shortly before each step, so that a step only costs its
+own TANGO calls. A step is started by sleeping until just before its
+target time and then spinning on the monotonic clock. Steps run one
+after the other; a step that overruns delays the next one, which is
+shown in the report of achieved against requested start times.
+"""
+import argparse
+import datetime
+import gc
+import getpass
+import json
+import logging
+import math
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import spfrx
+from atten_profile import load_atten_profile, normalize_atten_profile
+from reconcile import ND_PARS_LENGTH, load_desired_state
+from tango_call_stats import STATS_FORMATS, dump_stats_at_exit
+from tango_resilience import TangoClientError
+
+LOG_FORMAT = (
+    "[spfrx_scheduler.py: line %(lineno)s]%(levelname)s: %(message)s"
+)
+DEFAULT_START_LEAD_S = 2.0
+# Proxies are re-checked this long before their step
+WARM_AHEAD_S = 1.0
+# The last part of a wait is spun instead of slept, for a tighter start
+SPIN_S = 0.01
+
+logger_ = logging.getLogger("spfrx_scheduler.py")
+
+
+def _band(step, device, name, timeout_s):
+    return spfrx.configureBand(
+        step.params["band"],
+        step.params.get("synchronize", False),
+        device,
+        name,
+        timeout_s,
+    )
+
+
+def _atten(step, device, name, timeout_s):
+    pols = {pol: step.params[pol] for pol in spfrx.POLS if pol in step.params}
+    return spfrx.configureAttenProfile(
+        {step.params["band"]: pols}, device, name
+    )
+
+
+def _atten_profile(step, device, name, timeout_s):
+    return spfrx.configureAttenProfile(
+        step.params["profile"], device, name
+    )
+
+
+def _noise_diode(step, device, name, timeout_s):
+    return spfrx.enableNoiseDiode(step.params["enable"], device, name)
+
+
+def _noise_diode_periodic(step, device, name, timeout_s):
+    return spfrx.configureNoiseDiodePeriodic(
+        step.params["values"], device, name, timeout_s
+    )
+
+
+def _noise_diode_pseudo_random(step, device, name, timeout_s):
+    return spfrx.configureNoiseDiodePseudoRandom(
+        step.params["values"], device, name, timeout_s
+    )
+
+
+def _spectrometer(step, device, name, timeout_s):
+    return spfrx.enableSpectrometer(step.params["enable"], device, name)
+
+
+def _standby(step, device, name, timeout_s):
+    return bool(spfrx.setStandbyMode(
+        spfrx.getDeviceClient("ctrl", device, name), timeout_s
+    ))
+
+
+def _reconcile(step, device, name, timeout_s):
+    return spfrx.reconcileReceiver(
+        step.params["state"], device, name, False, timeout_s
+    )
+
+
+def _to_bool(value: Any) -> bool:
+    # bool("false") is True, so only JSON booleans are accepted
+    if not isinstance(value, bool):
+        raise ValueError(f"expected true or false, got {value!r}")
+    return value
+
+
+def _to_int(value: Any) -> int:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or \
+            int(value) != value:
+        raise ValueError(f"expected an integer, got {value!r}")
+    return int(value)
+
+
+def _to_float(value: Any) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or \
+            not math.isfinite(value):
+        raise ValueError(f"expected a number, got {value!r}")
+    return float(value)
+
+
+def _to_band(value: Any) -> int:
+    band = _to_int(value)
+    if not spfrx.MIN_BAND <= band <= spfrx.MAX_BAND:
+        raise ValueError(
+            f"band must be {spfrx.MIN_BAND} to {spfrx.MAX_BAND}, got {band}"
+        )
+    return band
+
+
+def _to_atten(value: Any) -> float:
+    atten = _to_float(value)
+    if not spfrx.MIN_ATTEN <= atten <= spfrx.MAX_ATTEN:
+        raise ValueError(
+            f"attenuation must be {spfrx.MIN_ATTEN} to {spfrx.MAX_ATTEN}, "
+            f"got {atten}"
+        )
+    return atten
+
+
+def _to_nd_values(value: Any) -> List[int]:
+    if not isinstance(value, list) or len(value) != ND_PARS_LENGTH:
+        raise ValueError(
+            f"expected a list of {ND_PARS_LENGTH} integers, got {value!r}"
+        )
+    return [_to_int(v) for v in value]
+
+
+def _check_profile(profile: dict) -> dict:
+    profile = normalize_atten_profile(profile)
+    for band, pols in profile.items():
+        _to_band(int(band))
+        for atten in pols.values():
+            _to_atten(atten)
+    return profile
+
+
+def _check_state(state: Any) -> dict:
+    # Logs what is wrong with the state
+    if not spfrx.validateDesiredState(state):
+        raise ValueError("invalid desired state")
+    return state
+
+
+def _to_profile(value: Any):
+    # A path is loaded and checked by load_timeline
+    if isinstance(value, str):
+        return value
+    if not isinstance(value, dict):
+        raise ValueError(f"expected a profile or a path, got {value!r}")
+    return _check_profile(value)
+
+
+def _to_state(value: Any):
+    # A path is loaded and checked by load_timeline
+    if isinstance(value, str):
+        return value
+    return _check_state(value)
+
+
+# op: (required parameters, optional parameters, devices used
+#      (SPFRX_DEVICE_LIST keys), runner); parameters map to their converter
+OPERATIONS: Dict[str, Tuple[dict, dict, tuple, Callable]] = {
+    "band": (
+        {"band": _to_band}, {"synchronize": _to_bool}, ("ctrl",), _band
+    ),
+    "atten": (
+        {"band": _to_band}, {"H": _to_atten, "V": _to_atten}, ("ctrl",),
+        _atten
+    ),
+    "atten_profile": (
+        {"profile": _to_profile}, {}, ("ctrl",), _atten_profile
+    ),
+    "noise_diode": ({"enable": _to_bool}, {}, ("ctrl",), _noise_diode),
+    "noise_diode_periodic": (
+        {"values": _to_nd_values}, {}, ("ctrl",), _noise_diode_periodic
+    ),
+    "noise_diode_pseudo_random": (
+        {"values": _to_nd_values}, {}, ("ctrl",),
+        _noise_diode_pseudo_random
+    ),
+    "spectrometer": ({"enable": _to_bool}, {}, ("ctrl",), _spectrometer),
+    "standby": ({}, {}, ("ctrl",), _standby),
+    "reconcile": (
+        {"state": _to_state}, {}, ("ctrl", "bp12", "bp3", "pktcap"),
+        _reconcile
+    ),
+}
+
+
+class TimelineStep:
+    """
+    One time-tagged operation of a timeline, and its outcome once run.
+
+    :param index: Position of the step in the timeline file
+    :param op: Operation name, a key of OPERATIONS
+    :param params: Operation parameters, converted to their types
+    :param at_s: Target start as a UTC POSIX time, or as seconds from the
+                 start of the timeline if relative is True
+    :param relative: True if at_s is relative to the timeline start
+    """
+
+    __slots__ = (
+        "index", "op", "params", "at_s", "relative", "target_s",
+        "started_s", "duration_s", "ok", "summary",
+    )
+
+    def __init__(
+            self,
+            index: int,
+            op: str,
+            params: dict,
+            at_s: float,
+            relative: bool = False
+            ):
+        self.index = index
+        self.op = op
+        self.params = params
+        self.at_s = at_s
+        self.relative = relative
+        self.target_s = None if relative else at_s
+        self.started_s = None
+        self.duration_s = 0.0
+        self.ok = False
+        self.summary = ""
+
+    @property
+    def lateness_s(self) -> float:
+        """
+        Achieved minus requested start time, None if the step did not run.
+        """
+        if self.started_s is None:
+            return None
+        return self.started_s - self.target_s
+
+    def to_dict(self) -> dict:
+        return {
+            "index": self.index,
+            "op": self.op,
+            "params": self.params,
+            "requested": format_utc(self.target_s),
+            "started": format_utc(self.started_s),
+            "lateness_s": self.lateness_s,
+            "duration_s": self.duration_s,
+            "ok": self.ok,
+            "summary": self.summary,
+        }
+
+
+def parse_utc(
+        value: str
+        ) -> float:
+    """
+    Convert an ISO 8601 time to a POSIX time. Times without a zone are
+    taken as UTC.
+
+    :param value: eg. "2026-10-18T21:00:00.250Z"
+    :returns: Seconds since the epoch
+    """
+    if value.endswith(("Z", "z")):
+        value = value[:-1] + "+00:00"
+    when = datetime.datetime.fromisoformat(value)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return when.timestamp()
+
+
+def format_utc(
+        posix_s: float
+        ) -> str:
+    """
+    :param posix_s: Seconds since the epoch, or None
+    :returns: The ISO 8601 UTC time with microseconds, or "-" for None
+    """
+    if posix_s is None:
+        return "-"
+    return datetime.datetime.fromtimestamp(
+        posix_s, datetime.timezone.utc
+    ).isoformat(timespec="microseconds").replace("+00:00", "Z")
+
+
+def _parse_params(
+        index: int,
+        op: str,
+        params: dict
+        ) -> dict:
+    required, optional = OPERATIONS[op][:2]
+    missing = [p for p in required if p not in params]
+    if missing:
+        raise ValueError(f"step {index}: {op} needs {', '.join(missing)}")
+    unknown = [p for p in params if p not in required and p not in optional]
+    if unknown:
+        raise ValueError(
+            f"step {index}: {op} does not take {', '.join(unknown)}"
+        )
+    converters = {**required, **optional}
+    converted = {}
+    for param, value in params.items():
+        try:
+            converted[param] = converters[param](value)
+        except ValueError as e:
+            raise ValueError(f"step {index}: {op} {param}: {e}")
+    if op == "atten" and not any(pol in converted for pol in spfrx.POLS):
+        raise ValueError(f"step {index}: atten needs H or V")
+    return converted
+
+
+def _parse_at(
+        index: int,
+        at: Any
+        ) -> Tuple[float, bool]:
+    # A bare number would be a POSIX time (30 is in 1970), which is almost
+    # certainly a relative time missing its "+"
+    invalid = ValueError(
+        f"step {index}: invalid time {at!r}, expected an ISO 8601 UTC time "
+        f"or \"+SECONDS\""
+    )
+    if not isinstance(at, str):
+        raise invalid
+    try:
+        if at.startswith("+"):
+            at_s = float(at[1:])
+            if not math.isfinite(at_s):
+                raise invalid
+            return at_s, True
+        return parse_utc(at), False
+    except ValueError:
+        raise invalid
+
+
+def parse_timeline(
+        entries: List[dict]
+        ) -> List[TimelineStep]:
+    """
+    Validate the entries of a timeline and turn them into steps, with
+    their parameters converted to the types the operations take.
+
+    :param entries: The timeline, as loaded from JSON
+    :returns: The steps, in timeline order
+    :raises ValueError: If an entry has no valid time, an unknown
+                        operation, or a missing, unknown or invalid
+                        parameter
+    """
+    if not isinstance(entries, list):
+        raise ValueError("a timeline must be a JSON list of steps")
+    steps = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f"step {index}: expected a JSON object")
+        params = dict(entry)
+        at = params.pop("at", None)
+        op = params.pop("op", None)
+        if op not in OPERATIONS:
+            raise ValueError(f"step {index}: unknown operation {op!r}")
+        params = _parse_params(index, op, params)
+        at_s, relative = _parse_at(index, at)
+        steps.append(TimelineStep(index, op, params, at_s, relative))
+    return steps
+
+
+def load_timeline(
+        path: str
+        ) -> List[TimelineStep]:
+    """
+    Load a timeline from a JSON file. The "profile" of atten_profile steps
+    and the "state" of reconcile steps can be given as the path of a JSON
+    file instead of inline.
+
+    :param path: Path of the JSON file
+    :returns: The steps, in timeline order
+    :raises OSError: If a file cannot be read
+    :raises ValueError: If the timeline or a file it refers to is invalid
+    """
+    with open(path, "r") as timeline_fd:
+        steps = parse_timeline(json.load(timeline_fd))
+    for step in steps:
+        try:
+            if isinstance(step.params.get("profile"), str):
+                step.params["profile"] = _check_profile(
+                    load_atten_profile(step.params["profile"])
+                )
+            if isinstance(step.params.get("state"), str):
+                step.params["state"] = _check_state(
+                    load_desired_state(step.params["state"])
+                )
+        except ValueError as e:
+            raise ValueError(f"step {step.index}: {step.op}: {e}")
+    return steps
+
+
+def schedule(
+        steps: List[TimelineStep],
+        start_s: float
+        ) -> List[TimelineStep]:
+    """
+    Resolve the relative times of the steps and order them by target time.
+    Steps with the same target time keep their timeline order.
+
+    :param steps: The steps of a timeline
+    :param start_s: UTC POSIX time of the start of the timeline
+    :returns: The steps, sorted by target time
+    """
+    for step in steps:
+        step.target_s = start_s + step.at_s if step.relative else step.at_s
+    return sorted(steps, key=lambda step: step.target_s)
+
+
+def warm_proxies(
+        keys: List[str],
+        device: str,
+        name: str
+        ) -> None:
+    """
+    Connect and ping the devices from the proxy pool, so that the next
+    step does not pay for a connection or a pool health check.
+
+    :param keys: Keys of the devices in SPFRX_DEVICE_LIST
+    :param device: TANGO FQDN Device
+    :param name: TANGO FQDN Name
+    """
+    for key in dict.fromkeys(keys):
+        try:
+            spfrx.getDeviceClient(key, device, name).dp.ping()
+        except Exception as e:
+            # The step itself reports the failure
+            logger_.warning(f"Unable to reach {key}: {str(e).strip()}")
+
+
+def wait_until(
+        target_s: float
+        ) -> None:
+    """
+    Wait for a UTC POSIX time: sleep until SPIN_S before it, then spin.
+    The wait is measured on the monotonic clock, so that a wall clock step
+    during the wait does not move the start.
+
+    :param target_s: UTC POSIX time to wait for
+    """
+    deadline = time.perf_counter() + (target_s - time.time())
+    remaining = deadline - time.perf_counter()
+    if remaining > SPIN_S:
+        time.sleep(remaining - SPIN_S)
+    while time.perf_counter() < deadline:
+        pass
+
+
+def run_step(
+        step: TimelineStep,
+        device: str,
+        name: str,
+        timeout_s: float
+        ) -> None:
+    """
+    Run one step now and record its outcome in it. Any exception fails the
+    step, so that the rest of the timeline still runs.
+    """
+    runner = OPERATIONS[step.op][3]
+    step.started_s = time.time()
+    start = time.perf_counter()
+    try:
+        step.ok = bool(runner(step, device, name, timeout_s))
+        step.summary = "OK" if step.ok else "FAILED"
+    except TangoClientError as e:
+        step.summary = f"ERROR: {e}"
+    except Exception as e:
+        logger_.exception(f"Step {step.index} {step.op} raised")
+        step.summary = f"FAILED: {type(e).__name__}: {e}"
+    step.duration_s = time.perf_counter() - start
+
+
+def run_timeline(
+        steps: List[TimelineStep],
+        device: str = spfrx.SPFRX_DEVICE,
+        name: str = spfrx.SPFRX_NAME,
+        start_s: float = None,
+        timeout_s: float = spfrx.DEFAULT_TRANSITION_TIMEOUT_S,
+        max_late_s: float = None,
+        stop_on_failure: bool = False
+        ) -> List[TimelineStep]:
+    """
+    Run the steps of a timeline at their target times.
+
+    :param steps: The steps of a timeline
+    :param device: Optional - TANGO FQDN Device (defaults to SPFRX_DEVICE)
+    :param name: Optional - TANGO FQDN Name (defaults to SPFRX_NAME)
+    :param start_s: Optional - UTC POSIX time relative times refer to;
+                    defaults to DEFAULT_START_LEAD_S after the proxies
+                    are warm
+    :param timeout_s: Optional - Upper bound in seconds on each transition
+    :param max_late_s: Optional - Skip the steps that cannot start within
+                       this many seconds of their target time
+    :param stop_on_failure: Optional - Skip the remaining steps after a
+                            failed step
+    :returns: The steps in the order they were run, with their outcome
+    """
+    warm_proxies(
+        [key for step in steps for key in OPERATIONS[step.op][2]],
+        device,
+        name
+    )
+    if start_s is None:
+        start_s = time.time() + DEFAULT_START_LEAD_S
+    steps = schedule(steps, start_s)
+
+    failed = False
+    for step in steps:
+        if failed and stop_on_failure:
+            step.summary = "SKIPPED: an earlier step failed"
+            continue
+        if step.target_s - time.time() > WARM_AHEAD_S:
+            wait_until(step.target_s - WARM_AHEAD_S)
+            warm_proxies(OPERATIONS[step.op][2], device, name)
+            # Collect now rather than during the step
+            gc.collect()
+        lateness = time.time() - step.target_s
+        if max_late_s is not None and lateness > max_late_s:
+            step.summary = f"SKIPPED: {lateness:.3f} s late"
+            failed = True
+            continue
+        wait_until(step.target_s)
+        run_step(step, device, name, timeout_s)
+        failed = failed or not step.ok
+        logger_.info(
+            f"Step {step.index} {step.op}: {step.summary} "
+            f"(late {step.lateness_s * 1e3:+.3f} ms, "
+            f"took {step.duration_s:.3f} s)"
+        )
+    return steps
+
+
+def format_report(
+        steps: List[TimelineStep]
+        ) -> str:
+    """
+    Tabulate the requested and achieved start times of the steps.
+
+    :param steps: Steps returned by run_timeline
+    :returns: A printable report
+    """
+    lines = [
+        f"{'STEP':>4}  {'OPERATION':<25} {'REQUESTED (UTC)':<27} "
+        f"{'LATE (ms)':>10} {'TOOK (s)':>9}  RESULT"
+    ]
+    for step in steps:
+        late = "-" if step.lateness_s is None \
+            else f"{step.lateness_s * 1e3:+.3f}"
+        lines.append(
+            f"{step.index:>4}  {step.op:<25} {format_utc(step.target_s):<27} "
+            f"{late:>10} {step.duration_s:>9.3f}  {step.summary}"
+        )
+    lateness = [abs(s.lateness_s) for s in steps if s.lateness_s is not None]
+    if lateness:
+        lines.append(
+            f"Start error over {len(lateness)} steps: "
+            f"max {max(lateness) * 1e3:.3f} ms, "
+            f"mean {sum(lateness) / len(lateness) * 1e3:.3f} ms"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
+    logger_.info(f"User: {getpass.getuser()}")
+    parser = argparse.ArgumentParser(
+        description="MID DISH SPFRx timeline scheduler."
+    )
+    parser.add_argument(
+        "timeline",
+        type=str,
+        help="JSON file of time-tagged operations.",
+    )
+    parser.add_argument(
+        "-d",
+        "--device",
+        type=str,
+        default=spfrx.SPFRX_DEVICE,
+        help=f"Override the default FQDN device "
+             f"(default is {spfrx.SPFRX_DEVICE}).",
+    )
+    parser.add_argument(
+        "-n",
+        "--name",
+        type=str,
+        default=spfrx.SPFRX_NAME,
+        help=f"Override the default FQDN name "
+             f"(default is {spfrx.SPFRX_NAME}).",
+    )
+    parser.add_argument(
+        "--start",
+        type=str,
+        metavar="UTC_TIME",
+        help="ISO 8601 UTC time relative step times refer to "
+             f"(default is {DEFAULT_START_LEAD_S} s after the proxies are "
+             "connected).",
+    )
+    parser.add_argument(
+        "--max_late",
+        type=float,
+        metavar="SECONDS",
+        help="Skip steps that cannot start within SECONDS of their "
+             "target time (default is to run them late).",
+    )
+    parser.add_argument(
+        "--stop_on_failure",
+        action="store_true",
+        help="Skip the remaining steps after a failed step.",
+    )
+    parser.add_argument(
+        "--transition_timeout",
+        type=float,
+        metavar="SECONDS",
+        default=spfrx.DEFAULT_TRANSITION_TIMEOUT_S,
+        help="Upper bound on each operating mode transition "
+             f"(default is {spfrx.DEFAULT_TRANSITION_TIMEOUT_S} s).",
+    )
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="Print the schedule without running it.",
+    )
+    parser.add_argument(
+        "--report",
+        type=str,
+        metavar="PATH",
+        help="Write the achieved timing of every step to a JSON file.",
+    )
+    parser.add_argument(
+        "--stats",
+        choices=STATS_FORMATS,
+        help="Dump TANGO call statistics at exit.",
+    )
+    parser.add_argument(
+        "--stats_file",
+        type=str,
+        metavar="PATH",
+        help="Write the --stats dump to PATH instead of stdout.",
+    )
+    args = parser.parse_args()
+
+    try:
+        steps = load_timeline(args.timeline)
+        start_s = parse_utc(args.start) if args.start else None
+    except (OSError, ValueError) as e:
+        logger_.error(f"Invalid timeline: {e}")
+        exit(2)
+
+    if args.dry_run:
+        print(format_report(schedule(steps, start_s or time.time())))
+        exit(0)
+
+    if args.stats is not None:
+        dump_stats_at_exit(args.stats, args.stats_file)
+    steps = run_timeline(
+        steps,
+        args.device,
+        args.name,
+        start_s,
+        args.transition_timeout,
+        args.max_late,
+        args.stop_on_failure,
+    )
+    print(format_report(steps))
+    if args.report is not None:
+        with open(args.report, "w") as report_fd:
+            json.dump([step.to_dict() for step in steps], report_fd, indent=4)
+    if not all(step.ok for step in steps):
+        exit(1)
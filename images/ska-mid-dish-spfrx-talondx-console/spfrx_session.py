@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+spfrx_session
+Long-lived SPFRx console session.
+
+Runs the spfrx.py actions in a single process so that Python start-up,
+the tango import and device proxies are paid for once. Two front ends are
+provided:
+
+* an interactive prompt (--repl) accepting the spfrx.py options, eg.
+  ``-vb`` or ``-a 2 10.0 10.5``
+* a local Unix socket command server (--serve) for the thin client in
+  spfrx_client.py
+
+Proxies stay warm in the spfrx.py proxy pool between commands. Adding
+--stats to a command dumps the TANGO call statistics gathered since the
+session started.
+"""
+import argparse
+import contextlib
+import getpass
+import io
+import json
+import logging
+import os
+import shlex
+import socket
+import socketserver
+import threading
+
+import spfrx
+from tango_call_stats import dump_stats
+
+LOG_FORMAT = (
+    "[spfrx_session.py: line %(lineno)s]%(levelname)s: %(message)s"
+)
+DEFAULT_SOCKET_PATH = "/tmp/spfrx-console.sock"
+PROMPT = "spfrx> "
+MAX_REQUEST_BYTES = 65536
+
+logger_ = logging.getLogger("spfrx_session.py")
+
+# Actions share stdout and the log handlers, so they run one at a time
+_action_lock = threading.Lock()
+
+
+def runCommand(
+        argv: list
+        ) -> tuple:
+    """
+    Run one console command and capture everything it prints or logs.
+
+    :param argv: The spfrx.py options, eg. ["-va", "2"]
+    :returns: A (status, output) tuple; status is 0 on success
+    """
+    output = io.StringIO()
+    handler = logging.StreamHandler(output)
+    handler.setFormatter(logging.Formatter(spfrx.LOG_FORMAT))
+    root = logging.getLogger()
+
+    with _action_lock:
+        # Send the command's log records to the capture buffer only
+        saved_handlers = root.handlers[:]
+        root.handlers = [handler]
+        try:
+            with contextlib.redirect_stdout(output), \
+                    contextlib.redirect_stderr(output):
+                try:
+                    args = spfrx.buildParser().parse_args(argv)
+                    status = 0 if spfrx.runActions(args) else 1
+                    if args.stats is not None:
+                        # Statistics accumulate over the whole session
+                        dump_stats(args.stats, args.stats_file)
+                except SystemExit as e:
+                    # argparse errors, --help and exit() in actions
+                    status = e.code if isinstance(e.code, int) else 1
+                except Exception as e:
+                    print(f"Error: {e}")
+                    status = 1
+        finally:
+            root.handlers = saved_handlers
+    return status, output.getvalue()
+
+
+def runRepl() -> None:
+    """
+    Interactive prompt. Each line holds spfrx.py options; 'quit' or
+    end-of-file leaves the session.
+    """
+    try:
+        import readline  # noqa: F401 - enables line editing and history
+    except ImportError:
+        pass
+
+    print("SPFRx console session. Type spfrx.py options, 'help' or 'quit'.")
+    while True:
+        try:
+            line = input(PROMPT).strip()
+        except EOFError:
+            print()
+            break
+        if not line:
+            continue
+        if line in ("quit", "exit"):
+            break
+        if line == "help":
+            line = "--help"
+        try:
+            argv = shlex.split(line)
+        except ValueError as e:
+            print(f"Error: {e}")
+            continue
+        _, output = runCommand(argv)
+        print(output, end="")
+
+
+class SessionRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handles one client request: a JSON list of spfrx.py options on a single
+    line, answered with a JSON object holding "status" and "output".
+    """
+
+    def handle(self):
+        line = self.rfile.readline(MAX_REQUEST_BYTES)
+        try:
+            argv = json.loads(line)
+            if not isinstance(argv, list):
+                raise ValueError("request must be a JSON list of options")
+            status, output = runCommand([str(a) for a in argv])
+        except ValueError as e:
+            status, output = 2, f"Bad request: {e}\n"
+        self.wfile.write(
+            json.dumps({"status": status, "output": output}).encode() + b"\n"
+        )
+
+
+def socketInUse(
+        socket_path: str
+        ) -> bool:
+    """
+    Check whether a server is listening on a Unix socket.
+
+    :param socket_path: Path of the Unix socket
+    :returns: True if a connection is accepted, False if there is no
+              socket or it was left behind by a server that has exited
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return False
+    return True
+
+
+def serve(
+        socket_path: str = DEFAULT_SOCKET_PATH
+        ) -> bool:
+    """
+    Serve console commands on a local Unix socket until interrupted. A
+    socket left behind by a session that has exited is replaced; a
+    socket another session is serving on is left alone.
+
+    :param socket_path: Path of the Unix socket to listen on
+    :returns: False if another session is serving on socket_path
+    """
+    if socketInUse(socket_path):
+        logger_.error(
+            f"Another SPFRx console session is serving on {socket_path}"
+        )
+        return False
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    with socketserver.ThreadingUnixStreamServer(
+        socket_path, SessionRequestHandler
+    ) as server:
+        os.chmod(socket_path, 0o600)
+        logger_.info(f"Serving SPFRx console commands on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
+    return True
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
+    logger_.info(f"User: {getpass.getuser()}")
+    parser = argparse.ArgumentParser(
+        description="MID DISH SPFRx Console session."
+    )
+    session_mode = parser.add_mutually_exclusive_group(required=True)
+    session_mode.add_argument(
+        "--repl",
+        action="store_true",
+        help="Start an interactive console session.",
+    )
+    session_mode.add_argument(
+        "--serve",
+        nargs="?",
+        const=DEFAULT_SOCKET_PATH,
+        metavar="SOCKET_PATH",
+        help="Serve console commands on a Unix socket "
+             f"(default is {DEFAULT_SOCKET_PATH}). "
+             "Use spfrx_client.py to send commands.",
+    )
+    args = parser.parse_args()
+
+    if args.repl:
+        runRepl()
+    elif not serve(args.serve):
+        exit(1)
@@ -0,0 +1,710 @@
+#!/usr/bin/env python3
+"""
+spfrx_simulator
+Simulated SPFRx Tango devices for offline development and benchmarking.
+
+Every alias of SPFRX_DEVICE_LIST is served for one or more dishes by a
+MultiDeviceTestContext, without a Tango DB:
+
+* SimController - the controller: band configuration with timed
+  operating mode transitions, attenuation, noise diode, spectrometer
+  control, kValue and MonitorPing
+* SimPacketCapture - the pktcap device: spectrometer bridge, throttle and
+  packet count, and a synthetic spectrum per spectrometer_retrieve_result
+  whose power follows the configured band and its attenuation
+* SimBandProcessor - the bandprocessor123 devices (spectral inversion)
+* SimDevice - every other BSP device (state, status and version only)
+
+Latency and failures are injected into every simulated attribute access
+and command. They are configured with the simLatencyMs, simJitterMs,
+simFailureRate and simFailureReason device properties, and can be changed
+at run time through the simLatency, simJitter, simFailure and
+simFailReason attributes, which are never injected into.
+
+Point the console tools at the simulator with the SPFRX_FQDN_FORMAT
+environment variable printed at start-up::
+
+    ./spfrx_simulator.py --latency_ms 2 &
+    export SPFRX_FQDN_FORMAT=tango://127.0.0.1:45450/{device}/{name}/{alias}#dbase=no
+    ./spfrx.py -b 2
+"""
+
+import argparse
+import contextlib
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, Iterator, List
+
+import numpy as np
+from tango import AttrWriteType, DevState, EnsureOmniThread, Except
+from tango.server import Device, attribute, command, device_property
+from tango.test_context import MultiDeviceTestContext
+
+from autolevel import SPECTRUM_CHANNELS
+from spfrx import (
+    FQDN_FORMAT_ENV,
+    MAX_ATTEN,
+    MAX_BAND,
+    MIN_ATTEN,
+    MIN_BAND,
+    POLS,
+    SPFRX_DEVICE,
+    SPFRX_DEVICE_LIST,
+    SPFRX_NAME,
+)
+from transition_wait import (
+    OPERATING_MODE_DATA_CAPTURE,
+    OPERATING_MODE_STANDBY,
+)
+
+LOG_FORMAT = (
+    "[spfrx_simulator.py: line %(lineno)s]%(levelname)s: %(message)s"
+)
+VERSION = "0.0.1"
+
+logger_ = logging.getLogger("spfrx_simulator.py")
+
+DEFAULT_SIM_PORT = 45450
+DEFAULT_TRANSITION_MS = 50
+DEFAULT_FAILURE_REASON = "API_DeviceTimedOut"
+
+# Spectrometer result: a timestamp word, a spare word, then XX, YY and the
+# real and imaginary XY products of each channel for each of 2 inputs
+SPECTRUM_LENGTH = 2 + 2 * 4 * SPECTRUM_CHANNELS
+
+# Noise floor of the synthetic spectrum in counts per channel, and the
+# power received in each band at 0 dB attenuation, in dB above that floor
+SIM_NOISE_FLOOR = 1000.0
+SIM_BAND_POWER_DB = {1: 40.0, 2: 37.0, 3: 44.0}
+# Power added by the enabled noise diode in the first half of the spectrum
+SIM_ND_GAIN = 1.25
+
+ND_STATE_ENABLED = 1
+ND_STATE_DISABLED = 2
+
+BAND_PROCESSOR_ALIASES = (
+    SPFRX_DEVICE_LIST["bp12"],
+    SPFRX_DEVICE_LIST["bp3"],
+)
+
+# Controller of each simulated dish ("device/name"), for the pktcap
+# spectrum to follow the receiver configuration
+_controllers: Dict[str, "SimController"] = {}
+
+
+def _dish_of(
+        device: Device
+        ) -> str:
+    return device.get_name().rsplit("/", 1)[0]
+
+
+class SimulatedDevice(Device):
+    """
+    Base of the simulated devices: version attributes and the latency and
+    failure injection.
+    """
+
+    simLatencyMs = device_property(dtype=float, default_value=0.0)
+    simJitterMs = device_property(dtype=float, default_value=0.0)
+    simFailureRate = device_property(dtype=float, default_value=0.0)
+    simFailureReason = device_property(
+        dtype=str, default_value=DEFAULT_FAILURE_REASON
+    )
+
+    def init_device(self):
+        super().init_device()
+        self._latency_ms = self.simLatencyMs
+        self._jitter_ms = self.simJitterMs
+        self._failure_rate = self.simFailureRate
+        self._failure_reason = self.simFailureReason
+        self._lock = threading.Lock()
+        self.set_state(DevState.ON)
+        self.set_status("Simulated device is ON")
+
+    def inject(
+            self,
+            operation: str
+            ) -> None:
+        """
+        Apply the configured latency, then fail the operation with the
+        configured probability.
+
+        :param operation: Attribute or command name, used in the error
+        """
+        delay_ms = self._latency_ms
+        if self._jitter_ms > 0:
+            delay_ms += random.uniform(0, self._jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+        if self._failure_rate > 0 and random.random() < self._failure_rate:
+            Except.throw_exception(
+                self._failure_reason,
+                f"Injected failure of {operation}",
+                f"{type(self).__name__}.inject",
+            )
+
+    @attribute(dtype=float, access=AttrWriteType.READ_WRITE, unit="ms")
+    def simLatency(self) -> float:
+        return self._latency_ms
+
+    @simLatency.write
+    def simLatency(self, value: float):
+        self._latency_ms = value
+
+    @attribute(dtype=float, access=AttrWriteType.READ_WRITE, unit="ms")
+    def simJitter(self) -> float:
+        return self._jitter_ms
+
+    @simJitter.write
+    def simJitter(self, value: float):
+        self._jitter_ms = value
+
+    @attribute(dtype=float, access=AttrWriteType.READ_WRITE)
+    def simFailure(self) -> float:
+        return self._failure_rate
+
+    @simFailure.write
+    def simFailure(self, value: float):
+        self._failure_rate = value
+
+    @attribute(dtype=str, access=AttrWriteType.READ_WRITE)
+    def simFailReason(self) -> str:
+        return self._failure_reason
+
+    @simFailReason.write
+    def simFailReason(self, value: str):
+        self._failure_reason = value
+
+    @attribute(dtype=str)
+    def dsVersionId(self) -> str:
+        self.inject("dsVersionId")
+        return VERSION
+
+    @attribute(dtype=str)
+    def dsBuildDateTime(self) -> str:
+        self.inject("dsBuildDateTime")
+        return "simulated"
+
+    @attribute(dtype=str)
+    def dsGitCommitHash(self) -> str:
+        self.inject("dsGitCommitHash")
+        return "0000000"
+
+
+def _atten_attribute(
+        band: int,
+        pol: str
+        ) -> attribute:
+    name = f"b{band}Pol{pol}Attenuation"
+
+    def read(self) -> float:
+        self.inject(name)
+        return self._atten[(band, pol)]
+
+    def write(self, value: float):
+        self.inject(name)
+        self._atten[(band, pol)] = value
+        if band == self._configured_band:
+            self.push_change_event(f"attenuationPol{pol}", value)
+
+    return attribute(
+        fget=read,
+        fset=write,
+        name=name,
+        dtype=float,
+        access=AttrWriteType.READ_WRITE,
+        min_value=MIN_ATTEN,
+        max_value=MAX_ATTEN,
+    )
+
+
+class SimController(SimulatedDevice):
+    """
+    Simulated SPFRx controller.
+
+    SetStandbyMode and ConfigureBand{n} complete after simTransitionMs, so
+    clients exercise their transition waits. Change events are pushed for
+    the operating mode, the configured band and the attenuation of the
+    configured band.
+    """
+
+    simTransitionMs = device_property(
+        dtype=float, default_value=DEFAULT_TRANSITION_MS
+    )
+
+    for _band in range(MIN_BAND, MAX_BAND + 1):
+        for _pol in POLS:
+            locals()[f"b{_band}Pol{_pol}Attenuation"] = _atten_attribute(
+                _band, _pol
+            )
+    del _band, _pol
+
+    def init_device(self):
+        super().init_device()
+        self._operating_mode = OPERATING_MODE_STANDBY
+        self._configured_band = 0
+        self._atten = {
+            (band, pol): 10.0
+            for band in range(MIN_BAND, MAX_BAND + 1)
+            for pol in POLS
+        }
+        self._nd_state = ND_STATE_DISABLED
+        self._nd_mode = 0
+        self._nd_periodic = [0, 0, 0]
+        self._nd_pseudo_random = [0, 0, 0]
+        self._spectrometer = False
+        self._k_value = 1
+        self._transition = None
+        for attr_name in self._event_values():
+            self.set_change_event(attr_name, True, False)
+        _controllers[_dish_of(self)] = self
+
+    def delete_device(self):
+        if self._transition is not None:
+            self._transition.cancel()
+        _controllers.pop(_dish_of(self), None)
+        super().delete_device()
+
+    def input_power(self) -> tuple:
+        """
+        :returns: The (H, V) power reaching the spectrometer, as linear
+                  gains over the noise floor
+        """
+        band = self._configured_band
+        if self._operating_mode != OPERATING_MODE_DATA_CAPTURE or \
+                band not in SIM_BAND_POWER_DB:
+            return (1.0, 1.0)
+        return tuple(
+            1.0 + 10 ** ((SIM_BAND_POWER_DB[band] - self._atten[(band, pol)])
+                         / 10)
+            for pol in POLS
+        )
+
+    def noise_diode_gain(self) -> float:
+        """
+        :returns: The linear gain of the noise diode on the ND-on half of
+                  the spectrum, 1.0 while the noise diode is disabled
+        """
+        return SIM_ND_GAIN if self._nd_state == ND_STATE_ENABLED else 1.0
+
+    def _event_values(self) -> dict:
+        return {
+            "operatingMode": self._operating_mode,
+            "configuredBand": self._configured_band,
+            "attenuationPolH": self._atten.get(
+                (self._configured_band, "H"), 0.0
+            ),
+            "attenuationPolV": self._atten.get(
+                (self._configured_band, "V"), 0.0
+            ),
+        }
+
+    def _transition_to(
+            self,
+            mode: int,
+            band: int = None
+            ) -> None:
+        def complete():
+            with EnsureOmniThread(), self._lock:
+                self._operating_mode = mode
+                if band is not None:
+                    self._configured_band = band
+                for attr_name, value in self._event_values().items():
+                    self.push_change_event(attr_name, value)
+
+        with self._lock:
+            if self._transition is not None:
+                self._transition.cancel()
+            self._transition = threading.Timer(
+                self.simTransitionMs / 1000, complete
+            )
+            self._transition.daemon = True
+            self._transition.start()
+
+    def _configure_band(
+            self,
+            band: int,
+            synchronize: bool
+            ) -> None:
+        self.inject(f"ConfigureBand{band}")
+        self._transition_to(OPERATING_MODE_DATA_CAPTURE, band)
+
+    @attribute(dtype=int)
+    def operatingMode(self) -> int:
+        self.inject("operatingMode")
+        return self._operating_mode
+
+    @attribute(dtype=int)
+    def configuredBand(self) -> int:
+        self.inject("configuredBand")
+        return self._configured_band
+
+    @attribute(dtype=int)
+    def kValue(self) -> int:
+        self.inject("kValue")
+        return self._k_value
+
+    @attribute(dtype=float)
+    def attenuationPolH(self) -> float:
+        self.inject("attenuationPolH")
+        return self._atten.get((self._configured_band, "H"), 0.0)
+
+    @attribute(dtype=float)
+    def attenuationPolV(self) -> float:
+        self.inject("attenuationPolV")
+        return self._atten.get((self._configured_band, "V"), 0.0)
+
+    @attribute(dtype=int)
+    def noiseDiodeState(self) -> int:
+        self.inject("noiseDiodeState")
+        return self._nd_state
+
+    @attribute(dtype=int, access=AttrWriteType.READ_WRITE)
+    def noiseDiodeMode(self) -> int:
+        self.inject("noiseDiodeMode")
+        return self._nd_mode
+
+    @noiseDiodeMode.write
+    def noiseDiodeMode(self, value: int):
+        self.inject("noiseDiodeMode")
+        self._nd_mode = value
+
+    @attribute(dtype=(int,), max_dim_x=3, access=AttrWriteType.READ_WRITE)
+    def periodicNoiseDiodePars(self) -> List[int]:
+        self.inject("periodicNoiseDiodePars")
+        return self._nd_periodic
+
+    @periodicNoiseDiodePars.write
+    def periodicNoiseDiodePars(self, value: List[int]):
+        self.inject("periodicNoiseDiodePars")
+        self._nd_periodic = list(value)
+
+    @attribute(dtype=(int,), max_dim_x=3, access=AttrWriteType.READ_WRITE)
+    def pseudoRandomNoiseDiodePars(self) -> List[int]:
+        self.inject("pseudoRandomNoiseDiodePars")
+        return self._nd_pseudo_random
+
+    @pseudoRandomNoiseDiodePars.write
+    def pseudoRandomNoiseDiodePars(self, value: List[int]):
+        self.inject("pseudoRandomNoiseDiodePars")
+        self._nd_pseudo_random = list(value)
+
+    @attribute(dtype=bool)
+    def spectrometerEnabled(self) -> bool:
+        self.inject("spectrometerEnabled")
+        return self._spectrometer
+
+    @command
+    def SetStandbyMode(self):
+        self.inject("SetStandbyMode")
+        self._transition_to(OPERATING_MODE_STANDBY)
+
+    @command(dtype_in=bool)
+    def ConfigureBand1(self, synchronize: bool):
+        self._configure_band(1, synchronize)
+
+    @command(dtype_in=bool)
+    def ConfigureBand2(self, synchronize: bool):
+        self._configure_band(2, synchronize)
+
+    @command(dtype_in=bool)
+    def ConfigureBand3(self, synchronize: bool):
+        self._configure_band(3, synchronize)
+
+    @command(dtype_in=bool)
+    def SetNoiseDiodeState(self, enable: bool):
+        self.inject("SetNoiseDiodeState")
+        self._nd_state = ND_STATE_ENABLED if enable else ND_STATE_DISABLED
+
+    @command(dtype_in=bool)
+    def SpectrometerCtrl(self, enable: bool):
+        self.inject("SpectrometerCtrl")
+        self._spectrometer = enable
+
+    @command
+    def MonitorPing(self):
+        self.inject("MonitorPing")
+
+
+class SimPacketCapture(SimulatedDevice):
+    """
+    Simulated pktcap device. Each spectrometer_retrieve_result produces a
+    new synthetic spectrum with an incrementing timestamp.
+    """
+
+    def init_device(self):
+        super().init_device()
+        self._bridge = 0
+        self._throttle_interval = 0
+        self._num_packets = 1
+        self._timestamp = 0
+        self._rng = np.random.default_rng()
+        self._spectrum = np.zeros(SPECTRUM_LENGTH, dtype=np.int64)
+
+    def _next_spectrum(self) -> None:
+        self._timestamp += 1
+        channels = np.arange(SPECTRUM_CHANNELS)
+        controller = _controllers.get(_dish_of(self))
+        gain_h, gain_v = (1.0, 1.0) if controller is None \
+            else controller.input_power()
+        nd_gain = 1.0 if controller is None \
+            else controller.noise_diode_gain()
+        # Mean power of XX, YY and the XY real and imaginary parts, with
+        # and without the noise diode
+        mean = SIM_NOISE_FLOOR * np.array(
+            [gain_h, gain_v, np.sqrt(gain_h * gain_v),
+             0.5 * np.sqrt(gain_h * gain_v)]
+        )
+        mean = np.array([nd_gain * mean, mean])[:, :, np.newaxis]
+        # Noise with a tone whose channel drifts over time
+        tone = (self._timestamp * 7) % SPECTRUM_CHANNELS
+        power = self._rng.poisson(
+            np.broadcast_to(mean, (2, 4, SPECTRUM_CHANNELS))
+        ).astype(np.int64)
+        power[:, :2] += (
+            10 * mean[:, :2]
+            * np.exp(-0.5 * ((channels - tone) / 3.0) ** 2)
+        ).astype(np.int64)
+        self._spectrum[0] = self._timestamp
+        self._spectrum[2:] = power.reshape(-1)
+
+    @attribute(dtype=int)
+    def spectrometer_bridge(self) -> int:
+        self.inject("spectrometer_bridge")
+        return self._bridge
+
+    @attribute(dtype=int, access=AttrWriteType.READ_WRITE)
+    def spectrometer_throttle_interval(self) -> int:
+        self.inject("spectrometer_throttle_interval")
+        return self._throttle_interval
+
+    @spectrometer_throttle_interval.write
+    def spectrometer_throttle_interval(self, value: int):
+        self.inject("spectrometer_throttle_interval")
+        self._throttle_interval = value
+
+    @attribute(dtype=int, access=AttrWriteType.READ_WRITE)
+    def spectrometer_num_packets(self) -> int:
+        self.inject("spectrometer_num_packets")
+        return self._num_packets
+
+    @spectrometer_num_packets.write
+    def spectrometer_num_packets(self, value: int):
+        self.inject("spectrometer_num_packets")
+        self._num_packets = value
+
+    @attribute(dtype=(int,), max_dim_x=SPECTRUM_LENGTH)
+    def spectrometer_spectrum_result(self) -> np.ndarray:
+        self.inject("spectrometer_spectrum_result")
+        return self._spectrum
+
+    @command(dtype_in=int)
+    def spectrometer_set_bridge(self, bridge: int):
+        self.inject("spectrometer_set_bridge")
+        self._bridge = bridge
+
+    @command
+    def spectrometer_retrieve_result(self):
+        self.inject("spectrometer_retrieve_result")
+        with self._lock:
+            self._next_spectrum()
+
+
+class SimBandProcessor(SimulatedDevice):
+    """
+    Simulated bandprocessor123 device.
+    """
+
+    def init_device(self):
+        super().init_device()
+        self._spec_inv = 0
+
+    @attribute(dtype=int, access=AttrWriteType.READ_WRITE)
+    def spec_inv(self) -> int:
+        self.inject("spec_inv")
+        return self._spec_inv
+
+    @spec_inv.write
+    def spec_inv(self, value: int):
+        self.inject("spec_inv")
+        self._spec_inv = value
+
+
+class SimDevice(SimulatedDevice):
+    """
+    Simulated BSP device with no device-specific behaviour.
+    """
+
+
+def _device_class(
+        alias: str
+        ) -> type:
+    if alias == SPFRX_DEVICE_LIST["ctrl"]:
+        return SimController
+    if alias == SPFRX_DEVICE_LIST["pktcap"]:
+        return SimPacketCapture
+    if alias in BAND_PROCESSOR_ALIASES:
+        return SimBandProcessor
+    return SimDevice
+
+
+def devices_info(
+        dishes: List[str],
+        properties: dict = None
+        ) -> list:
+    """
+    Build the MultiDeviceTestContext devices_info for a set of dishes.
+
+    :param dishes: Dish prefixes ("device/name")
+    :param properties: Device properties given to every device, eg.
+                       {"simLatencyMs": 2.0}
+    :returns: A devices_info list, one entry per device class
+    """
+    by_class = {}
+    for dish in dishes:
+        for alias in SPFRX_DEVICE_LIST.values():
+            by_class.setdefault(_device_class(alias), []).append(
+                {"name": f"{dish}/{alias}", "properties": properties or {}}
+            )
+    return [
+        {"class": dev_class, "devices": devices}
+        for dev_class, devices in by_class.items()
+    ]
+
+
+def fqdn_format(
+        host: str,
+        port: int
+        ) -> str:
+    """
+    SPFRX_FQDN_FORMAT value addressing the simulator.
+    """
+    return f"tango://{host}:{port}/{{device}}/{{name}}/{{alias}}#dbase=no"
+
+
+@contextlib.contextmanager
+def simulated_spfrx(
+        dishes: List[str] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        process: bool = True,
+        **properties
+        ) -> Iterator[str]:
+    """
+    Run the simulator for the duration of a with block, with
+    SPFRX_FQDN_FORMAT set so the console code addresses it.
+
+    :param dishes: Dish prefixes, defaults to SPFRX_DEVICE/SPFRX_NAME
+    :param host: Host the devices listen on
+    :param port: Port the devices listen on, any free port if 0
+    :param process: Run the devices in a separate process
+    :param properties: Device properties for every device, eg.
+                       simLatencyMs=2.0 or simFailureRate=0.1
+    :returns: The SPFRX_FQDN_FORMAT value
+    """
+    if dishes is None:
+        dishes = [f"{SPFRX_DEVICE}/{SPFRX_NAME}"]
+    context = MultiDeviceTestContext(
+        devices_info(dishes, properties),
+        host=host,
+        port=port,
+        process=process,
+    )
+    previous = os.environ.get(FQDN_FORMAT_ENV)
+    with context:
+        host, port = context.host, context.port
+        os.environ[FQDN_FORMAT_ENV] = fqdn_format(host, port)
+        try:
+            yield os.environ[FQDN_FORMAT_ENV]
+        finally:
+            if previous is None:
+                os.environ.pop(FQDN_FORMAT_ENV, None)
+            else:
+                os.environ[FQDN_FORMAT_ENV] = previous
+
+
+def buildParser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="spfrx_simulator.py",
+        description="Serve simulated SPFRx Tango devices without a Tango DB",
+    )
+    parser.add_argument(
+        "--dish",
+        action="append",
+        metavar="DISH",
+        help="Dish prefix (\"device/name\") to simulate; repeat for several "
+        f"dishes (defaults to {SPFRX_DEVICE}/{SPFRX_NAME})",
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Host the devices listen on",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_SIM_PORT,
+        help="Port the devices listen on",
+    )
+    parser.add_argument(
+        "--latency_ms",
+        type=float,
+        default=0.0,
+        metavar="MS",
+        help="Latency added to every attribute access and command",
+    )
+    parser.add_argument(
+        "--jitter_ms",
+        type=float,
+        default=0.0,
+        metavar="MS",
+        help="Upper bound of a random latency added on top of --latency_ms",
+    )
+    parser.add_argument(
+        "--failure_rate",
+        type=float,
+        default=0.0,
+        metavar="RATE",
+        help="Probability in [0, 1] that an access or command fails",
+    )
+    parser.add_argument(
+        "--failure_reason",
+        default=DEFAULT_FAILURE_REASON,
+        metavar="REASON",
+        help="Tango reason of the injected failures",
+    )
+    parser.add_argument(
+        "--transition_ms",
+        type=float,
+        default=DEFAULT_TRANSITION_MS,
+        metavar="MS",
+        help="Duration of the controller operating mode transitions",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
+    args = buildParser().parse_args()
+    with simulated_spfrx(
+            args.dish,
+            args.host,
+            args.port,
+            process=False,
+            simLatencyMs=args.latency_ms,
+            simJitterMs=args.jitter_ms,
+            simFailureRate=args.failure_rate,
+            simFailureReason=args.failure_reason,
+            simTransitionMs=args.transition_ms,
+    ) as fqdn_format_value:
+        logger_.info(
+            "Simulated SPFRx devices running; point the console at them "
+            f"with:\n  export {FQDN_FORMAT_ENV}={fqdn_format_value}"
+        )
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
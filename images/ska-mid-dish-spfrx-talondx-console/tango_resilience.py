@@ -0,0 +1,405 @@
+"""
+tango_resilience
+Retries, backoff and circuit breaking for Tango client calls.
+
+Tango failures are turned into typed errors:
+
+* TangoConnectionError - the device could not be reached (not exported,
+  server down, network or CORBA failure). Retried after reconnecting,
+  except for commands whose request may already have been delivered
+  (communication and CORBA failures after connecting).
+* TangoTimeoutError - the device did not answer in time. Retried for
+  idempotent calls (reads and attribute writes) only, since a timed out
+  command may still have run.
+* TangoDeviceError - the device answered and rejected the call (unknown
+  attribute, command not allowed, ...). Never retried.
+* CircuitOpenError - the device failed repeatedly and calls to it fail
+  fast until its circuit breaker lets a trial call through.
+
+Retries use exponential backoff with full jitter, bounded by a RetryPolicy.
+Each device has one CircuitBreaker shared by every client in the process,
+so a rebooting board costs one timeout per reset interval instead of one
+per call. A trial call that ends without a Tango outcome (another
+exception, an interrupt or an asyncio cancellation) hands the trial over
+to the next call instead of leaving the breaker half-open.
+"""
+
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict
+
+from lazy_import import lazy_import
+
+asyncio = lazy_import("asyncio")
+tango = lazy_import("tango")
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY_S = 0.1
+DEFAULT_MAX_DELAY_S = 2.0
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_TIMEOUT_S = 10.0
+
+# DevFailed reasons meaning the call never reached a running device
+CONNECTION_REASONS = (
+    "API_CantConnectToDevice",
+    "API_CantConnectToDatabase",
+    "API_CommunicationFailed",
+    "API_ConnectionFailed",
+    "API_CorbaException",
+    "API_DeviceNotExported",
+    "API_ServerNotRunning",
+)
+# Connection reasons that can also occur once the request was sent
+MAY_HAVE_RUN_REASONS = (
+    "API_CommunicationFailed",
+    "API_CorbaException",
+)
+
+
+class TangoClientError(Exception):
+    """
+    Base class of the errors raised by the resilient client layer.
+
+    :param device: Device FQDN
+    :param operation: Description of the failed call, eg. "read kValue"
+    :param reason: Tango reason of the failure, if any
+    :param desc: Description of the failure
+    """
+
+    def __init__(
+            self,
+            device: str,
+            operation: str,
+            reason: str = "",
+            desc: str = ""
+            ):
+        self.device = device
+        self.operation = operation
+        self.reason = reason
+        self.desc = desc
+        detail = f"{reason}: {desc}" if reason else desc
+        super().__init__(f"{device}: {operation} failed ({detail})")
+
+
+class TangoConnectionError(TangoClientError):
+    """
+    The device could not be reached.
+
+    may_have_run is True when the request may have been delivered before
+    the failure, so a command must not be sent again.
+    """
+
+    may_have_run = False
+
+
+class TangoTimeoutError(TangoClientError):
+    """
+    The device did not answer within the client timeout.
+    """
+
+
+class TangoDeviceError(TangoClientError):
+    """
+    The device answered and rejected the call.
+    """
+
+
+class CircuitOpenError(TangoClientError):
+    """
+    The device circuit breaker is open; the call was not attempted.
+    """
+
+
+def translate_error(
+        device: str,
+        operation: str,
+        e: Exception
+        ) -> TangoClientError:
+    """
+    Turn a DevFailed into the matching typed error.
+
+    :param device: Device FQDN
+    :param operation: Description of the failed call
+    :param e: The exception raised by PyTango
+    :returns: A TangoClientError, or None if e is not a DevFailed
+    """
+    if not isinstance(e, tango.DevFailed):
+        return None
+    errors = list(e.args)
+    reasons = [getattr(err, "reason", "") for err in errors]
+    # The outermost error carries the most specific description
+    desc = getattr(errors[0], "desc", "").strip() if errors else str(e)
+    reason = reasons[0] if reasons else ""
+    if any("TimedOut" in r or "Timeout" in r for r in reasons):
+        error_class = TangoTimeoutError
+    elif isinstance(e, tango.ConnectionFailed) or \
+            any(r in CONNECTION_REASONS for r in reasons):
+        error_class = TangoConnectionError
+    else:
+        error_class = TangoDeviceError
+    error = error_class(device, operation, reason, desc)
+    if error_class is TangoConnectionError and \
+            not isinstance(e, tango.ConnectionFailed):
+        # A ConnectionFailed is raised before the request is sent
+        error.may_have_run = isinstance(e, tango.CommunicationFailed) or \
+            any(r in MAY_HAVE_RUN_REASONS for r in reasons)
+    return error
+
+
+class RetryPolicy:
+    """
+    Bounded retries with exponential backoff and full jitter.
+
+    :param max_attempts: Attempts per call, including the first one
+    :param base_delay_s: Backoff before the first retry (upper bound)
+    :param max_delay_s: Upper bound on any backoff
+    """
+
+    def __init__(
+            self,
+            max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+            base_delay_s: float = DEFAULT_BASE_DELAY_S,
+            max_delay_s: float = DEFAULT_MAX_DELAY_S
+            ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+
+    def backoff(
+            self,
+            attempt: int
+            ) -> float:
+        """
+        Delay before the given retry (1 for the first retry).
+        """
+        ceiling = min(
+            self.max_delay_s, self.base_delay_s * (2 ** (attempt - 1))
+        )
+        return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """
+    Per-device circuit breaker.
+
+    After failure_threshold consecutive failures the circuit opens and
+    calls fail fast. Once reset_timeout_s has elapsed a single trial call
+    is let through; its success closes the circuit, its failure re-opens
+    it for another reset_timeout_s.
+
+    :param failure_threshold: Consecutive failures that open the circuit
+    :param reset_timeout_s: Time the circuit stays open before a trial
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(
+            self,
+            failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+            reset_timeout_s: float = DEFAULT_RESET_TIMEOUT_S
+            ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may be attempted now.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and \
+                    time.monotonic() - self.opened_at >= self.reset_timeout_s:
+                # Let exactly one trial call through
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def abandon_trial(self) -> None:
+        """
+        Give up a half-open trial that ended without an outcome, so the
+        next call becomes the trial.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                # opened_at is unchanged, so allow() admits a trial at once
+                self.state = self.OPEN
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or \
+                    self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != self.CLOSED
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(
+        device: str
+        ) -> CircuitBreaker:
+    """
+    Return the process-wide circuit breaker of a device.
+
+    :param device: Device FQDN
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(device)
+        if breaker is None:
+            breaker = _breakers[device] = CircuitBreaker()
+        return breaker
+
+
+def _admit(
+        breaker: CircuitBreaker,
+        device: str,
+        operation: str
+        ) -> None:
+    if not breaker.allow():
+        raise CircuitOpenError(
+            device, operation, "", "device unavailable, failing fast"
+        )
+
+
+def _failure(
+        device: str,
+        operation: str,
+        e: Exception,
+        breaker: CircuitBreaker,
+        policy: RetryPolicy,
+        attempt: int,
+        idempotent: bool
+        ) -> TangoClientError:
+    """
+    Account for a failed attempt.
+
+    :returns: The typed error if the call should be retried
+    :raises: The typed error (or e itself if it is not a DevFailed) if the
+             call should not be retried
+    """
+    error = translate_error(device, operation, e)
+    if error is None:
+        # Not a Tango failure, so nothing is known of the device
+        breaker.abandon_trial()
+        raise e
+    if isinstance(error, TangoDeviceError):
+        # The device is alive; only the call was rejected
+        breaker.record_success()
+        raise error from e
+    breaker.record_failure()
+    retry = idempotent or (
+        isinstance(error, TangoConnectionError) and not error.may_have_run
+    )
+    if not retry or attempt >= policy.max_attempts or breaker.is_open:
+        raise error from e
+    return error
+
+
+def resilient_call(
+        device: str,
+        operation: str,
+        call: Callable,
+        policy: RetryPolicy = None,
+        idempotent: bool = True,
+        reconnect: Callable[[], None] = None
+        ):
+    """
+    Make a Tango call with retries, backoff and circuit breaking.
+
+    :param device: Device FQDN, selects the circuit breaker
+    :param operation: Description of the call used in errors
+    :param call: Callable performing the call
+    :param policy: Retry policy, defaults to RetryPolicy()
+    :param idempotent: Retry timeouts, and connection failures after which
+                       the request may have run, as well as failures to
+                       connect
+    :param reconnect: Callable dropping the proxy before a retry that
+                      follows a connection failure
+    :returns: The result of call
+    :raises TangoClientError: When the call does not succeed
+    """
+    if policy is None:
+        policy = RetryPolicy()
+    breaker = get_circuit_breaker(device)
+    attempt = 0
+    while True:
+        _admit(breaker, device, operation)
+        attempt += 1
+        try:
+            result = call()
+        except Exception as e:
+            error = _failure(
+                device, operation, e, breaker, policy, attempt, idempotent
+            )
+            if isinstance(error, TangoConnectionError) and \
+                    reconnect is not None:
+                reconnect()
+            time.sleep(policy.backoff(attempt))
+            continue
+        except BaseException:
+            # eg. KeyboardInterrupt: no outcome to record
+            breaker.abandon_trial()
+            raise
+        breaker.record_success()
+        return result
+
+
+async def resilient_call_async(
+        device: str,
+        operation: str,
+        call: Callable[[], Awaitable],
+        policy: RetryPolicy = None,
+        idempotent: bool = True,
+        reconnect: Callable[[], None] = None
+        ):
+    """
+    Awaitable equivalent of resilient_call, for asyncio green mode
+    proxies. Backoff sleeps yield to the event loop.
+
+    :param call: Callable returning an awaitable that performs the call
+    :returns: The result of the awaited call
+    :raises TangoClientError: When the call does not succeed
+    """
+    if policy is None:
+        policy = RetryPolicy()
+    breaker = get_circuit_breaker(device)
+    attempt = 0
+    while True:
+        _admit(breaker, device, operation)
+        attempt += 1
+        try:
+            result = await call()
+        except Exception as e:
+            error = _failure(
+                device, operation, e, breaker, policy, attempt, idempotent
+            )
+            if isinstance(error, TangoConnectionError) and \
+                    reconnect is not None:
+                reconnect()
+            await asyncio.sleep(policy.backoff(attempt))
+            continue
+        except BaseException:
+            # eg. asyncio.CancelledError: no outcome to record
+            breaker.abandon_trial()
+            raise
+        breaker.record_success()
+        return result
@@ -0,0 +1,156 @@
+"""
+transition_wait
+Wait for a device attribute to reach an expected value.
+
+Change events are used when the device publishes them for the attribute;
+otherwise the attribute is polled with an interval that starts short and
+backs off, so fast transitions are detected quickly without hammering a
+device that is taking its time.
+
+The subscription, every read and the wait as a whole (kind "wait") are
+recorded in the call statistics (see tango_call_stats).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable
+
+from lazy_import import lazy_import
+from tango_call_stats import OUTCOME_OK, OUTCOME_TIMEOUT, get_call_stats
+
+tango = lazy_import("tango")
+
+# SPFRx controller operatingMode enumeration values
+OPERATING_MODE_STANDBY = 2
+OPERATING_MODE_DATA_CAPTURE = 4
+
+DEFAULT_POLL_INITIAL_S = 0.05
+DEFAULT_POLL_MAX_S = 0.5
+POLL_BACKOFF = 1.5
+
+
+class TransitionResult:
+    """
+    Outcome of waiting for an attribute value.
+
+    :param attr_name: The attribute that was watched
+    """
+
+    __slots__ = ("attr_name", "reached", "value", "elapsed_s", "method")
+
+    def __init__(self, attr_name: str):
+        self.attr_name = attr_name
+        self.reached = False
+        self.value = None
+        self.elapsed_s = 0.0
+        self.method = "poll"
+
+    def __bool__(self) -> bool:
+        return self.reached
+
+
+def _read(
+        dev_proxy: tango.DeviceProxy,
+        attr_name: str,
+        device: str
+        ) -> Any:
+    try:
+        with get_call_stats().timed(device, "read", attr_name):
+            return dev_proxy.read_attribute(attr_name).value
+    except tango.DevFailed:
+        return None
+
+
+def wait_for_attribute(
+        dev_proxy: tango.DeviceProxy,
+        attr_name: str,
+        expected: Any,
+        timeout_s: float,
+        poll_initial_s: float = DEFAULT_POLL_INITIAL_S,
+        poll_max_s: float = DEFAULT_POLL_MAX_S,
+        device: str = None
+        ) -> TransitionResult:
+    """
+    Block until an attribute reaches the expected value or the timeout
+    elapses.
+
+    :param dev_proxy: Proxy of the device to watch
+    :param attr_name: Attribute to watch
+    :param expected: Expected value, or a callable predicate on the value
+    :param timeout_s: Upper bound on the wait in seconds
+    :param poll_initial_s: First polling interval when events are not
+                           available
+    :param poll_max_s: Longest polling interval. Also used as the safety
+                       re-read interval when waiting on events.
+    :param device: Device FQDN the calls are recorded against in the call
+                   statistics (defaults to the proxy device name)
+    :returns: A TransitionResult with the last value seen and the time taken
+    """
+    matches: Callable[[Any], bool] = (
+        expected if callable(expected) else lambda v: v == expected
+    )
+    if device is None:
+        device = dev_proxy.dev_name()
+    stats = get_call_stats()
+    result = TransitionResult(attr_name)
+    start = time.monotonic()
+    deadline = start + timeout_s
+    reached = threading.Event()
+
+    def on_change(event):
+        if event.err or event.attr_value is None:
+            return
+        result.value = event.attr_value.value
+        if matches(result.value):
+            reached.set()
+
+    event_id = None
+    try:
+        with stats.timed(device, "subscribe", attr_name):
+            event_id = dev_proxy.subscribe_event(
+                attr_name, tango.EventType.CHANGE_EVENT, on_change
+            )
+        result.method = "event"
+    except tango.DevFailed:
+        # The attribute does not publish change events; fall back to polling
+        pass
+
+    try:
+        interval = poll_initial_s
+        while not reached.is_set():
+            if event_id is None:
+                result.value = _read(dev_proxy, attr_name, device)
+                if matches(result.value):
+                    reached.set()
+                    break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if event_id is not None:
+                # Re-read now and then in case an event is missed
+                if reached.wait(min(poll_max_s, remaining)):
+                    break
+                value = _read(dev_proxy, attr_name, device)
+                if matches(value):
+                    result.value = value
+                    reached.set()
+            else:
+                time.sleep(min(interval, remaining))
+                interval = min(interval * POLL_BACKOFF, poll_max_s)
+    finally:
+        if event_id is not None:
+            try:
+                with stats.timed(device, "unsubscribe", attr_name):
+                    dev_proxy.unsubscribe_event(event_id)
+            except tango.DevFailed:
+                pass
+
+    result.reached = reached.is_set()
+    result.elapsed_s = time.monotonic() - start
+    stats.record(
+        device, "wait", attr_name, result.elapsed_s,
+        OUTCOME_OK if result.reached else OUTCOME_TIMEOUT
+    )
+    return result